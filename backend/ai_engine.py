@@ -1,10 +1,10 @@
-from typing import List, Dict, Any, Tuple
-from emergentintegrations.llm.chat import LlmChat, UserMessage
+from typing import List, Dict, Any, Tuple, AsyncIterator
 from dotenv import load_dotenv
+import llm_gateway
+from materials_store import material_text
 import os
 import json
 import re
-import uuid
 
 load_dotenv()
 
@@ -12,6 +12,47 @@ EMERGENT_LLM_KEY = os.getenv("EMERGENT_LLM_KEY")
 if not EMERGENT_LLM_KEY:
     raise ValueError("EMERGENT_LLM_KEY not found in environment variables")
 
+TEACHING_MODEL = "claude-3-7-sonnet-20250219"
+REVIEW_MODEL = "claude-sonnet-4-20250514"
+
+# Per-message and summary length limits for the conversation context in teaching prompts
+CONTEXT_MESSAGE_CHARS = 1500
+CONVERSATION_SUMMARY_CHARS = 2000
+# Characters of each retrieved chunk put into learning-card prompts
+CARD_CHUNK_CHARS = 700
+
+SECTION_HEADERS = ("KEY_TOPICS", "CONCEPT_CONNECTIONS", "EXPLANATION", "SOURCES")
+
+
+def _parse_list_section(section_text: str) -> List[str]:
+    """Extract list items (lines starting with -, *, or numbers)"""
+    return [
+        re.sub(r'^[\-\*\d\.]+\s*', '', line.strip()) 
+        for line in section_text.split('\n') 
+        if line.strip() and (line.strip().startswith('-') or line.strip().startswith('*') or re.match(r'^\d+\.', line.strip()))
+    ]
+
+
+def _parse_connections_section(section_text: str) -> List[Dict[str, str]]:
+    """Parse connections in format: concept A -> concept B: relationship"""
+    concept_graph = []
+    for line in section_text.split('\n'):
+        line = line.strip()
+        if '->' in line:
+            parts = line.split('->')
+            if len(parts) == 2:
+                source = parts[0].strip()
+                rest = parts[1].split(':')
+                target = rest[0].strip()
+                relationship = rest[1].strip() if len(rest) > 1 else "relates to"
+                concept_graph.append({
+                    "source": source,
+                    "target": target,
+                    "relationship": relationship
+                })
+    return concept_graph
+
+
 def parse_structured_response(raw_response: str) -> Dict[str, Any]:
     """
     Parse the structured response from Claude into key topics, concept graph, markdown content, and sources
@@ -26,33 +67,12 @@ def parse_structured_response(raw_response: str) -> Dict[str, Any]:
         # Extract KEY_TOPICS section
         topics_match = re.search(r'KEY_TOPICS:\s*(.*?)\s*(?:CONCEPT_CONNECTIONS:|EXPLANATION:|SOURCES:|$)', raw_response, re.DOTALL | re.IGNORECASE)
         if topics_match:
-            topics_text = topics_match.group(1).strip()
-            # Extract individual topics (lines starting with -, *, or numbers)
-            key_topics = [
-                re.sub(r'^[\-\*\d\.]+\s*', '', line.strip()) 
-                for line in topics_text.split('\n') 
-                if line.strip() and (line.strip().startswith('-') or line.strip().startswith('*') or re.match(r'^\d+\.', line.strip()))
-            ]
+            key_topics = _parse_list_section(topics_match.group(1).strip())
         
         # Extract CONCEPT_CONNECTIONS section
         connections_match = re.search(r'CONCEPT_CONNECTIONS:\s*(.*?)\s*(?:EXPLANATION:|SOURCES:|$)', raw_response, re.DOTALL | re.IGNORECASE)
         if connections_match:
-            connections_text = connections_match.group(1).strip()
-            # Parse connections in format: "concept A -> concept B: relationship"
-            for line in connections_text.split('\n'):
-                line = line.strip()
-                if '->' in line:
-                    parts = line.split('->')
-                    if len(parts) == 2:
-                        source = parts[0].strip()
-                        rest = parts[1].split(':')
-                        target = rest[0].strip()
-                        relationship = rest[1].strip() if len(rest) > 1 else "relates to"
-                        concept_graph.append({
-                            "source": source,
-                            "target": target,
-                            "relationship": relationship
-                        })
+            concept_graph = _parse_connections_section(connections_match.group(1).strip())
         
         # Extract EXPLANATION section (the main content)
         explanation_match = re.search(r'EXPLANATION:\s*(.*?)\s*(?:SOURCES:|$)', raw_response, re.DOTALL | re.IGNORECASE)
@@ -65,13 +85,7 @@ def parse_structured_response(raw_response: str) -> Dict[str, Any]:
         # Extract SOURCES section
         sources_match = re.search(r'SOURCES:\s*(.*?)$', raw_response, re.DOTALL | re.IGNORECASE)
         if sources_match:
-            sources_text = sources_match.group(1).strip()
-            # Extract individual sources (lines starting with -, *, or numbers)
-            sources = [
-                re.sub(r'^[\-\*\d\.]+\s*', '', line.strip()) 
-                for line in sources_text.split('\n') 
-                if line.strip() and (line.strip().startswith('-') or line.strip().startswith('*') or re.match(r'^\d+\.', line.strip()))
-            ]
+            sources = _parse_list_section(sources_match.group(1).strip())
             
     except Exception as e:
         # Fallback: use entire response as markdown
@@ -89,16 +103,108 @@ def parse_structured_response(raw_response: str) -> Dict[str, Any]:
         "sources": sources
     }
 
-async def generate_teaching_response(
+
+class StructuredResponseStreamParser:
+    """
+    Incremental version of parse_structured_response for streamed responses.
+    
+    feed() returns typed section events as soon as each section is closed by
+    the next section header; close() flushes the final section.
+    """
+    
+    _header_pattern = re.compile(r'(KEY_TOPICS|CONCEPT_CONNECTIONS|EXPLANATION|SOURCES):', re.IGNORECASE)
+    _max_header_length = max(len(h) for h in SECTION_HEADERS) + 1
+    
+    def __init__(self):
+        self.buffer = ""
+        self.current_section = None
+        self.section_start = 0
+        self.scan_position = 0
+        self.emitted_sections = set()
+    
+    def feed(self, text: str) -> List[Dict[str, Any]]:
+        self.buffer += text
+        events = []
+        for match in self._header_pattern.finditer(self.buffer, self.scan_position):
+            if self.current_section:
+                events.extend(self._close_section(self.buffer[self.section_start:match.start()]))
+            self.current_section = match.group(1).upper()
+            self.section_start = match.end()
+        # A header may be split across chunks - rescan the tail next time
+        self.scan_position = max(self.section_start, len(self.buffer) - self._max_header_length)
+        return events
+    
+    def close(self) -> List[Dict[str, Any]]:
+        if self.current_section:
+            events = self._close_section(self.buffer[self.section_start:])
+            self.current_section = None
+            return events
+        if "EXPLANATION" not in self.emitted_sections:
+            # No structured format found, the whole response is the explanation
+            self.emitted_sections.add("EXPLANATION")
+            return [{"event": "explanation", "data": self.buffer.strip()}]
+        return []
+    
+    def _close_section(self, section_text: str) -> List[Dict[str, Any]]:
+        section = self.current_section
+        section_text = section_text.strip()
+        if section in self.emitted_sections:
+            return []
+        self.emitted_sections.add(section)
+        
+        if section == "KEY_TOPICS":
+            return [{"event": "key_topics", "data": _parse_list_section(section_text)}]
+        if section == "CONCEPT_CONNECTIONS":
+            return [{"event": "concept_connections", "data": _parse_connections_section(section_text)}]
+        if section == "EXPLANATION":
+            return [{"event": "explanation", "data": section_text}]
+        return [{"event": "sources", "data": _parse_list_section(section_text)}]
+
+
+def format_chunks_context(context_chunks: List[Dict[str, Any]]) -> str:
+    """
+    Render retrieved material chunks for a prompt, grouped by material
+    """
+    context = ""
+    current_material = None
+    for chunk in context_chunks:
+        if chunk.get('material_id') != current_material:
+            current_material = chunk.get('material_id')
+            context += f"\n{chunk.get('material_type', 'Material').upper()}: {chunk.get('material_title', 'Untitled')}\n"
+        context += f"{chunk.get('text', '')}\n"
+    return context
+
+
+def format_conversation_context(summary: str, recent_messages: List[Dict[str, Any]]) -> str:
+    """
+    Earlier turns of the session for the prompt: running summary plus the latest messages
+    """
+    if not summary and not recent_messages:
+        return ""
+    
+    context = "\n\nCONVERSATION SO FAR (continue from here, don't repeat yourself):\n"
+    if summary:
+        context += f"Summary of earlier discussion: {summary}\n"
+    if recent_messages:
+        context += "\nMost recent messages:\n"
+        for message in recent_messages:
+            speaker = "Student" if message.get("role") == "user" else "Brillia"
+            content = message.get("content", "")
+            if len(content) > CONTEXT_MESSAGE_CHARS:
+                content = content[:CONTEXT_MESSAGE_CHARS] + "..."
+            context += f"{speaker}: {content}\n"
+    return context
+
+
+def build_teaching_system_message(
     course: Dict[str, Any],
     materials: List[Dict[str, Any]],
-    user_message: str,
-    chat_history: List[Dict[str, Any]],
-    session_id: str,
-    student_major: str = None
-) -> Dict[str, Any]:
+    student_major: str = None,
+    context_chunks: List[Dict[str, Any]] = None,
+    conversation_context: str = ""
+) -> str:
     """
-    Generate an AI teaching response using Claude Sonnet 4
+    Build the Brillia teaching system prompt for a course
     Personalizes explanations based on student's major
     """
     
@@ -114,17 +220,22 @@ Description: {course.get('description', 'No description')}
     
     # Add materials context (limited to avoid token limits)
     materials_context = "\n\nCourse Materials (use these titles in SOURCES section):\n"
-    material_titles = []
-    for material in materials[:5]:  # Limit to first 5 materials
-        title = material.get('title', 'Untitled')
-        mat_type = material.get('material_type', 'Material').upper()
-        material_titles.append(f"{mat_type}: {title}")
-        materials_context += f"\n{mat_type}: {title}\n"
-        content = material.get('content', '')
-        # Limit content length
-        if len(content) > 2000:
-            content = content[:2000] + "...\n[Content truncated for brevity]"
-        materials_context += f"{content}\n"
+    if context_chunks is not None:
+        # Only the retrieved chunks relevant to this question
+        for material in materials:
+            materials_context += f"- {material.get('material_type', 'Material').upper()}: {material.get('title', 'Untitled')}\n"
+        materials_context += "\nRelevant excerpts:\n"
+        materials_context += format_chunks_context(context_chunks)
+    else:
+        for material in materials[:5]:  # Limit to first 5 materials
+            title = material.get('title', 'Untitled')
+            mat_type = material.get('material_type', 'Material').upper()
+            materials_context += f"\n{mat_type}: {title}\n"
+            content = material_text(material)
+            # Limit content length
+            if len(content) > 2000:
+                content = content[:2000] + "...\n[Content truncated for brevity]"
+            materials_context += f"{content}\n"
     
     # Add personalization context if student major is available
     personalization_context = ""
@@ -159,7 +270,7 @@ Your teaching philosophy:
 {personalization_context}
 
 {course_context}
-{materials_context}
+{materials_context}{conversation_context}
 
 CRITICAL: You MUST structure your response in the following EXACT format. This is non-negotiable:
 
@@ -196,19 +307,36 @@ When answering:
 - Show relationships between concepts as connections
 - Reference specific materials (lecture notes, syllabus, assignments) you drew information from
 """
-    
-    # Initialize chat with Claude Sonnet 4
-    chat = LlmChat(
-        api_key=EMERGENT_LLM_KEY,
-        session_id=session_id,
-        system_message=system_message
-    ).with_model("anthropic", "claude-3-7-sonnet-20250219")
-    
-    # Create user message
-    message = UserMessage(text=user_message)
+    return system_message
+
+
+async def generate_teaching_response(
+    course: Dict[str, Any],
+    materials: List[Dict[str, Any]],
+    user_message: str,
+    chat_history: List[Dict[str, Any]],
+    session_id: str,
+    student_major: str = None,
+    context_chunks: List[Dict[str, Any]] = None,
+    conversation_summary: str = ""
+) -> Dict[str, Any]:
+    """
+    Generate an AI teaching response using Claude Sonnet 4
+    Personalizes explanations based on student's major
+    chat_history is the session's recent messages; older turns arrive as conversation_summary
+    """
+    system_message = build_teaching_system_message(
+        course, materials, student_major, context_chunks,
+        format_conversation_context(conversation_summary, chat_history)
+    )
     
     # Get response
-    response = await chat.send_message(message)
+    response = await llm_gateway.complete(
+        system_message,
+        user_message,
+        model=TEACHING_MODEL,
+        session_id=session_id
+    )
     
     # Parse the structured response
     parsed_response = parse_structured_response(response)
@@ -216,24 +344,57 @@ When answering:
     return parsed_response
 
 
+async def stream_teaching_response(
+    course: Dict[str, Any],
+    materials: List[Dict[str, Any]],
+    user_message: str,
+    chat_history: List[Dict[str, Any]],
+    session_id: str,
+    student_major: str = None,
+    context_chunks: List[Dict[str, Any]] = None,
+    conversation_summary: str = ""
+) -> AsyncIterator[str]:
+    """
+    Stream an AI teaching response token by token
+    Arrives as a single non-streamed chunk when the LLM transport can't stream
+    or the streaming call fails before any output
+    """
+    system_message = build_teaching_system_message(
+        course, materials, student_major, context_chunks,
+        format_conversation_context(conversation_summary, chat_history)
+    )
+    
+    async for delta in llm_gateway.stream(
+        system_message,
+        user_message,
+        model=TEACHING_MODEL,
+        session_id=session_id
+    ):
+        yield delta
+
+
 async def generate_quiz(
     course: Dict[str, Any],
     materials: List[Dict[str, Any]],
     topic: str = None,
-    num_questions: int = 5
+    num_questions: int = 5,
+    context_chunks: List[Dict[str, Any]] = None
 ) -> List[Dict[str, Any]]:
     """
-    Generate quiz questions based on course materials
+    Generate quiz questions based on course materials (or retrieved chunks of them)
     """
     
     # Build context from course materials
     materials_context = "Course Materials:\n"
-    for material in materials[:5]:
-        materials_context += f"\n{material.get('material_type', 'Material').upper()}: {material.get('title', 'Untitled')}\n"
-        content = material.get('content', '')
-        if len(content) > 2000:
-            content = content[:2000] + "..."
-        materials_context += f"{content}\n"
+    if context_chunks is not None:
+        materials_context += format_chunks_context(context_chunks)
+    else:
+        for material in materials[:5]:
+            materials_context += f"\n{material.get('material_type', 'Material').upper()}: {material.get('title', 'Untitled')}\n"
+            content = material_text(material)
+            if len(content) > 2000:
+                content = content[:2000] + "..."
+            materials_context += f"{content}\n"
     
     topic_instruction = f"Focus specifically on: {topic}" if topic else "Cover various topics from the course materials"
     
@@ -264,18 +425,11 @@ FORMAT YOUR RESPONSE AS JSON:
 
 CRITICAL: Return ONLY valid JSON, no other text."""
     
-    # Initialize chat with Claude Sonnet 4
-    chat = LlmChat(
-        api_key=EMERGENT_LLM_KEY,
-        session_id=str(uuid.uuid4()),
-        system_message=system_message
-    ).with_model("anthropic", "claude-3-7-sonnet-20250219")
-    
-    # Create message
-    message = UserMessage(text=f"Generate {num_questions} quiz questions following the format specified.")
-    
     # Get response
-    response = await chat.send_message(message)
+    response = await llm_gateway.complete(
+        system_message,
+        f"Generate {num_questions} quiz questions following the format specified."
+    )
     
     try:
         # Parse JSON response
@@ -294,19 +448,42 @@ CRITICAL: Return ONLY valid JSON, no other text."""
         return []
 
 
-async def generate_content_summary(concept: str, materials: List[Dict[str, Any]]) -> str:
+async def summarize_conversation(previous_summary: str, messages: List[Dict[str, Any]]) -> str:
     """
-    Generate a concise summary of a concept from course materials
+    Fold older chat messages into a session's running summary
     """
-    # Extract relevant content from materials
-    relevant_content = []
-    for material in materials:
-        content = material.get("content", "")
-        # Simple relevance check
-        if concept.lower() in content.lower():
-            relevant_content.append(content[:500])  # First 500 chars
+    transcript = "\n".join(
+        f"{'Student' if message.get('role') == 'user' else 'Brillia'}: {message.get('content', '')[:CONTEXT_MESSAGE_CHARS]}"
+        for message in messages
+    )
     
-    context = "\n\n".join(relevant_content[:3]) if relevant_content else "No specific materials found."
+    system_prompt = """You maintain a running summary of a tutoring conversation between a student and Brillia, an AI teaching assistant.
+    Merge the new messages into the existing summary. Keep what the student asked about, what was explained,
+    where they struggled and what they understood. Write plain prose, no headings."""
+    
+    user_prompt = f"""Existing summary:
+{previous_summary or "(none yet)"}
+
+New messages:
+{transcript}
+
+Write the updated summary in under {CONVERSATION_SUMMARY_CHARS // 6} words."""
+    
+    response = await llm_gateway.complete(system_prompt, user_prompt, model=REVIEW_MODEL)
+    return response.strip()[:CONVERSATION_SUMMARY_CHARS]
+
+
+def _card_context(context_chunks: List[Dict[str, Any]], fallback: str) -> str:
+    """Retrieved chunks for a review card prompt, each cut to CARD_CHUNK_CHARS"""
+    relevant_content = [chunk.get('text', '')[:CARD_CHUNK_CHARS] for chunk in context_chunks[:3]]
+    return "\n\n".join(relevant_content) if relevant_content else fallback
+
+
+async def generate_content_summary(concept: str, context_chunks: List[Dict[str, Any]]) -> str:
+    """
+    Generate a concise summary of a concept from the material chunks retrieved for it
+    """
+    context = _card_context(context_chunks, "No specific materials found.")
     
     system_prompt = """You are an educational assistant helping students review concepts. 
     Create a concise, clear summary (3-4 sentences) of the given concept that a student can quickly read to refresh their understanding.
@@ -320,29 +497,27 @@ Relevant course materials:
 Create a brief, engaging summary that helps a student review this concept. Keep it to 3-4 sentences maximum."""
     
     try:
-        client = LlmChat(api_key=EMERGENT_LLM_KEY, model="claude-sonnet-4-20250514")
-        response = client.send_message(
-            user_message=UserMessage(content=user_prompt),
-            system_message=system_prompt
-        )
+        response = await llm_gateway.complete(system_prompt, user_prompt, model=REVIEW_MODEL, use_cache=True)
         return response.strip()
     except Exception as e:
         print(f"Error generating summary: {e}")
         return f"Review the concept of {concept}. Focus on understanding the fundamentals and how it connects to other topics in the course."
 
 
-async def generate_quick_quiz(concept: str, materials: List[Dict[str, Any]]) -> Dict[str, Any]:
+def _is_quick_quiz(quiz_data: Any) -> bool:
+    return (
+        isinstance(quiz_data, dict) and
+        bool(quiz_data.get("question")) and
+        isinstance(quiz_data.get("options"), list) and
+        len(quiz_data["options"]) >= 2
+    )
+
+
+async def generate_quick_quiz(concept: str, context_chunks: List[Dict[str, Any]]) -> Dict[str, Any]:
     """
-    Generate a single quick quiz question for a concept
+    Generate a single quick quiz question for a concept from the material chunks retrieved for it
     """
-    # Extract relevant content
-    relevant_content = []
-    for material in materials:
-        content = material.get("content", "")
-        if concept.lower() in content.lower():
-            relevant_content.append(content[:500])
-    
-    context = "\n\n".join(relevant_content[:3]) if relevant_content else "General knowledge."
+    context = _card_context(context_chunks, "General knowledge.")
     
     system_prompt = """You are an educational quiz generator. Create a single, clear multiple-choice question 
     to test understanding of a concept. The question should be at an appropriate difficulty level for review."""
@@ -363,19 +538,15 @@ Generate ONE multiple-choice question in this exact JSON format:
 Make the question clear and the options plausible."""
     
     try:
-        client = LlmChat(api_key=EMERGENT_LLM_KEY, model="claude-sonnet-4-20250514")
-        response = client.send_message(
-            user_message=UserMessage(content=user_prompt),
-            system_message=system_prompt
+        response = await llm_gateway.complete(
+            system_prompt,
+            user_prompt,
+            model=REVIEW_MODEL,
+            use_cache=True,
+            validate=lambda text: _is_quick_quiz(llm_gateway.parse_json_response(text))
         )
         
-        # Parse JSON response
-        response_text = response.strip()
-        if response_text.startswith('```'):
-            response_text = re.sub(r'^```json\s*', '', response_text)
-            response_text = re.sub(r'```\s*$', '', response_text)
-        
-        quiz_data = json.loads(response_text)
+        quiz_data = llm_gateway.parse_json_response(response)
         return quiz_data
     except Exception as e:
         print(f"Error generating quick quiz: {e}")
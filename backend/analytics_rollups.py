@@ -0,0 +1,461 @@
+"""
+Course Analytics Rollups
+Per-course counters maintained incrementally on the chat and quiz write paths,
+so the professor dashboard reads one document instead of rescanning history
+"""
+from typing import Dict, Any, Optional
+from database import get_database
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from collections import Counter
+from datetime import datetime, timedelta
+import os
+import re
+import uuid
+
+# Bumped whenever the rollup shape changes; rollups written by an older version
+# (or created by an incremental write before any backfill) are rebuilt on read
+ROLLUP_SCHEMA_VERSION = 2
+
+# Topic words kept per course - the long tail is pruned every TOPIC_WORDS_PRUNE_EVERY questions
+TOPIC_WORDS_LIMIT = int(os.getenv("ANALYTICS_TOPIC_WORDS_LIMIT", "500"))
+TOPIC_WORDS_PRUNE_EVERY = int(os.getenv("ANALYTICS_TOPIC_WORDS_PRUNE_EVERY", "200"))
+# Days of daily buckets the dashboard shows - older buckets are pruned with the topic words
+DAILY_WINDOW_DAYS = 7
+# A rebuild claimed longer ago than this is assumed to have died and is taken over
+REBUILD_STALE_SECONDS = int(os.getenv("ANALYTICS_REBUILD_STALE_SECONDS", "600"))
+
+# Rollup fields that aren't counters, left out when reconciling a rebuild with live increments
+ROLLUP_METADATA_FIELDS = {
+    "course_id", "schema_version", "updated_at", "rebuild_id", "rebuild_started_at",
+    "active_student_count", "quiz_topic_names", "wrong_answer_topic_names"
+}
+
+TOPIC_STOP_WORDS = {
+    'what', 'how', 'why', 'when', 'where', 'which', 'this', 'that', 'with', 'from', 'about',
+    'could', 'would', 'should', 'help', 'explain', 'understand', 'please', 'thanks', 'thank',
+    'quiz', 'test'
+}
+
+
+def _field_key(name: str) -> str:
+    """Make an arbitrary topic name safe to use as a MongoDB field name"""
+    return name.replace('.', '．').replace('$', '＄') or '_'
+
+
+def _topic_words(text: str) -> Counter:
+    words = re.findall(r'\b\w{4,}\b', text.lower())
+    return Counter(word for word in words if word not in TOPIC_STOP_WORDS)
+
+
+STUDENT_TERM_STOP_WORDS = {
+    'what', 'which', 'where', 'when', 'would', 'could', 'should',
+    'about', 'their', 'there', 'these', 'those', 'explain', 'understand'
+}
+
+
+def _student_terms(text: str) -> Counter:
+    words = re.findall(r'\b\w{5,}\b', text.lower())
+    return Counter(word for word in words if word not in STUDENT_TERM_STOP_WORDS)
+
+
+def _day_key(timestamp) -> str:
+    if isinstance(timestamp, datetime):
+        return timestamp.date().isoformat()
+    return str(timestamp)[:10]
+
+
+def _iso(timestamp) -> str:
+    return timestamp.isoformat() if isinstance(timestamp, datetime) else str(timestamp)
+
+
+async def _record_active_student(course_id: str, student_id: str):
+    """
+    Count a student towards the course's active students the first time they show up
+    Membership lives in course_active_students so the rollup only holds the count
+    """
+    db = get_database()
+
+    result = await db.course_active_students.update_one(
+        {"course_id": course_id, "student_id": student_id},
+        {"$setOnInsert": {"first_seen_at": datetime.utcnow().isoformat()}},
+        upsert=True
+    )
+    if result.upserted_id is not None:
+        await db.course_analytics.update_one(
+            {"course_id": course_id},
+            {"$inc": {"active_student_count": 1}},
+            upsert=True
+        )
+
+
+def _pruned_topic_words(topic_words: Dict[str, int]) -> list:
+    """Topic words outside the TOPIC_WORDS_LIMIT most frequent"""
+    ranked = sorted(topic_words.items(), key=lambda item: item[1], reverse=True)
+    return [word for word, _ in ranked[TOPIC_WORDS_LIMIT:]]
+
+
+def _expired_days(daily: Dict[str, Any]) -> list:
+    """Daily buckets older than the dashboard window"""
+    oldest = (datetime.utcnow().date() - timedelta(days=DAILY_WINDOW_DAYS - 1)).isoformat()
+    return [day for day in daily if day < oldest]
+
+
+async def prune_course_rollup(course_id: str):
+    """
+    Drop the long tail of a course's topic words and daily buckets outside the window
+    Only the dropped fields are unset, so concurrent increments of kept ones survive
+    """
+    db = get_database()
+
+    rollup = await db.course_analytics.find_one({"course_id": course_id}, {"_id": 0, "topic_words": 1, "daily": 1})
+    rollup = rollup or {}
+    dropped = [f"topic_words.{word}" for word in _pruned_topic_words(rollup.get("topic_words", {}))]
+    dropped += [f"daily.{day}" for day in _expired_days(rollup.get("daily", {}))]
+    if dropped:
+        await db.course_analytics.update_one(
+            {"course_id": course_id},
+            {"$unset": {path: "" for path in dropped}}
+        )
+
+
+async def record_chat_question(course_id: str, student_id: str, text: str, timestamp: Optional[datetime] = None):
+    """
+    Fold one student question into the course rollup
+    """
+    db = get_database()
+    day = _day_key(timestamp or datetime.utcnow())
+
+    increments = {f"topic_words.{word}": count for word, count in _topic_words(text).items()}
+    increments["total_questions"] = 1
+    increments[f"daily.{day}.questions"] = 1
+
+    rollup = await db.course_analytics.find_one_and_update(
+        {"course_id": course_id},
+        {
+            "$inc": increments,
+            "$set": {"updated_at": datetime.utcnow().isoformat()}
+        },
+        projection={"_id": 0, "total_questions": 1},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    await _record_active_student(course_id, student_id)
+    if rollup["total_questions"] % TOPIC_WORDS_PRUNE_EVERY == 0:
+        await prune_course_rollup(course_id)
+    await record_student_terms(course_id, student_id, text)
+
+
+async def record_student_terms(course_id: str, student_id: str, text: str):
+    """
+    Fold one question into the student's per-course term counts
+    """
+    db = get_database()
+
+    increments = {f"terms.{word}": count for word, count in _student_terms(text).items()}
+    increments["message_count"] = 1
+
+    await db.student_term_counts.update_one(
+        {"course_id": course_id, "student_id": student_id},
+        {"$inc": increments},
+        upsert=True
+    )
+
+
+async def rebuild_student_terms(course_id: str, student_id: str) -> Dict[str, Any]:
+    """
+    Recompute a student's term counts from their chat messages (backfill)
+    """
+    db = get_database()
+
+    terms = Counter()
+    message_count = 0
+    async for message in db.chat_messages.find(
+        {"course_id": course_id, "student_id": student_id, "role": "user"},
+        {"content": 1}
+    ):
+        message_count += 1
+        terms.update(_student_terms(message["content"]))
+
+    term_doc = {
+        "course_id": course_id,
+        "student_id": student_id,
+        "terms": dict(terms),
+        "message_count": message_count
+    }
+    await db.student_term_counts.replace_one(
+        {"course_id": course_id, "student_id": student_id},
+        term_doc,
+        upsert=True
+    )
+    return term_doc
+
+
+def _quiz_attempt_increments(attempt: Dict[str, Any]) -> Dict[str, Any]:
+    topic = attempt.get("topic") or "General"
+    topic_key = _field_key(topic)
+
+    increments = Counter({
+        "total_quizzes": 1,
+        "quiz_score_sum": attempt.get("score", 0),
+        "quiz_possible_sum": attempt.get("total_questions", 0),
+        f"quiz_topics.{topic_key}.correct": attempt.get("score", 0),
+        f"quiz_topics.{topic_key}.total": attempt.get("total_questions", 0),
+        f"daily.{_day_key(attempt['completed_at'])}.quizzes": 1
+    })
+    for answer in attempt.get("answers", []):
+        if not answer.get("is_correct", True):
+            increments[f"wrong_answer_topics.{_field_key(answer.get('topic', 'Unknown'))}"] += 1
+    return increments
+
+
+def _topic_names(attempt: Dict[str, Any]) -> Dict[str, str]:
+    """Original topic names for the encoded keys touched by an attempt"""
+    names = {}
+    topic = attempt.get("topic") or "General"
+    names[f"quiz_topic_names.{_field_key(topic)}"] = topic
+    for answer in attempt.get("answers", []):
+        if not answer.get("is_correct", True):
+            wrong_topic = answer.get("topic", "Unknown")
+            names[f"wrong_answer_topic_names.{_field_key(wrong_topic)}"] = wrong_topic
+    return names
+
+
+async def record_quiz_attempt(attempt: Dict[str, Any]):
+    """
+    Fold one quiz attempt into the course rollup
+    """
+    db = get_database()
+
+    await db.course_analytics.update_one(
+        {"course_id": attempt["course_id"]},
+        {
+            "$inc": dict(_quiz_attempt_increments(attempt)),
+            "$set": {**_topic_names(attempt), "updated_at": datetime.utcnow().isoformat()}
+        },
+        upsert=True
+    )
+    await _record_active_student(attempt["course_id"], attempt["student_id"])
+
+
+def _counter_paths(document: Dict[str, Any], prefix: str = "") -> Dict[str, Any]:
+    """Numeric leaves of a rollup as dotted paths, skipping metadata fields"""
+    paths = {}
+    for key, value in document.items():
+        if not prefix and key in ROLLUP_METADATA_FIELDS:
+            continue
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            paths.update(_counter_paths(value, f"{path}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            paths[path] = value
+    return paths
+
+
+async def _claim_rollup_rebuild(course_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Claim the rebuild of a course rollup - only one request across all workers
+    rebuilds it. Returns the rollup as it was at the claim (with the claim's
+    rebuild_id and start time), or None if another rebuild is in progress
+    """
+    db = get_database()
+    now = datetime.utcnow()
+    claim = {"rebuild_id": str(uuid.uuid4()), "rebuild_started_at": now.isoformat()}
+
+    try:
+        await db.course_analytics.insert_one({"course_id": course_id, **claim})
+        return {"course_id": course_id, **claim}
+    except DuplicateKeyError:
+        pass
+
+    # Claim a rollup nobody is rebuilding, or take over a rebuild whose owner died
+    stale_before = (now - timedelta(seconds=REBUILD_STALE_SECONDS)).isoformat()
+    return await db.course_analytics.find_one_and_update(
+        {
+            "course_id": course_id,
+            "$or": [
+                {"rebuild_id": {"$exists": False}},
+                {"rebuild_started_at": {"$lt": stale_before}}
+            ]
+        },
+        {"$set": claim},
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER
+    )
+
+
+async def rebuild_course_rollup(course_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Recompute a course rollup from chat_messages and quiz_attempts (backfill)
+    Counts the history before the claim, then moves each counter by the difference
+    from its value at the claim with $inc, so live increments landing during the
+    rebuild are kept. Returns None if another rebuild holds the claim
+    """
+    db = get_database()
+
+    claimed = await _claim_rollup_rebuild(course_id)
+    if claimed is None:
+        return None
+    cutoff = claimed["rebuild_started_at"]
+
+    totals = Counter()
+    names = {}
+    active_students = set()
+    student_terms = {}
+    student_messages = Counter()
+
+    async for message in db.chat_messages.find(
+        {"course_id": course_id, "role": "user"},
+        {"student_id": 1, "content": 1, "timestamp": 1}
+    ):
+        if _iso(message["timestamp"]) >= cutoff:
+            continue
+        active_students.add(message["student_id"])
+        student_messages[message["student_id"]] += 1
+        student_terms.setdefault(message["student_id"], Counter()).update(_student_terms(message["content"]))
+        totals["total_questions"] += 1
+        totals[f"daily.{_day_key(message['timestamp'])}.questions"] += 1
+        for word, count in _topic_words(message["content"]).items():
+            totals[f"topic_words.{word}"] += count
+
+    async for attempt in db.quiz_attempts.find({"course_id": course_id}, {"_id": 0}):
+        if _iso(attempt["completed_at"]) >= cutoff:
+            continue
+        active_students.add(attempt["student_id"])
+        totals.update(_quiz_attempt_increments(attempt))
+        names.update(_topic_names(attempt))
+
+    # Students the rebuild adds to course_active_students are counted like live ones
+    new_students = 0
+    for student_id in active_students:
+        result = await db.course_active_students.update_one(
+            {"course_id": course_id, "student_id": student_id},
+            {"$setOnInsert": {"first_seen_at": cutoff}},
+            upsert=True
+        )
+        if result.upserted_id is not None:
+            new_students += 1
+
+    at_claim = _counter_paths(claimed)
+    increments = {
+        path: totals.get(path, 0) - at_claim.get(path, 0)
+        for path in set(totals) | set(at_claim)
+        if totals.get(path, 0) != at_claim.get(path, 0)
+    }
+    if new_students:
+        increments["active_student_count"] = new_students
+
+    update = {
+        "$set": {**names, "schema_version": ROLLUP_SCHEMA_VERSION, "updated_at": datetime.utcnow().isoformat()},
+        # active_students is the member list rollups carried before schema version 2
+        "$unset": {"rebuild_id": "", "rebuild_started_at": "", "active_students": ""}
+    }
+    if increments:
+        update["$inc"] = increments
+    # Only the current claim may apply its differences - a rebuild that was
+    # taken over as stale matches nothing here
+    rollup = await db.course_analytics.find_one_and_update(
+        {"course_id": course_id, "rebuild_id": claimed["rebuild_id"]},
+        update,
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER
+    )
+    if rollup is None:
+        return None
+    await prune_course_rollup(course_id)
+
+    for student_id, terms in student_terms.items():
+        await db.student_term_counts.replace_one(
+            {"course_id": course_id, "student_id": student_id},
+            {
+                "course_id": course_id,
+                "student_id": student_id,
+                "terms": dict(terms),
+                "message_count": student_messages[student_id]
+            },
+            upsert=True
+        )
+    return await db.course_analytics.find_one({"course_id": course_id}, {"_id": 0})
+
+
+async def get_course_rollup(course_id: str) -> Dict[str, Any]:
+    """
+    Read a course rollup, backfilling it once for courses that predate rollups
+    A rollup without the current schema_version was only ever written incrementally
+    (e.g. by a chat or quiz before its first read) and is missing earlier history.
+    While another request is rebuilding it, the partial rollup is served as is
+    """
+    db = get_database()
+    rollup = await db.course_analytics.find_one({"course_id": course_id}, {"_id": 0})
+    if rollup is None or rollup.get("schema_version", 0) < ROLLUP_SCHEMA_VERSION:
+        rollup = await rebuild_course_rollup(course_id) or rollup or {"course_id": course_id}
+    return rollup
+
+
+def summarize_course_rollup(rollup: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Shape a rollup document into the course analytics dashboard payload
+    """
+    # === CHAT ANALYTICS ===
+    total_questions = rollup.get("total_questions", 0)
+    active_students = rollup.get("active_student_count", 0)
+
+    word_counts = Counter(rollup.get("topic_words", {}))
+    common_topics = [
+        {"topic": word, "count": count}
+        for word, count in word_counts.most_common(10)
+    ]
+
+    # === QUIZ ANALYTICS ===
+    total_quizzes = rollup.get("total_quizzes", 0)
+    total_possible = rollup.get("quiz_possible_sum", 0)
+    avg_score = round((rollup.get("quiz_score_sum", 0) / total_possible) * 100) if total_possible > 0 else 0
+
+    topic_names = rollup.get("quiz_topic_names", {})
+    quiz_topics = [
+        {
+            "topic": topic_names.get(key, key),
+            "avg_score": round((data.get("correct", 0) / data["total"]) * 100) if data.get("total", 0) > 0 else 0,
+            "attempts": data.get("total", 0) // 5  # Assuming 5 questions per quiz
+        }
+        for key, data in rollup.get("quiz_topics", {}).items()
+    ]
+
+    # Struggling topics (lowest quiz scores)
+    struggling_topics = sorted(quiz_topics, key=lambda x: x["avg_score"])[:5]
+
+    # Most common wrong answers
+    wrong_names = rollup.get("wrong_answer_topic_names", {})
+    wrong_answer_counts = Counter({
+        wrong_names.get(key, key): count
+        for key, count in rollup.get("wrong_answer_topics", {}).items()
+    })
+    confusion_points = [
+        f"{topic} ({count} incorrect answers)"
+        for topic, count in wrong_answer_counts.most_common(5)
+    ]
+
+    # === ENGAGEMENT METRICS ===
+    daily = rollup.get("daily", {})
+    today = datetime.utcnow().date()
+    engagement_trend = []
+    for i in range(DAILY_WINDOW_DAYS - 1, -1, -1):
+        day = today - timedelta(days=i)
+        counts = daily.get(day.isoformat(), {})
+        engagement_trend.append({
+            "date": day.strftime("%m/%d"),
+            "questions": counts.get("questions", 0),
+            "quizzes": counts.get("quizzes", 0)
+        })
+
+    return {
+        "total_questions": total_questions,
+        "active_students": active_students,
+        "common_topics": common_topics,
+        "confusion_points": confusion_points if confusion_points else ["No struggling topics yet"],
+        "engagement_trend": engagement_trend,
+        "total_quizzes": total_quizzes,
+        "avg_quiz_score": avg_score,
+        "quiz_topics": quiz_topics,
+        "struggling_topics": [t["topic"] for t in struggling_topics] if struggling_topics else []
+    }
@@ -0,0 +1,100 @@
+"""
+Per-worker auth throughput benchmark
+
+hash: how many password checks one API worker can do per second at the
+configured BCRYPT_ROUNDS / PASSWORD_HASH_WORKERS, and how much the event loop
+stalls meanwhile - inline (the old behaviour) versus offloaded to the hash pool
+
+jwt: access-token decodes per second for each JWT backend, uncached and
+through the verified-token cache used when resolving request identity
+
+Usage:
+    python auth_benchmark.py hash             # 50 logins
+    python auth_benchmark.py hash <logins>
+    python auth_benchmark.py jwt              # 20000 decodes
+    python auth_benchmark.py jwt <decodes>
+"""
+import asyncio
+import statistics
+import sys
+import time
+from auth_utils import (
+    BCRYPT_ROUNDS,
+    PASSWORD_HASH_WORKERS,
+    JWT_DECODERS,
+    create_access_token,
+    decode_access_token,
+    get_password_hash,
+    verify_password,
+    verify_and_update_password
+)
+
+LAG_PROBE_SECONDS = 0.01
+
+
+async def _probe_loop_lag(lags: list, stop: asyncio.Event):
+    """Record how late a short sleep wakes up - the stall every other request would see"""
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(LAG_PROBE_SECONDS)
+        lags.append(time.perf_counter() - started - LAG_PROBE_SECONDS)
+
+
+async def _run(label: str, login, logins: int):
+    lags = []
+    stop = asyncio.Event()
+    probe = asyncio.create_task(_probe_loop_lag(lags, stop))
+    await asyncio.sleep(0)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(login() for _ in range(logins)))
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    await probe
+    lags_ms = sorted(lag * 1000 for lag in lags) or [0.0]
+    print(
+        f"{label:<10} {logins / elapsed:8.1f} logins/s   "
+        f"loop lag p50 {statistics.median(lags_ms):7.1f}ms  max {lags_ms[-1]:7.1f}ms"
+    )
+
+
+async def benchmark_hashing(logins: int):
+    password = "correct horse battery staple"
+    stored_hash = get_password_hash(password)
+    print(f"bcrypt rounds={BCRYPT_ROUNDS}, hash pool workers={PASSWORD_HASH_WORKERS}, {logins} logins")
+
+    async def inline_login():
+        verify_password(password, stored_hash)
+
+    async def offloaded_login():
+        await verify_and_update_password(password, stored_hash)
+
+    await _run("inline", inline_login, logins)
+    await _run("offloaded", offloaded_login, logins)
+
+
+def benchmark_jwt(decodes: int):
+    token = create_access_token({"sub": "benchmark-user", "email": "benchmark@example.com", "role": "student"})
+    print(f"{decodes} decodes of one access token")
+
+    decoders = dict(JWT_DECODERS)
+    decoders["cached"] = decode_access_token
+    for label, decode in decoders.items():
+        started = time.perf_counter()
+        for _ in range(decodes):
+            decode(token)
+        elapsed = time.perf_counter() - started
+        print(f"{label:<10} {decodes / elapsed:10.0f} decodes/s   {elapsed / decodes * 1e6:7.1f}us each")
+
+
+if __name__ == "__main__":
+    mode = sys.argv[1] if len(sys.argv) > 1 else None
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    if mode == "hash":
+        asyncio.run(benchmark_hashing(count or 50))
+    elif mode == "jwt":
+        benchmark_jwt(count or 20000)
+    else:
+        print(__doc__)
+        sys.exit(1)
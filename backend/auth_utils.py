@@ -1,11 +1,15 @@
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
 from jose import JWTError, jwt
+import jwt as pyjwt
 from passlib.context import CryptContext
-from fastapi import Depends, HTTPException, status
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from cachetools import TLRUCache
 from dotenv import load_dotenv
+import asyncio
+import hashlib
 import os
+import time
 
 load_dotenv()
 
@@ -13,8 +17,27 @@ SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "10080"))
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-security = HTTPBearer()
+# JWT library used to verify tokens: "jose" (python-jose) or "pyjwt" (PyJWT, faster)
+JWT_BACKEND = os.getenv("JWT_BACKEND", "jose").lower()
+# Verified token payloads kept per worker; each entry expires with its token
+JWT_CACHE_MAX_ENTRIES = int(os.getenv("JWT_CACHE_MAX_ENTRIES", "10000"))
+
+# bcrypt cost factor - hashes made with any other cost are rehashed on the next login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# Threads hashing passwords at once (bcrypt releases the GIL, so this is real parallelism)
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS
+)
+
+# Dedicated pool so a burst of logins queues here instead of blocking the event
+# loop or starving the default executor used by file parsing and other to_thread calls
+_hash_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
@@ -22,6 +45,20 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
+async def hash_password(password: str) -> str:
+    """get_password_hash off the event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_hash_executor, get_password_hash, password)
+
+async def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    Verify a password off the event loop
+    Returns (valid, new_hash) - new_hash is set when the stored hash should be
+    replaced because it was made with a different cost factor or scheme
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_hash_executor, pwd_context.verify_and_update, plain_password, hashed_password)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -32,18 +69,52 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
+def _decode_jose(token: str) -> dict:
+    return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+
+def _decode_pyjwt(token: str) -> dict:
     try:
-        token = credentials.credentials
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: str = payload.get("sub")
-        if user_id is None:
-            raise credentials_exception
-        return payload
-    except JWTError:
-        raise credentials_exception
+        return pyjwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM], options={"verify_sub": False})
+    except pyjwt.PyJWTError as e:
+        raise JWTError(str(e))
+
+JWT_DECODERS = {"jose": _decode_jose, "pyjwt": _decode_pyjwt}
+if JWT_BACKEND not in JWT_DECODERS:
+    raise ValueError(f"Unknown JWT_BACKEND {JWT_BACKEND!r} (expected one of {', '.join(JWT_DECODERS)})")
+_decode_jwt = JWT_DECODERS[JWT_BACKEND]
+
+# Token digest -> verified payload, dropped once the token's exp passes
+_verified_tokens = TLRUCache(
+    maxsize=JWT_CACHE_MAX_ENTRIES,
+    ttu=lambda _digest, payload, _now: payload["exp"],
+    timer=time.time
+)
+_jwt_cache_stats = {"hits": 0, "misses": 0}
+
+def decode_access_token(token: str) -> dict:
+    """
+    Verify a JWT and return its payload (raises JWTError)
+    Tokens already verified by this worker are served from an LRU until they expire
+    """
+    digest = hashlib.sha256(token.encode("utf-8")).digest()
+    payload = _verified_tokens.get(digest)
+    if payload is not None:
+        _jwt_cache_stats["hits"] += 1
+        return dict(payload)
+    
+    _jwt_cache_stats["misses"] += 1
+    payload = _decode_jwt(token)
+    # Tokens without an expiry are verified every time
+    if isinstance(payload.get("exp"), (int, float)):
+        _verified_tokens[digest] = payload
+    return dict(payload)
+
+def get_jwt_cache_stats() -> dict:
+    lookups = _jwt_cache_stats["hits"] + _jwt_cache_stats["misses"]
+    return {
+        "backend": JWT_BACKEND,
+        "entries": len(_verified_tokens),
+        "max_entries": JWT_CACHE_MAX_ENTRIES,
+        **_jwt_cache_stats,
+        "hit_rate": round(_jwt_cache_stats["hits"] / lookups, 3) if lookups else 0.0
+    }
@@ -0,0 +1,130 @@
+"""
+Chat Session Context
+Each chat session keeps a rolling prompt context in chat_session_context: its
+latest messages verbatim plus a running summary of everything older. Turns are
+appended as they are saved and a background job folds the overflow into the
+summary, so the prompt stays the same size however long the session runs
+"""
+from typing import Dict, Any, List
+from database import get_database
+from job_queue import enqueue_job
+from repositories.chat_messages import find_recent_session_messages
+from ai_engine import summarize_conversation, CONTEXT_MESSAGE_CHARS
+from pymongo import ReturnDocument
+from datetime import datetime
+import os
+import uuid
+
+CHAT_CONTEXT_JOB = "chat_context_summary"
+
+# Messages kept verbatim in the prompt
+CHAT_CONTEXT_MESSAGES = int(os.getenv("CHAT_CONTEXT_MESSAGES", "8"))
+# Older messages are summarized in batches of this size (one LLM call per batch)
+CHAT_CONTEXT_FOLD_BATCH = int(os.getenv("CHAT_CONTEXT_FOLD_BATCH", "6"))
+
+
+async def get_session_context(session_id: str, student_id: str, course_id: str) -> Dict[str, Any]:
+    """
+    A session's prompt context: {"summary": str, "recent": [{role, content, ...}]}
+    """
+    db = get_database()
+
+    context = await db.chat_session_context.find_one(
+        {"session_id": session_id, "student_id": student_id},
+        {"_id": 0, "summary": 1, "recent": 1}
+    )
+    if context:
+        return {
+            "summary": context.get("summary", ""),
+            "recent": context.get("recent", [])[-(CHAT_CONTEXT_MESSAGES + CHAT_CONTEXT_FOLD_BATCH):]
+        }
+
+    # Sessions started before contexts were kept - seed from their latest messages
+    recent = [
+        _context_entry(message)
+        for message in await find_recent_session_messages(session_id, student_id, CHAT_CONTEXT_MESSAGES)
+    ]
+    if recent:
+        await db.chat_session_context.update_one(
+            {"session_id": session_id, "student_id": student_id},
+            {"$setOnInsert": _new_context(course_id, recent)},
+            upsert=True
+        )
+    return {"summary": "", "recent": recent}
+
+
+def _context_entry(message: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": message["id"],
+        "role": message["role"],
+        "content": message["content"][:CONTEXT_MESSAGE_CHARS],
+        "timestamp": message["timestamp"]
+    }
+
+
+def _new_context(course_id: str, recent: List[Dict[str, Any]]) -> Dict[str, Any]:
+    fields = {
+        "id": str(uuid.uuid4()),
+        "course_id": course_id,
+        "summary": "",
+        "summarized_messages": 0,
+        "created_at": datetime.utcnow().isoformat()
+    }
+    if recent:
+        fields["recent"] = recent
+    return fields
+
+
+async def record_turn(session_id: str, student_id: str, course_id: str, messages: List[Dict[str, Any]]):
+    """
+    Append a turn's messages to the session context, queueing a summary fold once it overflows
+    """
+    db = get_database()
+
+    context = await db.chat_session_context.find_one_and_update(
+        {"session_id": session_id, "student_id": student_id},
+        {
+            "$push": {"recent": {"$each": [_context_entry(message) for message in messages]}},
+            "$set": {"updated_at": datetime.utcnow().isoformat()},
+            "$setOnInsert": _new_context(course_id, [])
+        },
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+        projection={"_id": 0, "recent.id": 1}
+    )
+
+    if len(context["recent"]) >= CHAT_CONTEXT_MESSAGES + CHAT_CONTEXT_FOLD_BATCH:
+        await enqueue_job(
+            CHAT_CONTEXT_JOB,
+            {"session_id": session_id, "student_id": student_id},
+            dedupe_key=f"{CHAT_CONTEXT_JOB}:{student_id}:{session_id}"
+        )
+
+
+async def fold_session_context(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Job handler: summarize the messages beyond the verbatim window into the running summary
+    """
+    db = get_database()
+    query = {"session_id": payload["session_id"], "student_id": payload["student_id"]}
+
+    context = await db.chat_session_context.find_one(query, {"_id": 0, "summary": 1, "recent": 1})
+    overflow = len(context["recent"]) - CHAT_CONTEXT_MESSAGES if context else 0
+    if overflow <= 0:
+        return {"folded": 0}
+
+    folded = context["recent"][:overflow]
+    summary = await summarize_conversation(context.get("summary", ""), folded)
+
+    # Drop exactly the folded messages - turns appended meanwhile stay, and a
+    # concurrent fold (the first message no longer matches) leaves this one a no-op
+    result = await db.chat_session_context.update_one(
+        {**query, "recent.0.id": folded[0]["id"]},
+        [{"$set": {
+            "summary": summary,
+            "recent": {"$slice": ["$recent", overflow, {"$size": "$recent"}]},
+            "summarized_messages": {"$add": [{"$ifNull": ["$summarized_messages", 0]}, overflow]},
+            "updated_at": datetime.utcnow().isoformat()
+        }}]
+    )
+    return {"folded": overflow if result.modified_count else 0}
@@ -0,0 +1,86 @@
+"""
+Course Concept Index
+Persists the extracted concepts for each course so chat turns don't
+re-run LLM concept extraction on every message
+"""
+from typing import List, Dict, Any, Optional
+from database import get_database
+from concept_tracker import extract_concepts_from_materials
+from materials_store import find_course_materials, material_text
+from datetime import datetime
+import hashlib
+
+
+def compute_materials_hash(materials: List[Dict[str, Any]]) -> str:
+    """
+    Content hash of a course's materials (order independent)
+    """
+    digest = hashlib.sha256()
+    for material in sorted(materials, key=lambda m: m.get('id', '')):
+        digest.update(material.get('id', '').encode('utf-8'))
+        digest.update(material.get('title', '').encode('utf-8'))
+        content_hash = material.get('content_hash') or hashlib.sha256(material_text(material).encode('utf-8')).hexdigest()
+        digest.update(content_hash.encode('utf-8'))
+    return digest.hexdigest()
+
+
+async def rebuild_course_concept_index(course_id: str, force: bool = False) -> Dict[str, Any]:
+    """
+    Re-extract concepts for a course if its materials changed since the last build
+    """
+    db = get_database()
+
+    materials = await find_course_materials(course_id)
+    content_hash = compute_materials_hash(materials)
+
+    existing = await db.course_concept_index.find_one({"course_id": course_id})
+    if existing and existing.get("content_hash") == content_hash and not force:
+        existing.pop('_id', None)
+        return existing
+
+    concepts = await extract_concepts_from_materials(materials) if materials else []
+
+    index_doc = {
+        "course_id": course_id,
+        "content_hash": content_hash,
+        "concepts": concepts,
+        "material_count": len(materials),
+        "updated_at": datetime.utcnow().isoformat()
+    }
+
+    await db.course_concept_index.update_one(
+        {"course_id": course_id},
+        {"$set": index_doc},
+        upsert=True
+    )
+
+    print(f"Rebuilt concept index for course {course_id}: {len(concepts)} concepts")
+    return index_doc
+
+
+async def get_course_concepts(course_id: str, materials: Optional[List[Dict[str, Any]]] = None) -> List[str]:
+    """
+    Get the indexed concepts for a course, building the index on first use
+    """
+    db = get_database()
+
+    index_doc = await db.course_concept_index.find_one(
+        {"course_id": course_id},
+        {"concepts": 1}
+    )
+    if index_doc:
+        return index_doc.get("concepts", [])
+
+    # No index yet (course predates the index) - build it once now
+    if materials is not None and not materials:
+        return []
+    index_doc = await rebuild_course_concept_index(course_id)
+    return index_doc.get("concepts", [])
+
+
+async def delete_course_concept_index(course_id: str):
+    """
+    Remove the concept index for a deleted course
+    """
+    db = get_database()
+    await db.course_concept_index.delete_one({"course_id": course_id})
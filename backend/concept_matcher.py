@@ -0,0 +1,131 @@
+"""
+Concept Matcher
+Precompiled per-course concept detection: an Aho-Corasick automaton over
+stemmed word tokens finds whole concept phrases in one pass over the text, and
+an inverted index of significant words applies the multi-word partial-match rule
+"""
+from typing import List, Dict, Tuple, Set
+from collections import deque
+from functools import lru_cache
+import re
+
+# Share of a multi-word concept's significant words that must appear for a match
+PARTIAL_MATCH_RATIO = 0.6
+INSIGNIFICANT_WORDS = {'the', 'and', 'for', 'with'}
+
+MATCHER_CACHE_SIZE = 256
+
+# Word characters plus trailing + / #, so "C++", "C#" and "F#" don't collapse to "c" / "f"
+TOKEN_PATTERN = re.compile(r'\w+[+#]*')
+
+
+def stem(token: str) -> str:
+    """Light suffix stripping so plural and verb forms match their concept"""
+    if token.endswith(('sses', 'xes', 'ches', 'shes')):
+        return token[:-2]
+    if token.endswith('ies') and len(token) > 4:
+        return token[:-3] + 'y'
+    if token.endswith('s') and not token.endswith(('ss', 'us', 'is')) and len(token) > 3:
+        token = token[:-1]
+    for suffix in ('ing', 'ed'):
+        if token.endswith(suffix) and len(token) - len(suffix) >= 4:
+            return token[:-len(suffix)]
+    return token
+
+
+def normalize_tokens(text: str) -> List[str]:
+    return [stem(token) for token in TOKEN_PATTERN.findall(text.lower())]
+
+
+class ConceptMatcher:
+    """
+    Detects a fixed list of concepts in text
+    Build once per concept list (see get_concept_matcher) and reuse for every message
+    """
+
+    def __init__(self, concepts: Tuple[str, ...]):
+        self.concepts = concepts
+
+        # Aho-Corasick trie over token sequences
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[int]] = [[]]
+
+        # Significant stem -> multi-word concepts containing it, for the partial rule
+        self._significant_index: Dict[str, List[int]] = {}
+        self._significant_counts: Dict[int, int] = {}
+
+        for concept_id, concept in enumerate(concepts):
+            tokens = normalize_tokens(concept)
+            if tokens:
+                self._add_pattern(tokens, concept_id)
+
+            if ' ' in concept.strip():
+                significant = {
+                    stem(word) for word in TOKEN_PATTERN.findall(concept.lower())
+                    if len(word) > 3 and word not in INSIGNIFICANT_WORDS
+                }
+                if significant:
+                    self._significant_counts[concept_id] = len(significant)
+                    for token in significant:
+                        self._significant_index.setdefault(token, []).append(concept_id)
+
+        self._build_failure_links()
+
+    def _add_pattern(self, tokens: List[str], concept_id: int):
+        state = 0
+        for token in tokens:
+            next_state = self._goto[state].get(token)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][token] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            state = next_state
+        self._output[state].append(concept_id)
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for token, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and token not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(token, 0)
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def match(self, text: str) -> List[str]:
+        """Concepts mentioned in the text, in concept-list order"""
+        tokens = normalize_tokens(text)
+        matched: Set[int] = set()
+
+        # Whole-phrase matches
+        state = 0
+        for token in tokens:
+            while state and token not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(token, 0)
+            matched.update(self._output[state])
+
+        # Multi-word concepts where most significant words appear
+        hits: Dict[int, int] = {}
+        for token in set(tokens):
+            for concept_id in self._significant_index.get(token, ()):
+                hits[concept_id] = hits.get(concept_id, 0) + 1
+        for concept_id, count in hits.items():
+            if count / self._significant_counts[concept_id] >= PARTIAL_MATCH_RATIO:
+                matched.add(concept_id)
+
+        return [self.concepts[concept_id] for concept_id in sorted(matched)]
+
+
+@lru_cache(maxsize=MATCHER_CACHE_SIZE)
+def get_concept_matcher(concepts: Tuple[str, ...]) -> ConceptMatcher:
+    """
+    Matcher for a concept list, built on first use
+    Keyed by the concepts themselves, so a rebuilt course concept index gets a fresh matcher
+    """
+    return ConceptMatcher(concepts)
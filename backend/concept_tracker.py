@@ -4,6 +4,8 @@ Extracts concepts from course materials and tracks student mastery
 """
 from typing import List, Dict, Any
 from database import get_database
+from repositories.concept_mastery import iter_course_mastery
+from pymongo import UpdateOne
 from datetime import datetime
 import re
 from collections import Counter
@@ -12,20 +14,17 @@ async def extract_concepts_from_materials(materials: List[Dict[str, Any]]) -> Li
     """
     Extract meaningful domain-specific concepts from course materials using AI
     """
+    from materials_store import material_text
+    
     # Combine all material content
     all_text = ""
     for material in materials[:10]:  # Limit to avoid token limits
-        content = material.get('content', '')[:1500]  # First 1500 chars per material
+        content = material_text(material)[:1500]  # First 1500 chars per material
         title = material.get('title', '')
         all_text += f"\n{title}\n{content}\n"
     
     # Use AI to extract meaningful concepts
-    from emergentintegrations.llm.chat import LlmChat, UserMessage
-    from dotenv import load_dotenv
-    import os
-    
-    load_dotenv()
-    EMERGENT_LLM_KEY = os.getenv("EMERGENT_LLM_KEY")
+    import llm_gateway
     
     system_message = """You are a concept extractor for educational content.
 
@@ -52,27 +51,19 @@ Return ONLY a JSON array of concepts:
 ["Concept 1", "Concept 2", "Concept 3", ...]"""
 
     try:
-        chat = LlmChat(
-            api_key=EMERGENT_LLM_KEY,
-            session_id="concept-extraction",
-            system_message=system_message
-        ).with_model("anthropic", "claude-3-7-sonnet-20250219")
-        
         prompt = f"""Course Materials:
 {all_text[:4000]}
 
 Extract the key technical concepts from these materials. Return as JSON array."""
         
-        response = await chat.send_message(UserMessage(text=prompt))
+        response = await llm_gateway.complete(
+            system_message,
+            prompt,
+            use_cache=True,
+            validate=lambda text: isinstance(llm_gateway.parse_json_response(text), list)
+        )
         
-        # Parse JSON response
-        response_text = response.strip()
-        if response_text.startswith('```'):
-            response_text = re.sub(r'^```json\s*', '', response_text)
-            response_text = re.sub(r'```\s*$', '', response_text)
-        
-        import json
-        concepts = json.loads(response_text)
+        concepts = llm_gateway.parse_json_response(response)
         
         # Validate and clean
         if isinstance(concepts, list):
@@ -132,6 +123,167 @@ Extract the key technical concepts from these materials. Return as JSON array.""
     return concepts[:15]
 
 
+# Concepts too generic to track mastery for
+MASTERY_STOPWORDS = {
+    'what', 'how', 'why', 'when', 'where', 'data', 'training', 'testing', 'test',
+    'course', 'introduction', 'overview', 'student', 'learning', 'understanding',
+    'concept', 'topic', 'material', 'process', 'method', 'system', 'the', 'and'
+}
+
+# Quiz accuracy is scaled down until a concept has enough answered questions
+# 1-2 questions = 0.4x, 3-4 questions = 0.6x, 5-6 questions = 0.8x, 7+ questions = 1.0x
+CONFIDENCE_STEPS = [(2, 0.4), (4, 0.6), (6, 0.8)]
+
+
+def is_trackable_concept(concept: str) -> bool:
+    """Whether a concept is specific enough to store mastery for"""
+    if not concept:
+        return False
+    concept_lower = concept.lower()
+    concept_words = concept_lower.split()
+    return not (
+        concept_lower in MASTERY_STOPWORDS or
+        len(concept) < 4 or
+        (len(concept_words) == 1 and len(concept) < 5) or
+        all(word in MASTERY_STOPWORDS for word in concept_words)
+    )
+
+
+def compute_mastery_score(correct_answers: int, total_questions: int, interactions: int) -> float:
+    """
+    Mastery score from a record's counters
+    Requires multiple data points for high confidence scores
+    """
+    if total_questions > 0:
+        quiz_accuracy = (correct_answers / total_questions) * 100
+
+        confidence_factor = 1.0
+        for max_questions, factor in CONFIDENCE_STEPS:
+            if total_questions <= max_questions:
+                confidence_factor = factor
+                break
+
+        # Small interaction bonus (max 15%)
+        interaction_bonus = min(15, interactions * 1.5)
+        return min(100, quiz_accuracy * confidence_factor + interaction_bonus)
+
+    # No quiz data yet, each interaction gives 3 points, capped at 30% without quiz validation
+    return min(30, interactions * 3)
+
+
+def _mastery_score_expression() -> Dict[str, Any]:
+    """compute_mastery_score as an aggregation expression over the stored counters"""
+    confidence_factor = {
+        "$switch": {
+            "branches": [
+                {"case": {"$lte": ["$total_questions", max_questions]}, "then": factor}
+                for max_questions, factor in CONFIDENCE_STEPS
+            ],
+            "default": 1.0
+        }
+    }
+    quiz_accuracy = {"$divide": [{"$multiply": ["$correct_answers", 100]}, "$total_questions"]}
+    interaction_bonus = {"$min": [15, {"$multiply": ["$interactions", 1.5]}]}
+
+    return {
+        "$cond": [
+            {"$gt": ["$total_questions", 0]},
+            {"$min": [100, {"$add": [{"$multiply": [quiz_accuracy, confidence_factor]}, interaction_bonus]}]},
+            {"$min": [30, {"$multiply": ["$interactions", 3]}]}
+        ]
+    }
+
+
+async def update_concept_mastery_many(events: List[Dict[str, Any]]) -> int:
+    """
+    Apply a batch of mastery events in a single bulk_write
+    Each event has student_id, course_id, concept and interaction_type
+    ('question', 'quiz_correct', 'quiz_incorrect'). Events are grouped per concept,
+    counters are incremented atomically and the score is recomputed server-side.
+    Returns the number of concept records written
+    """
+    grouped: Dict[tuple, Counter] = {}
+    for event in events:
+        if not is_trackable_concept(event.get("concept")):
+            continue
+        key = (event["student_id"], event["course_id"], event["concept"])
+        counts = grouped.setdefault(key, Counter())
+        counts["interactions"] += 1
+        if event.get("interaction_type") == 'quiz_correct':
+            counts["correct_answers"] += 1
+            counts["total_questions"] += 1
+        elif event.get("interaction_type") == 'quiz_incorrect':
+            counts["total_questions"] += 1
+
+    if not grouped:
+        return 0
+
+    now = datetime.utcnow().isoformat()
+    score_expression = _mastery_score_expression()
+    operations = []
+    for (student_id, course_id, concept), counts in grouped.items():
+        counters = {
+            field: {"$add": [{"$ifNull": [f"${field}", 0]}, counts[field]]}
+            for field in ("interactions", "correct_answers", "total_questions")
+        }
+        operations.append(UpdateOne(
+            {"student_id": student_id, "course_id": course_id, "concept": concept},
+            [
+                {"$set": {
+                    "id": {"$ifNull": ["$id", str(uuid.uuid4())]},
+                    **counters,
+                    "last_interaction": now,
+                    "updated_at": now
+                }},
+                {"$set": {"mastery_score": score_expression}}
+            ],
+            upsert=True
+        ))
+
+    db = get_database()
+    # Only quiz answers can lower a score - read just those records beforehand,
+    # so a drop below the card threshold is spotted without re-reading
+    previous = await _find_mastery_records([key for key, counts in grouped.items() if counts["total_questions"]])
+    await db.concept_mastery.bulk_write(operations, ordered=False)
+    await _request_cards_for_dropped_concepts(grouped, previous)
+    return len(operations)
+
+
+async def _find_mastery_records(keys: List[tuple]) -> Dict[tuple, Dict[str, Any]]:
+    """Current mastery records for (student_id, course_id, concept) keys, in one query"""
+    if not keys:
+        return {}
+    db = get_database()
+    records = await db.concept_mastery.find(
+        {"$or": [
+            {"student_id": student_id, "course_id": course_id, "concept": concept}
+            for student_id, course_id, concept in keys
+        ]},
+        {"_id": 0, "student_id": 1, "course_id": 1, "concept": 1, "mastery_score": 1,
+         "interactions": 1, "correct_answers": 1, "total_questions": 1}
+    ).to_list(None)
+    return {(record["student_id"], record["course_id"], record["concept"]): record for record in records}
+
+
+async def _request_cards_for_dropped_concepts(grouped: Dict[tuple, Counter], previous: Dict[tuple, Dict[str, Any]]):
+    """Queue learning-card generation for students with a concept that just dropped below the card threshold"""
+    from learning_cards import request_learning_cards, CARD_MASTERY_THRESHOLD
+
+    students = set()
+    for key, record in previous.items():
+        counts = grouped[key]
+        new_score = compute_mastery_score(
+            record.get("correct_answers", 0) + counts["correct_answers"],
+            record.get("total_questions", 0) + counts["total_questions"],
+            record.get("interactions", 0) + counts["interactions"]
+        )
+        if record.get("mastery_score", 0) >= CARD_MASTERY_THRESHOLD > new_score:
+            students.add(key[:2])
+
+    for student_id, course_id in students:
+        await request_learning_cards(course_id, student_id)
+
+
 async def update_concept_mastery(
     student_id: str,
     course_id: str,
@@ -142,142 +294,28 @@ async def update_concept_mastery(
     """
     Update student's mastery score for a concept (with validation)
     """
-    # Validate concept before storing
-    STOPWORDS = {
-        'what', 'how', 'why', 'when', 'where', 'data', 'training', 'testing', 'test',
-        'course', 'introduction', 'overview', 'student', 'learning', 'understanding',
-        'concept', 'topic', 'material', 'process', 'method', 'system', 'the', 'and'
-    }
-    
-    concept_lower = concept.lower()
-    concept_words = concept_lower.split()
-    
-    # Don't store if concept is invalid
-    if (concept_lower in STOPWORDS or 
-        len(concept) < 4 or 
-        (len(concept_words) == 1 and len(concept) < 5) or
-        all(word in STOPWORDS for word in concept_words)):
-        return  # Skip storing this concept
-    
-    db = get_database()
-    
-    # Find or create mastery record
-    mastery_record = await db.concept_mastery.find_one({
+    await update_concept_mastery_many([{
         "student_id": student_id,
         "course_id": course_id,
-        "concept": concept
-    })
-    
-    if not mastery_record:
-        mastery_record = {
-            "id": str(uuid.uuid4()),
-            "course_id": course_id,
-            "student_id": student_id,
-            "concept": concept,
-            "mastery_score": 0,
-            "interactions": 0,
-            "correct_answers": 0,
-            "total_questions": 0,
-            "last_interaction": datetime.utcnow().isoformat(),
-            "updated_at": datetime.utcnow().isoformat()
-        }
-    
-    # Update based on interaction type
-    mastery_record["interactions"] += 1
-    mastery_record["last_interaction"] = datetime.utcnow().isoformat()
-    mastery_record["updated_at"] = datetime.utcnow().isoformat()
-    
-    if interaction_type == 'question':
-        # Each question adds small amount to mastery (exploration)
-        mastery_record["mastery_score"] = min(100, mastery_record["mastery_score"] + (3 * weight))
-    
-    elif interaction_type == 'quiz_correct':
-        mastery_record["correct_answers"] += 1
-        mastery_record["total_questions"] += 1
-    
-    elif interaction_type == 'quiz_incorrect':
-        mastery_record["total_questions"] += 1
-    
-    # Calculate mastery score based on quiz performance and interactions
-    # Requires multiple data points for high confidence scores
-    if mastery_record["total_questions"] > 0:
-        # Quiz accuracy percentage
-        quiz_accuracy = (mastery_record["correct_answers"] / mastery_record["total_questions"]) * 100
-        
-        # Confidence factor: lower confidence with fewer questions
-        # 1-2 questions = 0.4x, 3-4 questions = 0.6x, 5-6 questions = 0.8x, 7+ questions = 1.0x
-        if mastery_record["total_questions"] <= 2:
-            confidence_factor = 0.4
-        elif mastery_record["total_questions"] <= 4:
-            confidence_factor = 0.6
-        elif mastery_record["total_questions"] <= 6:
-            confidence_factor = 0.8
-        else:
-            confidence_factor = 1.0
-        
-        # Apply confidence factor to quiz accuracy
-        adjusted_quiz_score = quiz_accuracy * confidence_factor
-        
-        # Small interaction bonus (max 15%)
-        interaction_bonus = min(15, mastery_record["interactions"] * 1.5)
-        
-        # Final score: adjusted quiz + interaction bonus
-        mastery_record["mastery_score"] = min(100, adjusted_quiz_score + interaction_bonus)
-    else:
-        # No quiz data yet, score based only on interactions (questions asked)
-        # Each interaction gives 3 points, capped at 30% without quiz validation
-        interaction_score = min(30, mastery_record["interactions"] * 3)
-        mastery_record["mastery_score"] = interaction_score
-    
-    # Upsert the record
-    await db.concept_mastery.update_one(
-        {"student_id": student_id, "course_id": course_id, "concept": concept},
-        {"$set": mastery_record},
-        upsert=True
-    )
+        "concept": concept,
+        "interaction_type": interaction_type
+    }])
 
 
 async def detect_concepts_in_text(text: str, course_concepts: List[str]) -> List[str]:
     """
     Detect which concepts are mentioned in a text (question, answer, etc.)
-    Uses fuzzy matching for better detection of multi-word concepts
+    Whole concepts match on stemmed word boundaries; multi-word concepts also match
+    when at least 60% of their significant words appear
     """
-    text_lower = text.lower()
-    detected = []
-    
-    for concept in course_concepts:
-        concept_lower = concept.lower()
-        
-        # Exact match (best case)
-        if concept_lower in text_lower:
-            detected.append(concept)
-            continue
-        
-        # For multi-word concepts, check if most significant words appear
-        if ' ' in concept_lower:
-            words = concept_lower.split()
-            # Filter out common words
-            significant_words = [w for w in words if len(w) > 3 and w not in {'the', 'and', 'for', 'with'}]
-            
-            # If at least 60% of significant words appear, consider it a match
-            if significant_words:
-                matches = sum(1 for w in significant_words if w in text_lower)
-                if matches / len(significant_words) >= 0.6:
-                    detected.append(concept)
-        else:
-            # Single word concepts - check for word boundaries
-            if re.search(rf'\b{re.escape(concept_lower)}\b', text_lower):
-                detected.append(concept)
-    
-    return detected
+    from concept_matcher import get_concept_matcher
+    return get_concept_matcher(tuple(course_concepts)).match(text)
 
 
 async def get_course_concept_mastery(course_id: str) -> Dict[str, Any]:
     """
     Get aggregated concept mastery data for a course with aggressive filtering
     """
-    db = get_database()
-    
     # Comprehensive stopword list for filtering out useless concepts
     STOPWORDS = {
         # Generic words
@@ -306,17 +344,14 @@ async def get_course_concept_mastery(course_id: str) -> Dict[str, Any]:
         'different', 'various', 'several', 'many', 'some', 'all', 'each'
     }
     
-    # Get all mastery records for this course
-    mastery_records = await db.concept_mastery.find({"course_id": course_id}).to_list(1000)
-    
-    if not mastery_records:
-        return {"total_concepts": 0, "total_students": 0, "heatmap_data": []}
-    
-    # Aggregate by concept with filtering
+    # Aggregate by concept with filtering, streaming every mastery record in the course
     concept_data = {}
     students = set()
     
-    for record in mastery_records:
+    async for record in iter_course_mastery(
+        course_id,
+        {"_id": 0, "concept": 1, "student_id": 1, "mastery_score": 1, "interactions": 1}
+    ):
         concept = record["concept"]
         student_id = record["student_id"]
         students.add(student_id)
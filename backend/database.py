@@ -1,5 +1,8 @@
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReadPreference
 from dotenv import load_dotenv
+from db_metrics import command_metrics
+from typing import Dict, Any
 import os
 
 load_dotenv()
@@ -7,14 +10,53 @@ load_dotenv()
 MONGO_URL = os.getenv("MONGO_URL")
 DATABASE_NAME = os.getenv("DATABASE_NAME", "brillia_db")
 
+# Connection pool, per worker process - size it for the worker's concurrent requests
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+MONGO_MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "300000"))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "10000"))
+# Fail fast instead of hanging requests when the server is unreachable
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "10000"))
+MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "60000"))
+# primary, primaryPreferred, secondary, secondaryPreferred or nearest
+MONGO_READ_PREFERENCE = os.getenv("MONGO_READ_PREFERENCE", "primary")
+MONGO_COMMAND_MONITORING = os.getenv("MONGO_COMMAND_MONITORING", "true").lower() == "true"
+
+READ_PREFERENCES = {
+    "primary": ReadPreference.PRIMARY,
+    "primaryPreferred": ReadPreference.PRIMARY_PREFERRED,
+    "secondary": ReadPreference.SECONDARY,
+    "secondaryPreferred": ReadPreference.SECONDARY_PREFERRED,
+    "nearest": ReadPreference.NEAREST,
+}
+
 client = None
 db = None
 
+def get_client_options() -> Dict[str, Any]:
+    if MONGO_READ_PREFERENCE not in READ_PREFERENCES:
+        raise ValueError(f"Unknown MONGO_READ_PREFERENCE {MONGO_READ_PREFERENCE!r}")
+    return {
+        "maxPoolSize": MONGO_MAX_POOL_SIZE,
+        "minPoolSize": MONGO_MIN_POOL_SIZE,
+        "maxIdleTimeMS": MONGO_MAX_IDLE_TIME_MS,
+        "waitQueueTimeoutMS": MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        "serverSelectionTimeoutMS": MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        "connectTimeoutMS": MONGO_CONNECT_TIMEOUT_MS,
+        "socketTimeoutMS": MONGO_SOCKET_TIMEOUT_MS,
+        "appname": "brillia-api",
+    }
+
 async def connect_db():
     global client, db
-    client = AsyncIOMotorClient(MONGO_URL)
-    db = client[DATABASE_NAME]
-    print(f"Connected to MongoDB: {DATABASE_NAME}")
+    client = AsyncIOMotorClient(
+        MONGO_URL,
+        event_listeners=[command_metrics] if MONGO_COMMAND_MONITORING else [],
+        **get_client_options()
+    )
+    db = client.get_database(DATABASE_NAME, read_preference=READ_PREFERENCES[MONGO_READ_PREFERENCE])
+    print(f"Connected to MongoDB: {DATABASE_NAME} (pool {MONGO_MIN_POOL_SIZE}-{MONGO_MAX_POOL_SIZE}, read preference {MONGO_READ_PREFERENCE})")
 
 async def close_db():
     global client
@@ -24,3 +66,10 @@ async def close_db():
 
 def get_database():
     return db
+
+def get_pool_config() -> Dict[str, Any]:
+    return {
+        **get_client_options(),
+        "readPreference": MONGO_READ_PREFERENCE,
+        "commandMonitoring": MONGO_COMMAND_MONITORING
+    }
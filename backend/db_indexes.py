@@ -0,0 +1,246 @@
+"""
+MongoDB Index Manifest
+Declares the indexes each collection's query patterns need, applies them
+idempotently at startup and reports queries that still scan a collection
+
+Run directly to apply the manifest and print the report:
+    python db_indexes.py
+"""
+from typing import List, Dict, Any
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+import asyncio
+
+# collection -> index specs (keys, plus optional unique / expireAfterSeconds /
+# partialFilterExpression / name)
+INDEX_MANIFEST: Dict[str, List[Dict[str, Any]]] = {
+    "users": [
+        {"keys": [("id", ASCENDING)], "unique": True},
+        {"keys": [("email", ASCENDING), ("role", ASCENDING)]},
+    ],
+    "user_sessions": [
+        {"keys": [("session_token", ASCENDING)]},
+        {"keys": [("user_id", ASCENDING)]},
+        # Expired sessions are removed by MongoDB (expires_at itself is an ISO string)
+        {"keys": [("expires_at_ts", ASCENDING)], "expireAfterSeconds": 0},
+    ],
+    # Cross-worker cache invalidations - workers poll every second or so, five
+    # minutes covers a stalled worker catching up
+    "session_invalidations": [
+        {"keys": [("created_at", ASCENDING)], "expireAfterSeconds": 300},
+    ],
+    "waitlist": [
+        {"keys": [("email", ASCENDING)], "unique": True},
+        {"keys": [("id", ASCENDING)], "unique": True},
+        {"keys": [("created_at", DESCENDING), ("id", DESCENDING)]},
+    ],
+    "courses": [
+        {"keys": [("id", ASCENDING)], "unique": True},
+        {"keys": [("created_at", ASCENDING), ("id", ASCENDING)]},
+        {"keys": [("professor_id", ASCENDING), ("created_at", ASCENDING), ("id", ASCENDING)]},
+    ],
+    "course_materials": [
+        {"keys": [("id", ASCENDING)], "unique": True},
+        {"keys": [("course_id", ASCENDING), ("uploaded_at", ASCENDING), ("id", ASCENDING)]},
+    ],
+    "enrollments": [
+        {"keys": [("student_id", ASCENDING), ("course_id", ASCENDING)], "unique": True},
+        {"keys": [("course_id", ASCENDING)]},
+    ],
+    "chat_messages": [
+        {"keys": [("session_id", ASCENDING), ("student_id", ASCENDING), ("timestamp", ASCENDING), ("id", ASCENDING)]},
+        {"keys": [("student_id", ASCENDING), ("course_id", ASCENDING), ("timestamp", ASCENDING), ("id", ASCENDING)]},
+        {"keys": [("course_id", ASCENDING), ("timestamp", ASCENDING)]},
+    ],
+    "chat_session_context": [
+        {"keys": [("session_id", ASCENDING), ("student_id", ASCENDING)], "unique": True},
+    ],
+    "quiz_attempts": [
+        {"keys": [("student_id", ASCENDING), ("course_id", ASCENDING), ("completed_at", ASCENDING)]},
+        {"keys": [("course_id", ASCENDING), ("completed_at", ASCENDING)]},
+    ],
+    "concept_mastery": [
+        {"keys": [("student_id", ASCENDING), ("course_id", ASCENDING), ("concept", ASCENDING)], "unique": True},
+        {"keys": [("student_id", ASCENDING), ("course_id", ASCENDING), ("mastery_score", ASCENDING)]},
+        {"keys": [("course_id", ASCENDING)]},
+    ],
+    "student_progress": [
+        {"keys": [("student_id", ASCENDING), ("course_id", ASCENDING)], "unique": True},
+    ],
+    "learning_cards": [
+        {"keys": [("id", ASCENDING)], "unique": True},
+        {"keys": [("course_id", ASCENDING), ("student_id", ASCENDING), ("dismissed", ASCENDING)]},
+    ],
+    "learning_card_state": [
+        {"keys": [("course_id", ASCENDING), ("student_id", ASCENDING)], "unique": True},
+    ],
+    "course_concept_index": [
+        {"keys": [("course_id", ASCENDING)], "unique": True},
+    ],
+    "course_retrieval_index": [
+        {"keys": [("course_id", ASCENDING)], "unique": True},
+    ],
+    "material_chunks": [
+        {"keys": [("id", ASCENDING)], "unique": True},
+        {"keys": [("course_id", ASCENDING), ("material_id", ASCENDING), ("ordinal", ASCENDING)]},
+        {"keys": [("material_id", ASCENDING), ("ordinal", ASCENDING)]},
+    ],
+    "quiz_question_bank": [
+        {"keys": [("id", ASCENDING)], "unique": True},
+        {"keys": [("course_id", ASCENDING), ("concept", ASCENDING), ("fingerprint", ASCENDING)], "unique": True},
+    ],
+    "served_quizzes": [
+        {"keys": [("quiz_id", ASCENDING)], "unique": True},
+    ],
+    "course_analytics": [
+        {"keys": [("course_id", ASCENDING)], "unique": True},
+    ],
+    "student_term_counts": [
+        {"keys": [("course_id", ASCENDING), ("student_id", ASCENDING)], "unique": True},
+    ],
+    "course_active_students": [
+        {"keys": [("course_id", ASCENDING), ("student_id", ASCENDING)], "unique": True},
+    ],
+    "background_jobs": [
+        {"keys": [("id", ASCENDING)], "unique": True},
+        {"keys": [("status", ASCENDING), ("job_type", ASCENDING), ("created_at", ASCENDING)]},
+        # At most one pending job per dedupe key
+        {"keys": [("dedupe_key", ASCENDING)], "unique": True,
+         "partialFilterExpression": {"pending": True}, "name": "dedupe_key_1_pending"},
+    ],
+    "llm_response_cache": [
+        {"keys": [("key", ASCENDING)], "unique": True},
+        {"keys": [("expires_at", ASCENDING)], "expireAfterSeconds": 0},
+    ],
+}
+
+# Representative query shapes used by the routers: (collection, filter, sort)
+QUERY_PATTERNS = [
+    ("users", {"id": "x"}, None),
+    ("users", {"email": "x"}, None),
+    ("users", {"email": "x", "role": "student"}, None),
+    ("user_sessions", {"session_token": "x", "expires_at": {"$gt": "x"}}, None),
+    ("waitlist", {"email": "x"}, None),
+    ("waitlist", {"id": "x"}, None),
+    ("courses", {"id": "x"}, None),
+    ("courses", {}, [("created_at", ASCENDING), ("id", ASCENDING)]),
+    ("courses", {"professor_id": "x"}, [("created_at", ASCENDING), ("id", ASCENDING)]),
+    ("waitlist", {}, [("created_at", DESCENDING), ("id", DESCENDING)]),
+    ("course_materials", {"id": "x"}, None),
+    ("course_materials", {"course_id": "x"}, None),
+    ("course_materials", {"course_id": "x"}, [("uploaded_at", ASCENDING), ("id", ASCENDING)]),
+    ("enrollments", {"student_id": "x"}, None),
+    ("enrollments", {"student_id": "x", "course_id": "x"}, None),
+    ("chat_messages", {"session_id": "x", "student_id": "x"}, [("timestamp", DESCENDING), ("id", DESCENDING)]),
+    ("chat_messages", {"student_id": "x", "course_id": "x"}, [("timestamp", ASCENDING), ("id", ASCENDING)]),
+    ("chat_messages", {"course_id": "x"}, None),
+    ("chat_messages", {"student_id": "x", "course_id": "x", "timestamp": {"$lt": "x"}}, [("timestamp", DESCENDING), ("id", DESCENDING)]),
+    ("chat_session_context", {"session_id": "x", "student_id": "x"}, None),
+    ("quiz_attempts", {"course_id": "x"}, None),
+    ("quiz_attempts", {"course_id": "x", "student_id": "x"}, None),
+    ("concept_mastery", {"student_id": "x", "course_id": "x", "concept": "x"}, None),
+    ("concept_mastery", {"course_id": "x", "student_id": "x", "mastery_score": {"$lt": 60}}, [("mastery_score", ASCENDING)]),
+    ("concept_mastery", {"course_id": "x"}, None),
+    ("student_progress", {"student_id": "x", "course_id": "x"}, None),
+    ("learning_cards", {"id": "x"}, None),
+    ("learning_cards", {"course_id": "x", "student_id": "x", "dismissed": False}, None),
+    ("learning_card_state", {"course_id": "x", "student_id": "x"}, None),
+    ("course_concept_index", {"course_id": "x"}, None),
+    ("course_retrieval_index", {"course_id": "x"}, None),
+    ("material_chunks", {"material_id": "x"}, None),
+    ("material_chunks", {"course_id": "x", "material_id": {"$in": ["x"]}}, None),
+    ("quiz_question_bank", {"course_id": "x", "concept": "x"}, None),
+    ("served_quizzes", {"quiz_id": "x"}, None),
+    ("course_analytics", {"course_id": "x"}, None),
+    ("student_term_counts", {"course_id": "x", "student_id": "x"}, None),
+    ("course_active_students", {"course_id": "x", "student_id": "x"}, None),
+    ("session_invalidations", {"created_at": {"$gt": "x"}}, None),
+    ("llm_response_cache", {"key": "x"}, None),
+    ("background_jobs", {"status": "queued", "job_type": {"$in": ["x"]}}, [("created_at", ASCENDING)]),
+    ("background_jobs", {"status": "running", "job_type": {"$in": ["x"]}, "updated_at": {"$lt": "x"}}, [("created_at", ASCENDING)]),
+    ("background_jobs", {"dedupe_key": "x", "pending": True}, None),
+]
+
+
+def _index_name(spec: Dict[str, Any]) -> str:
+    return spec.get("name") or "_".join(f"{field}_{direction}" for field, direction in spec["keys"])
+
+
+async def ensure_indexes(db) -> Dict[str, Any]:
+    """
+    Create every index in the manifest (no-op for indexes that already exist)
+    Unique indexes that could not be created (usually legacy duplicates) are
+    listed in failed_unique - the constraints they enforce are not in place
+    """
+    created = 0
+    failed = 0
+    failed_unique = []
+    for collection, specs in INDEX_MANIFEST.items():
+        for spec in specs:
+            options = {"name": _index_name(spec)}
+            if spec.get("unique"):
+                options["unique"] = True
+            if "expireAfterSeconds" in spec:
+                options["expireAfterSeconds"] = spec["expireAfterSeconds"]
+            if "partialFilterExpression" in spec:
+                options["partialFilterExpression"] = spec["partialFilterExpression"]
+            try:
+                await db[collection].create_index(spec["keys"], **options)
+                created += 1
+            except OperationFailure as e:
+                # Conflicting existing index or duplicate data for a unique index
+                failed += 1
+                if spec.get("unique"):
+                    failed_unique.append(f"{collection}.{options['name']}")
+                print(f"Could not create index {collection}.{options['name']}: {e}")
+    print(f"Ensured {created} indexes ({failed} failed)")
+    if failed_unique:
+        print(f"WARNING: unique indexes missing, their constraints are not enforced: {', '.join(failed_unique)}")
+    return {"ensured": created, "failed": failed, "failed_unique": failed_unique}
+
+
+def _plan_stages(plan: Dict[str, Any]) -> List[str]:
+    stages = [plan.get("stage", "")]
+    for child_key in ("inputStage", "queryPlan"):
+        if child_key in plan:
+            stages += _plan_stages(plan[child_key])
+    for child in plan.get("inputStages", []):
+        stages += _plan_stages(child)
+    return stages
+
+
+async def report_unindexed_queries(db) -> List[Dict[str, Any]]:
+    """
+    Explain every known query pattern and return those whose winning plan is a COLLSCAN
+    """
+    unindexed = []
+    for collection, query_filter, sort in QUERY_PATTERNS:
+        cursor = db[collection].find(query_filter).limit(1)
+        if sort:
+            cursor = cursor.sort(sort)
+        explanation = await cursor.explain()
+        winning_plan = explanation.get("queryPlanner", {}).get("winningPlan", {})
+        if "COLLSCAN" in _plan_stages(winning_plan):
+            unindexed.append({
+                "collection": collection,
+                "filter": query_filter,
+                "sort": sort
+            })
+    for query in unindexed:
+        print(f"Query without index: {query['collection']} {query['filter']} sort={query['sort']}")
+    return unindexed
+
+
+async def main():
+    from database import connect_db, close_db, get_database
+
+    await connect_db()
+    db = get_database()
+    await ensure_indexes(db)
+    unindexed = await report_unindexed_queries(db)
+    print(f"{len(unindexed)} of {len(QUERY_PATTERNS)} query patterns run without an index")
+    await close_db()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,159 @@
+"""
+MongoDB Command Metrics
+A pymongo CommandListener attached to the Motor client that records latency
+histograms per collection and operation, and keeps the most recent slow
+commands (collection, operation and the field names they filtered on - never
+the values) so the queries that dominate under load can be found
+"""
+from typing import Dict, Any, Tuple
+from collections import deque
+from datetime import datetime
+from pymongo import monitoring
+import os
+import threading
+
+SLOW_QUERY_MS = float(os.getenv("MONGO_SLOW_QUERY_MS", "100"))
+SLOW_QUERY_LOG_SIZE = int(os.getenv("MONGO_SLOW_QUERY_LOG_SIZE", "50"))
+
+# Upper bounds (ms) of the latency histogram buckets; slower commands go in "+inf"
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+# Commands whose first value names the collection they run against
+COLLECTION_COMMANDS = {
+    "find", "insert", "update", "delete", "aggregate", "count", "distinct",
+    "findAndModify", "getMore", "createIndexes", "listIndexes", "drop"
+}
+
+
+def _filter_shape(command_name: str, command: Dict[str, Any]) -> str:
+    """Field names a command filters on, e.g. "course_id,student_id" """
+    if command_name in ("find", "count", "distinct", "delete", "findAndModify"):
+        if command_name == "delete":
+            statements = command.get("deletes") or [{}]
+            query = statements[0].get("q", {})
+        else:
+            query = command.get("filter", command.get("query", {}))
+    elif command_name == "update":
+        statements = command.get("updates") or [{}]
+        query = statements[0].get("q", {})
+    elif command_name == "aggregate":
+        pipeline = command.get("pipeline") or [{}]
+        query = pipeline[0].get("$match", {}) if pipeline else {}
+    else:
+        return ""
+    return ",".join(sorted(query)) if isinstance(query, dict) else ""
+
+
+class _LatencyStats:
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+    def record(self, duration_ms: float, failed: bool):
+        self.count += 1
+        self.errors += failed
+        self.total_ms += duration_ms
+        self.max_ms = max(self.max_ms, duration_ms)
+        for index, bound in enumerate(LATENCY_BUCKETS_MS):
+            if duration_ms <= bound:
+                self.buckets[index] += 1
+                return
+        self.buckets[-1] += 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        labels = [f"le_{bound}ms" for bound in LATENCY_BUCKETS_MS] + ["+inf"]
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "avg_ms": round(self.total_ms / self.count, 2) if self.count else 0.0,
+            "max_ms": round(self.max_ms, 2),
+            "histogram": dict(zip(labels, self.buckets))
+        }
+
+
+class CommandMetrics(monitoring.CommandListener):
+    """
+    Listener callbacks run on pymongo's threads, so state is guarded by a lock
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._in_flight: Dict[Tuple[Any, int], Tuple[str, str, str]] = {}
+        self._latency: Dict[Tuple[str, str], _LatencyStats] = {}
+        self._slow = deque(maxlen=SLOW_QUERY_LOG_SIZE)
+        self._slow_count = 0
+
+    def started(self, event):
+        if event.command_name not in COLLECTION_COMMANDS:
+            return
+        collection = event.command.get(event.command_name)
+        if event.command_name == "getMore":
+            collection = event.command.get("collection")
+        if not isinstance(collection, str):
+            return
+        shape = _filter_shape(event.command_name, event.command)
+        with self._lock:
+            self._in_flight[(event.connection_id, event.request_id)] = (collection, event.command_name, shape)
+
+    def succeeded(self, event):
+        self._finish(event, failed=False)
+
+    def failed(self, event):
+        self._finish(event, failed=True)
+
+    def _finish(self, event, failed: bool):
+        duration_ms = event.duration_micros / 1000
+        with self._lock:
+            command = self._in_flight.pop((event.connection_id, event.request_id), None)
+            if command is None:
+                return
+            collection, operation, shape = command
+            stats = self._latency.get((collection, operation))
+            if stats is None:
+                stats = self._latency[(collection, operation)] = _LatencyStats()
+            stats.record(duration_ms, failed)
+
+            if duration_ms >= SLOW_QUERY_MS:
+                self._slow_count += 1
+                self._slow.append({
+                    "collection": collection,
+                    "operation": operation,
+                    "filter_fields": shape,
+                    "duration_ms": round(duration_ms, 1),
+                    "failed": failed,
+                    "at": datetime.utcnow().isoformat()
+                })
+        if duration_ms >= SLOW_QUERY_MS:
+            print(f"Slow MongoDB {operation} on {collection} ({shape or 'no filter'}): {duration_ms:.0f}ms")
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            collections: Dict[str, Dict[str, Any]] = {}
+            for (collection, operation), stats in sorted(self._latency.items()):
+                collections.setdefault(collection, {})[operation] = stats.to_dict()
+            return {
+                "slow_query_ms": SLOW_QUERY_MS,
+                "slow_queries": self._slow_count,
+                "recent_slow_queries": list(self._slow),
+                "collections": collections
+            }
+
+    def reset(self):
+        with self._lock:
+            self._latency.clear()
+            self._slow.clear()
+            self._slow_count = 0
+
+
+command_metrics = CommandMetrics()
+
+
+def get_db_metrics() -> Dict[str, Any]:
+    return command_metrics.snapshot()
+
+
+def reset_db_metrics():
+    command_metrics.reset()
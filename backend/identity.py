@@ -0,0 +1,146 @@
+"""
+Request Identity
+One resolver for both ways of signing in - a session token (cookie or bearer,
+from Google sign-in) and a JWT access token (email/password login). Identity
+is resolved at most once per request and memoized on request.state, so every
+dependency and handler that asks for it shares the same lookup
+"""
+from typing import Dict, Any, Optional
+from fastapi import HTTPException, Request, status
+from jose import JWTError
+from database import get_database
+from auth_utils import decode_access_token
+from session_cache import get_cached_session, cache_session
+from datetime import datetime, timezone
+import os
+
+# Student id used for unauthenticated requests to student endpoints (demo mode)
+# Set DEMO_STUDENT_ID to an empty value to require sign-in instead
+DEMO_STUDENT_ID = os.getenv("DEMO_STUDENT_ID", "student-demo-001")
+
+
+def _bearer_token(request: Request) -> Optional[str]:
+    auth_header = request.headers.get("Authorization")
+    if auth_header and auth_header.startswith("Bearer "):
+        return auth_header[len("Bearer "):]
+    return None
+
+
+def _looks_like_jwt(token: str) -> bool:
+    return token.count(".") == 2
+
+
+async def load_session_user(session_token: str) -> Optional[Dict[str, Any]]:
+    """
+    The user document behind a session token, served from the session cache when possible
+    """
+    user = await get_cached_session(session_token)
+    if user:
+        return user
+
+    db = get_database()
+
+    # Check if session exists and is valid
+    session = await db.user_sessions.find_one({
+        "session_token": session_token,
+        "expires_at": {"$gt": datetime.now(timezone.utc).isoformat()}
+    })
+    if not session:
+        return None
+
+    user = await db.users.find_one({"id": session["user_id"]})
+    if not user:
+        return None
+
+    user.pop('_id', None)
+    await cache_session(session_token, user, session["expires_at"])
+    return user
+
+
+def _session_identity(user: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": user["id"],
+        "email": user.get("email"),
+        "role": user.get("role"),
+        "auth": "session",
+        "user": user
+    }
+
+
+def _jwt_identity(claims: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    if not claims.get("sub"):
+        return None
+    return {
+        "id": claims["sub"],
+        "email": claims.get("email"),
+        "role": claims.get("role"),
+        "auth": "jwt",
+        "user": None
+    }
+
+
+async def _resolve(request: Request) -> Optional[Dict[str, Any]]:
+    session_token = request.cookies.get("session_token")
+    if session_token:
+        user = await load_session_user(session_token)
+        if user:
+            return _session_identity(user)
+
+    bearer = _bearer_token(request)
+    if not bearer:
+        return None
+
+    if _looks_like_jwt(bearer):
+        try:
+            return _jwt_identity(decode_access_token(bearer))
+        except JWTError:
+            return None
+
+    user = await load_session_user(bearer)
+    return _session_identity(user) if user else None
+
+
+async def resolve_identity(request: Request) -> Optional[Dict[str, Any]]:
+    """
+    The caller's identity, or None when the request isn't signed in
+    {"id", "email", "role", "auth": "session" | "jwt", "user": user document or None}
+    """
+    if not hasattr(request.state, "identity"):
+        request.state.identity = await _resolve(request)
+    return request.state.identity
+
+
+async def require_identity(request: Request) -> Dict[str, Any]:
+    """Dependency: the caller's identity (401 when not signed in)"""
+    identity = await resolve_identity(request)
+    if not identity:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return identity
+
+
+async def get_student_id(request: Request) -> str:
+    """Dependency: the signed-in user's id, or DEMO_STUDENT_ID in demo mode"""
+    identity = await resolve_identity(request)
+    if identity:
+        return identity["id"]
+    if DEMO_STUDENT_ID:
+        return DEMO_STUDENT_ID
+    return (await require_identity(request))["id"]
+
+
+async def get_identity_user(request: Request) -> Optional[Dict[str, Any]]:
+    """
+    The signed-in user's document (loaded once for JWT identities, already there for sessions)
+    """
+    identity = await resolve_identity(request)
+    if not identity:
+        return None
+
+    if identity["user"] is None:
+        db = get_database()
+        identity["user"] = await db.users.find_one({"id": identity["id"]}, {"_id": 0, "hashed_password": 0})
+    return identity["user"]
@@ -0,0 +1,198 @@
+"""
+Material Ingestion Pipeline
+Uploads are spooled to a temp file, parsed page batch by page batch in a
+process pool (off the event loop) and stored into material_chunks as each
+batch arrives. Progress is recorded on the material document
+"""
+from typing import List, Dict, Any, Tuple
+from concurrent.futures import ProcessPoolExecutor
+from fastapi import UploadFile
+from database import get_database
+from retrieval import append_material_chunks, delete_material_chunks
+from materials_store import PREVIEW_CHARS
+from datetime import datetime
+import asyncio
+import codecs
+import hashlib
+import os
+import shutil
+import tempfile
+import zipfile
+
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+PDF_PAGES_PER_BATCH = int(os.getenv("INGEST_PDF_PAGES_PER_BATCH", "10"))
+SPOOL_CHUNK_BYTES = 1024 * 1024
+
+# Separator placed between pages in the material text
+PAGE_SEPARATOR = "\n\n"
+
+_executor = None
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=INGEST_WORKERS)
+    return _executor
+
+
+def shutdown_ingestion():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+# === Parsers (run in worker processes) ===
+
+def _pdf_page_count(path: str) -> int:
+    import PyPDF2
+    return len(PyPDF2.PdfReader(path).pages)
+
+
+def _extract_pdf_pages(path: str, start: int, end: int) -> List[str]:
+    import PyPDF2
+    reader = PyPDF2.PdfReader(path)
+    return [reader.pages[number].extract_text() or "" for number in range(start, end)]
+
+
+def _extract_docx(path: str) -> List[str]:
+    import docx
+    document = docx.Document(path)
+    return ["\n".join(paragraph.text for paragraph in document.paragraphs)]
+
+
+def _read_text(path: str) -> List[str]:
+    with open(path, 'rb') as handle:
+        return [handle.read().decode('utf-8', errors='ignore')]
+
+
+def _validate_file(path: str, filename: str):
+    """
+    Cheap structural check of an upload, raising on files the pipeline can't parse
+    (a PDF is opened far enough to count pages, a DOCX must be a Word zip, a .txt valid UTF-8)
+    """
+    if filename.endswith('.pdf'):
+        if _pdf_page_count(path) == 0:
+            raise ValueError("PDF has no pages")
+    elif filename.endswith('.docx'):
+        if not zipfile.is_zipfile(path):
+            raise ValueError("not a valid .docx file")
+        with zipfile.ZipFile(path) as archive:
+            if "word/document.xml" not in archive.namelist():
+                raise ValueError("not a valid .docx file")
+    elif filename.endswith('.txt'):
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        with open(path, 'rb') as handle:
+            for block in iter(lambda: handle.read(SPOOL_CHUNK_BYTES), b''):
+                decoder.decode(block)
+        decoder.decode(b'', final=True)
+
+
+# === Pipeline ===
+
+async def spool_upload(file: UploadFile) -> str:
+    """
+    Copy an upload to a temp file without holding it in memory; returns the path
+    """
+    suffix = os.path.splitext(file.filename or "")[1]
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix, prefix="brillia-upload-") as spool:
+        await asyncio.to_thread(shutil.copyfileobj, file.file, spool, SPOOL_CHUNK_BYTES)
+        return spool.name
+
+
+async def validate_upload(path: str, filename: str):
+    """
+    Reject unparseable uploads before responding, so the uploader gets the error
+    instead of a material that fails in the background; the spool is removed on failure
+    """
+    loop = asyncio.get_running_loop()
+    try:
+        await loop.run_in_executor(_get_executor(), _validate_file, path, filename)
+    except Exception:
+        os.remove(path)
+        raise
+
+
+async def _set_progress(material_id: str, **fields):
+    db = get_database()
+    fields["ingest_updated_at"] = datetime.utcnow().isoformat()
+    await db.course_materials.update_one({"id": material_id}, {"$set": fields})
+
+
+async def _page_batches(path: str, filename: str):
+    """Yield (pages, pages_done, pages_total) as batches are parsed"""
+    loop = asyncio.get_running_loop()
+    executor = _get_executor()
+
+    if filename.endswith('.pdf'):
+        total = await loop.run_in_executor(executor, _pdf_page_count, path)
+        for start in range(0, total, PDF_PAGES_PER_BATCH):
+            end = min(total, start + PDF_PAGES_PER_BATCH)
+            pages = await loop.run_in_executor(executor, _extract_pdf_pages, path, start, end)
+            yield pages, end, total
+    elif filename.endswith('.docx'):
+        pages = await loop.run_in_executor(executor, _extract_docx, path)
+        yield pages, 1, 1
+    else:
+        pages = await asyncio.to_thread(_read_text, path)
+        yield pages, 1, 1
+
+
+async def ingest_material(material: Dict[str, Any], path: str, filename: str) -> Tuple[int, int]:
+    """
+    Parse a spooled upload into a material's chunks and record its content metadata
+    Only a preview is kept in memory, never the whole document
+    Returns (pages, chunks)
+    """
+    material_id = material["id"]
+    page_count = 0
+    chunk_count = 0
+    offset = 0
+    preview = ""
+    content_digest = hashlib.sha256()
+
+    try:
+        async for batch, pages_done, pages_total in _page_batches(path, filename):
+            batch_text = PAGE_SEPARATOR.join(batch)
+            if page_count:
+                batch_text = PAGE_SEPARATOR + batch_text
+            chunk_count += await append_material_chunks(material, batch_text, chunk_count, offset)
+            offset += len(batch_text)
+            page_count += len(batch)
+            content_digest.update(batch_text.encode('utf-8'))
+            if len(preview) < PREVIEW_CHARS:
+                preview = (preview + batch_text)[:PREVIEW_CHARS]
+
+            await _set_progress(
+                material_id,
+                ingest_status="processing",
+                ingest_progress={"pages_done": pages_done, "pages_total": pages_total, "chunks": chunk_count}
+            )
+
+        await _set_progress(
+            material_id,
+            preview=preview,
+            char_count=offset,
+            chunk_count=chunk_count,
+            content_hash=content_digest.hexdigest(),
+            ingest_status="ready"
+        )
+        print(f"Ingested material {material_id}: {page_count} pages, {chunk_count} chunks")
+    except Exception as e:
+        print(f"Error ingesting material {material_id}: {e}")
+        await delete_material_chunks(material_id)
+        await _set_progress(material_id, ingest_status="failed", ingest_error=str(e))
+        raise
+    finally:
+        os.remove(path)
+
+    return page_count, chunk_count
+
+
+async def get_ingest_status(material_id: str) -> Dict[str, Any]:
+    db = get_database()
+    return await db.course_materials.find_one(
+        {"id": material_id},
+        {"_id": 0, "id": 1, "ingest_status": 1, "ingest_progress": 1, "ingest_error": 1}
+    )
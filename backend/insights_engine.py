@@ -0,0 +1,209 @@
+"""
+Student Insights Engine
+Builds the per-student learning insights with MongoDB aggregation pipelines
+so only summaries (not every attempt and message) cross the wire
+"""
+from typing import Dict, Any, List
+from database import get_database
+from analytics_rollups import rebuild_student_terms
+from collections import Counter
+from datetime import datetime, timedelta
+import asyncio
+
+# Filter out generic concepts
+CONCEPT_STOPWORDS = {
+    'what', 'how', 'why', 'data', 'training', 'testing', 'test',
+    'course', 'introduction', 'overview', 'student', 'learning',
+    'concept', 'topic', 'material', 'process', 'method', 'system'
+}
+
+ACTIVITY_DAYS = 7
+
+_TOPIC_OR_GENERAL = {
+    "$cond": [{"$in": [{"$ifNull": ["$topic", ""]}, [""]]}, "General", "$topic"]
+}
+
+
+async def _quiz_summary(course_id: str, student_id: str, since_day: str) -> Dict[str, Any]:
+    db = get_database()
+
+    result = await db.quiz_attempts.aggregate([
+        {"$match": {"course_id": course_id, "student_id": student_id}},
+        {"$facet": {
+            "totals": [
+                {"$group": {
+                    "_id": None,
+                    "count": {"$sum": 1},
+                    "score": {"$sum": "$score"},
+                    "possible": {"$sum": "$total_questions"}
+                }}
+            ],
+            "by_topic": [
+                {"$group": {
+                    "_id": _TOPIC_OR_GENERAL,
+                    "correct": {"$sum": "$score"},
+                    "total": {"$sum": "$total_questions"}
+                }}
+            ],
+            "recent": [
+                {"$sort": {"completed_at": -1}},
+                {"$limit": 7},
+                {"$project": {"_id": 0, "completed_at": 1, "score": 1, "total_questions": 1, "topic": _TOPIC_OR_GENERAL}}
+            ],
+            "daily": [
+                {"$match": {"completed_at": {"$gte": since_day}}},
+                {"$group": {"_id": {"$substrCP": ["$completed_at", 0, 10]}, "quizzes": {"$sum": 1}}}
+            ]
+        }}
+    ]).to_list(1)
+    return result[0] if result else {"totals": [], "by_topic": [], "recent": [], "daily": []}
+
+
+async def _chat_summary(course_id: str, student_id: str, since: datetime) -> Dict[str, Any]:
+    db = get_database()
+
+    result = await db.chat_messages.aggregate([
+        {"$match": {"course_id": course_id, "student_id": student_id, "role": "user"}},
+        {"$facet": {
+            "totals": [{"$count": "count"}],
+            "daily": [
+                {"$match": {"timestamp": {"$gte": since}}},
+                {"$group": {
+                    "_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$timestamp"}},
+                    "questions": {"$sum": 1}
+                }}
+            ]
+        }}
+    ]).to_list(1)
+    return result[0] if result else {"totals": [], "daily": []}
+
+
+async def _student_terms(course_id: str, student_id: str, total_questions: int) -> Dict[str, int]:
+    db = get_database()
+
+    term_doc = await db.student_term_counts.find_one(
+        {"course_id": course_id, "student_id": student_id},
+        {"terms": 1, "message_count": 1}
+    )
+    if total_questions > (term_doc or {}).get("message_count", 0):
+        # Messages missing from the term table (a student who predates it, even if
+        # they've chatted since the deploy) - backfill from their chat history
+        term_doc = await rebuild_student_terms(course_id, student_id)
+    return (term_doc or {}).get("terms", {})
+
+
+async def _concept_heatmap(course_id: str, student_id: str) -> List[Dict[str, Any]]:
+    db = get_database()
+
+    concept_mastery_records = await db.concept_mastery.find(
+        {"course_id": course_id, "student_id": student_id},
+        {"_id": 0, "concept": 1, "mastery_score": 1, "interactions": 1}
+    ).to_list(None)
+
+    concept_heatmap = []
+    for record in concept_mastery_records:
+        concept = record["concept"]
+        concept_lower = concept.lower()
+
+        # Skip generic concepts
+        if (concept_lower in CONCEPT_STOPWORDS or
+            len(concept) < 4 or
+            concept_lower.split()[0] in {'what', 'how', 'why'}):
+            continue
+
+        concept_heatmap.append({
+            "concept": concept,
+            "mastery": round(record["mastery_score"], 1),
+            "interactions": record["interactions"],
+            "students": 1  # Just this student
+        })
+
+    concept_heatmap.sort(key=lambda x: x["mastery"], reverse=True)
+    return concept_heatmap
+
+
+def _month_day(iso_day: str) -> str:
+    """'2024-03-07...' -> '03/07' without parsing the timestamp"""
+    return f"{iso_day[5:7]}/{iso_day[8:10]}"
+
+
+async def get_student_insights(course: Dict[str, Any], student_id: str) -> Dict[str, Any]:
+    """
+    Personalized learning insights for a student in a course
+    """
+    course_id = course["id"]
+    today = datetime.utcnow().date()
+    first_day = today - timedelta(days=ACTIVITY_DAYS - 1)
+    since = datetime.combine(first_day, datetime.min.time())
+
+    quiz, chat, concept_heatmap = await asyncio.gather(
+        _quiz_summary(course_id, student_id, first_day.isoformat()),
+        _chat_summary(course_id, student_id, since),
+        _concept_heatmap(course_id, student_id)
+    )
+
+    # === QUIZ PERFORMANCE ===
+    quiz_totals = quiz["totals"][0] if quiz["totals"] else {"count": 0, "score": 0, "possible": 0}
+    total_quizzes = quiz_totals["count"]
+    avg_score = round((quiz_totals["score"] / quiz_totals["possible"]) * 100) if quiz_totals["possible"] > 0 else 0
+
+    # Individual quiz scores for trend (last 7, oldest first)
+    quiz_scores = [
+        {
+            "date": _month_day(attempt["completed_at"]),
+            "score": round((attempt["score"] / attempt["total_questions"]) * 100) if attempt["total_questions"] > 0 else 0,
+            "topic": attempt["topic"]
+        }
+        for attempt in reversed(quiz["recent"])
+    ]
+
+    # Topic-wise performance
+    quiz_by_topic = [
+        {
+            "topic": row["_id"],
+            "score": round((row["correct"] / row["total"]) * 100) if row["total"] > 0 else 0,
+            "attempts": row["total"] // 5  # Assuming 5 questions per quiz
+        }
+        for row in quiz["by_topic"]
+    ]
+    quiz_by_topic.sort(key=lambda x: x["score"], reverse=True)
+
+    # === CHAT TOPICS ===
+    total_questions = chat["totals"][0]["count"] if chat["totals"] else 0
+    terms = await _student_terms(course_id, student_id, total_questions)
+    most_discussed = [
+        {"topic": word, "count": count}
+        for word, count in Counter(terms).most_common(10)
+    ]
+
+    # === LEARNING STREAK ===
+    daily_questions = {row["_id"]: row["questions"] for row in chat["daily"]}
+    daily_quizzes = {row["_id"]: row["quizzes"] for row in quiz["daily"]}
+    activity_streak = []
+    for i in range(ACTIVITY_DAYS - 1, -1, -1):
+        day = (today - timedelta(days=i)).isoformat()
+        questions = daily_questions.get(day, 0)
+        quizzes = daily_quizzes.get(day, 0)
+        activity_streak.append({
+            "date": _month_day(day),
+            "questions": questions,
+            "quizzes": quizzes,
+            "active": questions > 0 or quizzes > 0
+        })
+
+    return {
+        "course_title": course.get("title", "Unknown"),
+        "total_questions_asked": total_questions,
+        "total_quizzes": total_quizzes,
+        "avg_quiz_score": avg_score,
+        "quiz_scores": quiz_scores,
+        "quiz_by_topic": quiz_by_topic,
+        "most_discussed_topics": most_discussed,
+        "concept_mastery": {
+            "total_concepts": len(concept_heatmap),
+            "heatmap_data": concept_heatmap
+        },
+        "activity_streak": activity_streak,
+        "mastered_concepts": len([c for c in concept_heatmap if c["mastery"] >= 80]),
+        "weak_concepts": [c["concept"] for c in concept_heatmap if c["mastery"] < 40][:5]
+    }
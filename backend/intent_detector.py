@@ -2,16 +2,146 @@
 AI-powered intent detection for student messages
 Detects quiz requests and extracts specific topics
 """
-from emergentintegrations.llm.chat import LlmChat, UserMessage
 from dotenv import load_dotenv
+from typing import Dict, List, Tuple
+from collections import Counter
 import os
-import json
+import math
 import re
+import llm_gateway
+from materials_store import material_text
 
 load_dotenv()
-EMERGENT_LLM_KEY = os.getenv("EMERGENT_LLM_KEY")
+
+# Local model score at or below which a message is settled as "not a quiz request"
+# Only the explicit regex rules settle a quiz request locally; model positives go to the LLM
+LOCAL_NOT_QUIZ_THRESHOLD = float(os.getenv("INTENT_LOCAL_NOT_QUIZ_THRESHOLD", "0.2"))
+
+# Explicit quiz requests - the original keyword fallback, as regex rules
+QUIZ_REQUEST_PATTERNS = [
+    re.compile(r"\b(?:quiz|test)\s+me\b"),
+    re.compile(r"\bgive\s+me\s+(?:a|an|another|some)\s+(?:\w+\s+)?(?:quiz|test|practice\s+questions?)\b"),
+    re.compile(r"\b(?:i\s+want|i'd\s+like|i\s+would\s+like|let\s+me|can\s+i)\s+(?:to\s+)?(?:take|do|try)\s+(?:a|an|another)\s+(?:\w+\s+)?(?:quiz|test)\b"),
+]
+
+QUIZ_TOPIC_PATTERNS = [
+    re.compile(r"\b(?:quiz|test)\s+me\s+(?:on|about|over|in)\s+(.+)$"),
+    re.compile(r"\b(?:quiz|test|questions?)\s+(?:on|about|over|covering)\s+(.+)$"),
+]
+
+# Seed examples for the local n-gram logistic model
+QUIZ_SEED_EXAMPLES = [
+    "quiz me", "test me", "give me a quiz", "i want to take a quiz",
+    "quiz me on supervised learning", "test me on algorithms",
+    "can you quiz me on recursion", "give me a practice test",
+    "i want to practice", "check if i know this", "can you assess my understanding",
+    "ask me some questions to test my knowledge", "let me try a quiz",
+    "give me some practice questions", "i'd like to be tested on sorting",
+    "can i do a quiz about neural networks", "test my knowledge of hash tables",
+    "quiz time", "ready for a quiz", "practice questions on linked lists",
+    "see if i understand gradient descent with a few questions",
+    "another quiz please", "one more test", "drill me on binary trees",
+]
+
+NOT_QUIZ_SEED_EXAMPLES = [
+    "what is test data", "explain testing", "what is the difference between training and test sets",
+    "can you explain recursion", "what does overfitting mean", "how does gradient descent work",
+    "hello", "thanks", "thank you", "i don't understand", "i don't get it",
+    "explain binary search trees", "what is a hash table", "why is quicksort fast",
+    "how do neural networks learn", "what is unit testing", "give me an example of polymorphism",
+    "can you give me an example", "summarize the lecture", "what will be on the exam",
+    "when is the midterm", "how do i test my code", "what is a test case",
+    "explain the quiz question i got wrong", "what is supervised learning",
+    "help me understand backpropagation", "show me how merge sort works",
+    "tell me about linked lists", "teach me about hash tables", "i want to learn about graphs",
+    "tell me more about recursion", "teach me sorting algorithms", "show me an example of a linked list",
+    "i want to learn more", "i'd like to understand dynamic programming", "can you teach me about trees",
+    "walk me through dijkstra's algorithm", "tell me how hashing works", "show me the steps",
+]
+
+
+def _intent_features(message: str) -> List[str]:
+    """Word unigrams and bigrams for the local intent model"""
+    tokens = re.findall(r"[a-z']+", message.lower())
+    features = [f"w:{token}" for token in tokens]
+    features += [f"b:{a}_{b}" for a, b in zip(tokens, tokens[1:])]
+    features.append("bias")
+    return features
+
+
+def _train_intent_model(epochs: int = 200, learning_rate: float = 0.3, l2: float = 0.001) -> Dict[str, float]:
+    """Train a small logistic regression over n-grams from the seed examples"""
+    examples: List[Tuple[List[str], int]] = (
+        [(_intent_features(m), 1) for m in QUIZ_SEED_EXAMPLES] +
+        [(_intent_features(m), 0) for m in NOT_QUIZ_SEED_EXAMPLES]
+    )
+    weights: Dict[str, float] = {}
+    for _ in range(epochs):
+        for features, label in examples:
+            z = sum(weights.get(f, 0.0) for f in features)
+            prediction = 1.0 / (1.0 + math.exp(-z))
+            gradient = prediction - label
+            for f in features:
+                w = weights.get(f, 0.0)
+                weights[f] = w - learning_rate * (gradient + l2 * w)
+    return weights
+
+
+_INTENT_WEIGHTS = _train_intent_model()
+
+
+def _quiz_probability(message: str) -> float:
+    z = sum(_INTENT_WEIGHTS.get(f, 0.0) for f in _intent_features(message))
+    z = max(-30.0, min(30.0, z))
+    return 1.0 / (1.0 + math.exp(-z))
+
+
+def _extract_quiz_topic(message_lower: str):
+    for pattern in QUIZ_TOPIC_PATTERNS:
+        match = pattern.search(message_lower)
+        if match:
+            topic = re.sub(r"[\s?.!]+$", "", match.group(1)).strip()
+            topic = re.sub(r"^(?:the|a|an)\s+", "", topic)
+            if topic and topic not in {"it", "this", "that", "everything", "anything"}:
+                return topic
+    return None
+
+
+def classify_quiz_intent_local(message: str) -> dict:
+    """
+    Fast local quiz-intent classifier (regex rules + n-gram logistic model)
+    
+    Returns the same shape as detect_quiz_intent plus an "ambiguous" flag;
+    ambiguous messages should be confirmed with the LLM classifier. Only the
+    explicit regex rules settle a quiz request - a model-only positive is
+    always ambiguous, so teaching requests are never answered with a quiz
+    without the LLM agreeing.
+    """
+    message_lower = message.lower().strip()
+    topic = _extract_quiz_topic(message_lower)
+    
+    if any(pattern.search(message_lower) for pattern in QUIZ_REQUEST_PATTERNS):
+        return {"is_quiz_request": True, "topic": topic, "confidence": 0.9, "ambiguous": False}
+    
+    probability = _quiz_probability(message_lower)
+    if probability <= LOCAL_NOT_QUIZ_THRESHOLD:
+        return {"is_quiz_request": False, "topic": None, "confidence": round(1 - probability, 2), "ambiguous": False}
+    
+    return {"is_quiz_request": probability >= 0.5, "topic": topic, "confidence": round(probability, 2), "ambiguous": True}
+
 
 async def detect_quiz_intent(message: str) -> dict:
+    """
+    Staged quiz-intent detection: local classifier first, LLM only for ambiguous messages
+    """
+    local_intent = classify_quiz_intent_local(message)
+    if not local_intent["ambiguous"]:
+        return {k: local_intent[k] for k in ("is_quiz_request", "topic", "confidence")}
+    
+    return await detect_quiz_intent_llm(message)
+
+
+async def detect_quiz_intent_llm(message: str) -> dict:
     """
     Use AI to detect if student is asking for a quiz and extract the topic
     
@@ -49,22 +179,15 @@ Return ONLY valid JSON:
 }"""
 
     try:
-        chat = LlmChat(
-            api_key=EMERGENT_LLM_KEY,
-            session_id="intent-detection",
-            system_message=system_message
-        ).with_model("anthropic", "claude-3-7-sonnet-20250219")
-        
         prompt = f"Analyze this student message: \"{message}\""
-        response = await chat.send_message(UserMessage(text=prompt))
-        
-        # Parse JSON response
-        response_text = response.strip()
-        if response_text.startswith('```'):
-            response_text = re.sub(r'^```json\s*', '', response_text)
-            response_text = re.sub(r'```\s*$', '', response_text)
+        response = await llm_gateway.complete(
+            system_message,
+            prompt,
+            use_cache=True,
+            validate=lambda text: isinstance(llm_gateway.parse_json_response(text), dict)
+        )
         
-        result = json.loads(response_text)
+        result = llm_gateway.parse_json_response(response)
         
         # Validate structure
         if not isinstance(result, dict):
@@ -78,50 +201,126 @@ Return ONLY valid JSON:
         
     except Exception as e:
         print(f"Error in intent detection: {e}")
-        # Fallback to simple keyword detection
-        message_lower = message.lower()
-        if any(phrase in message_lower for phrase in ["quiz me", "test me", "give me a quiz"]):
-            return {"is_quiz_request": True, "topic": None, "confidence": 0.7}
+        # Fallback to the explicit quiz-request rules only
+        local_intent = classify_quiz_intent_local(message)
+        if local_intent["is_quiz_request"] and not local_intent["ambiguous"]:
+            return {"is_quiz_request": True, "topic": local_intent["topic"], "confidence": 0.7}
         return {"is_quiz_request": False, "topic": None, "confidence": 0.0}
 
 
-async def filter_materials_by_topic(materials: list, topic: str) -> list:
+# Fraction of topic terms a material must contain to count as relevant without asking the LLM
+TOPIC_COVERAGE_THRESHOLD = 0.6
+
+
+async def rank_materials_by_topic(materials: list, topic: str) -> List[Tuple[dict, float, float]]:
     """
-    Filter course materials to only include content relevant to the specified topic
+    Rank materials against a topic with BM25 over per-material term statistics
+    
+    Returns (material, score, coverage) tuples sorted by score, where coverage is
+    the fraction of topic terms that appear in the material.
     """
-    if not topic:
-        return materials
+    from retrieval import tokenize, material_term_stats, BM25_K1, BM25_B
+    
+    topic_terms = list(dict.fromkeys(tokenize(topic)))
+    if not topic_terms or not materials:
+        return [(material, 0.0, 0.0) for material in materials]
     
+    # Precomputed chunk statistics, with a local fallback for materials not indexed yet
+    stats = await material_term_stats(
+        materials[0].get("course_id"),
+        [material["id"] for material in materials],
+        topic_terms
+    )
+    for material in materials:
+        if material["id"] not in stats:
+            counts = Counter(tokenize(material_text(material)))
+            stats[material["id"]] = {
+                "length": sum(counts.values()),
+                "terms": {term: counts[term] for term in topic_terms if counts[term]}
+            }
+    
+    material_count = len(materials)
+    avg_length = max(1.0, sum(s["length"] for s in stats.values()) / material_count)
+    document_frequency = Counter(term for s in stats.values() for term in s["terms"])
+    
+    ranked = []
+    for material in materials:
+        material_stats = stats[material["id"]]
+        title_terms = set(tokenize(material.get("title", "")))
+        length_norm = BM25_K1 * (1 - BM25_B + BM25_B * material_stats["length"] / avg_length)
+        score = 0.0
+        present = 0
+        for term in topic_terms:
+            tf = material_stats["terms"].get(term, 0) + (2 if term in title_terms else 0)
+            if not tf:
+                continue
+            present += 1
+            idf = math.log(1 + (material_count - document_frequency[term] + 0.5) / (document_frequency[term] + 0.5))
+            score += idf * tf * (BM25_K1 + 1) / (tf + length_norm)
+        ranked.append((material, score, present / len(topic_terms)))
+    
+    ranked.sort(key=lambda item: item[1], reverse=True)
+    return ranked
+
+
+async def _confirm_borderline_materials(materials: list, topic: str) -> list:
+    """
+    Single batched LLM call deciding which borderline materials are relevant
+    """
     system_message = """You are a content relevance analyzer for educational materials.
 
-Your task: Determine if course material content is relevant to a specific topic.
+Your task: Determine which course materials are relevant to a specific topic.
+
+Return ONLY a JSON array of the numbers of the relevant materials, e.g. [1, 3]."""
+    
+    listing = "\n\n".join(
+        f"{number}. Title: \"{material.get('title', '')}\"\nContent: \"{material_text(material)[:500]}...\""
+        for number, material in enumerate(materials, start=1)
+    )
+    
+    prompt = f"""Topic: "{topic}"
+
+Materials:
+{listing}
+
+Which materials are relevant to the topic? Return ONLY a JSON array of numbers."""
+    
+    response = await llm_gateway.complete(
+        system_message,
+        prompt,
+        use_cache=True,
+        validate=lambda text: isinstance(llm_gateway.parse_json_response(text), list)
+    )
+    
+    numbers = llm_gateway.parse_json_response(response)
+    return [materials[n - 1] for n in numbers if isinstance(n, int) and 1 <= n <= len(materials)]
 
-Respond with ONLY "YES" or "NO" for each material."""
 
+async def filter_materials_by_topic(materials: list, topic: str) -> list:
+    """
+    Filter course materials to only include content relevant to the specified topic
+    
+    Materials are ranked locally; only borderline ones (some but not most topic
+    terms present) go to the LLM, in one batched call.
+    """
+    if not topic:
+        return materials
+    
     try:
-        relevant_materials = []
+        ranked = await rank_materials_by_topic(materials, topic)
+        
+        relevant_materials = [m for m, score, coverage in ranked if score > 0 and coverage >= TOPIC_COVERAGE_THRESHOLD]
+        borderline = [m for m, score, coverage in ranked if score > 0 and coverage < TOPIC_COVERAGE_THRESHOLD]
         
-        for material in materials[:10]:  # Limit to avoid token limits
-            content = material.get('content', '')[:1000]  # First 1000 chars
-            title = material.get('title', '')
-            
-            chat = LlmChat(
-                api_key=EMERGENT_LLM_KEY,
-                session_id="relevance-check",
-                system_message=system_message
-            ).with_model("anthropic", "claude-3-7-sonnet-20250219")
-            
-            prompt = f"""Topic: "{topic}"
-
-Material Title: "{title}"
-Material Content: "{content}..."
-
-Is this material relevant to the topic? Answer ONLY "YES" or "NO"."""
-            
-            response = await chat.send_message(UserMessage(text=prompt))
-            
-            if "YES" in response.upper():
-                relevant_materials.append(material)
+        if borderline:
+            try:
+                confirmed = {m["id"] for m in await _confirm_borderline_materials(borderline[:10], topic)}
+                relevant_materials += [m for m in borderline if m["id"] in confirmed]
+            except Exception as e:
+                print(f"Error confirming borderline materials: {e}")
+                # Keep the best partial matches rather than dropping them all
+                if not relevant_materials:
+                    relevant_materials = borderline[:5]
         
         # If no materials match, return all (better than nothing)
         return relevant_materials if relevant_materials else materials[:5]
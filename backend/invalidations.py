@@ -0,0 +1,51 @@
+"""
+Cross-Worker Cache Invalidations
+Each worker keeps its own in-process caches (sessions, courses). A worker that
+changes cached data writes an invalidation to session_invalidations, and every
+worker applies the ones written since its last check before serving from its cache
+"""
+from typing import Dict, Any, List
+from database import get_database
+from datetime import datetime, timedelta
+import os
+import time
+
+# How often a worker checks for invalidations written by other workers
+INVALIDATION_POLL_SECONDS = float(os.getenv("SESSION_INVALIDATION_POLL_SECONDS", "1"))
+# Re-read window covering invalidations committed slightly out of order
+INVALIDATION_OVERLAP_SECONDS = 5
+
+
+async def publish_invalidation(invalidation: Dict[str, Any]):
+    """Tell every worker to drop a cached entry (e.g. {"session_token": ...} or {"course_id": ...})"""
+    db = get_database()
+    await db.session_invalidations.insert_one({**invalidation, "created_at": datetime.utcnow()})
+
+
+class InvalidationFeed:
+    """
+    One cache's view of the invalidation log: poll() returns the invalidations
+    carrying any of `fields` written since the previous poll, at most every
+    INVALIDATION_POLL_SECONDS
+    """
+
+    def __init__(self, *fields: str):
+        self.fields = fields
+        # Nothing is cached before the worker starts, so older invalidations don't matter
+        self._synced_until = datetime.utcnow()
+        self._next_poll = 0.0
+
+    async def poll(self) -> List[Dict[str, Any]]:
+        if time.monotonic() < self._next_poll:
+            return []
+        self._next_poll = time.monotonic() + INVALIDATION_POLL_SECONDS
+
+        db = get_database()
+        polled_at = datetime.utcnow()
+        since = self._synced_until - timedelta(seconds=INVALIDATION_OVERLAP_SECONDS)
+        invalidations = await db.session_invalidations.find(
+            {"created_at": {"$gt": since}, "$or": [{field: {"$exists": True}} for field in self.fields]},
+            {"_id": 0}
+        ).to_list(None)
+        self._synced_until = polled_at
+        return invalidations
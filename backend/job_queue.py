@@ -0,0 +1,195 @@
+"""
+Background Job Queue
+Persistent jobs in the background_jobs collection, processed by a small pool
+of asyncio workers started with the app. Jobs survive restarts and duplicate
+jobs for the same dedupe key are collapsed while one is pending. A running job
+is heartbeated by its worker; one whose heartbeat stops (the process died) is
+reclaimed by the next worker looking for work
+"""
+from typing import Dict, Any, Optional, Callable, Awaitable, List
+from database import get_database
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from datetime import datetime, timedelta
+import asyncio
+import os
+import uuid
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+# How often idle workers check the collection for jobs enqueued by other processes
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "5"))
+# How often a worker refreshes updated_at on the job it is running
+JOB_HEARTBEAT_SECONDS = float(os.getenv("JOB_HEARTBEAT_SECONDS", "30"))
+# Running jobs without a heartbeat for this long were abandoned by a worker that stopped
+JOB_STALE_SECONDS = int(os.getenv("JOB_STALE_SECONDS", "120"))
+
+JobHandler = Callable[[Dict[str, Any]], Awaitable[Optional[Dict[str, Any]]]]
+
+_handlers: Dict[str, JobHandler] = {}
+_workers: List[asyncio.Task] = []
+_wakeup: Optional[asyncio.Event] = None
+
+
+def register_job_handler(job_type: str, handler: JobHandler):
+    _handlers[job_type] = handler
+
+
+def _get_wakeup() -> asyncio.Event:
+    global _wakeup
+    if _wakeup is None:
+        _wakeup = asyncio.Event()
+    return _wakeup
+
+
+async def enqueue_job(job_type: str, payload: Dict[str, Any], dedupe_key: Optional[str] = None) -> str:
+    """
+    Queue a job (no-op if a job with the same dedupe key is already pending)
+    Returns the id of the new or already pending job
+    Pending jobs carry pending: true, which a unique partial index on dedupe_key
+    covers - of two concurrent enqueues only one can insert
+    """
+    db = get_database()
+    now = datetime.utcnow().isoformat()
+    dedupe_key = dedupe_key or str(uuid.uuid4())
+
+    try:
+        job = await db.background_jobs.find_one_and_update(
+            {"dedupe_key": dedupe_key, "pending": True},
+            {"$setOnInsert": {
+                "id": str(uuid.uuid4()),
+                "job_type": job_type,
+                "payload": payload,
+                "status": "queued",
+                "attempts": 0,
+                "error": None,
+                "created_at": now,
+                "updated_at": now
+            }},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+            projection={"id": 1}
+        )
+    except DuplicateKeyError:
+        # A concurrent enqueue inserted it first - that job is the pending one
+        job = await db.background_jobs.find_one({"dedupe_key": dedupe_key, "pending": True}, {"id": 1})
+        if job is None:
+            # ...and it already finished; queue again
+            return await enqueue_job(job_type, payload, dedupe_key)
+        return job["id"]
+    _get_wakeup().set()
+    return job["id"]
+
+
+async def _claim_job() -> Optional[Dict[str, Any]]:
+    """
+    Claim the oldest queued job, or a running one whose worker stopped heartbeating
+    Each claim gets a fresh claim_id, so a presumed-dead worker that wakes up
+    can no longer heartbeat or finish the job
+    """
+    db = get_database()
+    now = datetime.utcnow()
+    job_types = list(_handlers)
+    stale_before = (now - timedelta(seconds=JOB_STALE_SECONDS)).isoformat()
+    return await db.background_jobs.find_one_and_update(
+        {"$or": [
+            {"status": "queued", "job_type": {"$in": job_types}},
+            {"status": "running", "job_type": {"$in": job_types}, "updated_at": {"$lt": stale_before}}
+        ]},
+        {
+            "$set": {"status": "running", "claim_id": str(uuid.uuid4()), "updated_at": now.isoformat()},
+            "$inc": {"attempts": 1}
+        },
+        sort=[("created_at", 1)],
+        return_document=ReturnDocument.AFTER
+    )
+
+
+async def _heartbeat(job: Dict[str, Any]):
+    db = get_database()
+    while True:
+        await asyncio.sleep(JOB_HEARTBEAT_SECONDS)
+        await db.background_jobs.update_one(
+            {"id": job["id"], "claim_id": job["claim_id"]},
+            {"$set": {"updated_at": datetime.utcnow().isoformat()}}
+        )
+
+
+async def _run_job(job: Dict[str, Any]):
+    db = get_database()
+    if job["attempts"] > JOB_MAX_ATTEMPTS:
+        # Reclaimed after its worker died on every attempt - stop retrying
+        update = {"status": "failed", "error": "abandoned by its worker on every attempt"}
+    else:
+        heartbeat = asyncio.create_task(_heartbeat(job))
+        try:
+            result = await _handlers[job["job_type"]](job["payload"])
+            update = {"status": "done", "result": result}
+        except Exception as e:
+            print(f"Job {job['job_type']} {job['id']} failed (attempt {job['attempts']}): {e}")
+            update = {
+                "status": "queued" if job["attempts"] < JOB_MAX_ATTEMPTS else "failed",
+                "error": str(e)
+            }
+        finally:
+            heartbeat.cancel()
+    update["updated_at"] = datetime.utcnow().isoformat()
+    changes = {"$set": update}
+    if update["status"] != "queued":
+        # Finished - the dedupe key is free for the next job
+        changes["$unset"] = {"pending": ""}
+    await db.background_jobs.update_one({"id": job["id"], "claim_id": job["claim_id"]}, changes)
+
+
+async def _requeue_job(job: Dict[str, Any]):
+    db = get_database()
+    await db.background_jobs.update_one(
+        {"id": job["id"], "status": "running", "claim_id": job["claim_id"]},
+        {"$set": {"status": "queued", "updated_at": datetime.utcnow().isoformat()}, "$inc": {"attempts": -1}}
+    )
+
+
+async def _worker_loop(worker_number: int):
+    wakeup = _get_wakeup()
+    while True:
+        job = await _claim_job()
+        if job:
+            try:
+                await _run_job(job)
+            except asyncio.CancelledError:
+                # Shutting down mid-job - hand it back for the next worker
+                await _requeue_job(job)
+                raise
+            continue
+
+        wakeup.clear()
+        try:
+            await asyncio.wait_for(wakeup.wait(), timeout=JOB_POLL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def start_job_workers():
+    """
+    Start the workers - jobs abandoned by a stopped worker are picked up by
+    _claim_job once their heartbeat is stale, while jobs other API processes
+    are still running (and heartbeating) are left alone
+    """
+    for worker_number in range(JOB_WORKERS):
+        _workers.append(asyncio.create_task(_worker_loop(worker_number)))
+    print(f"Started {JOB_WORKERS} background job workers")
+
+
+async def stop_job_workers():
+    for worker in _workers:
+        worker.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
+
+
+async def get_job_counts() -> Dict[str, int]:
+    db = get_database()
+    rows = await db.background_jobs.aggregate([
+        {"$group": {"_id": "$status", "count": {"$sum": 1}}}
+    ]).to_list(None)
+    return {row["_id"]: row["count"] for row in rows}
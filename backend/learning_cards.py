@@ -0,0 +1,153 @@
+"""
+Learning Card Generation
+Builds review and quick-quiz cards for concepts a student hasn't mastered yet.
+Runs as a background job so the cards endpoint only reads ready cards
+"""
+from typing import Dict, Any, Optional
+from database import get_database
+from ai_engine import generate_content_summary, generate_quick_quiz
+from job_queue import enqueue_job
+from llm_gateway import gather_bounded
+from retrieval import retrieve_chunks
+from repositories.concept_mastery import find_weakest_concepts
+from datetime import datetime, timedelta
+import asyncio
+import os
+import random
+
+LEARNING_CARDS_JOB = "learning_cards"
+
+# Concepts below this mastery score get cards
+CARD_MASTERY_THRESHOLD = 60
+# Refill when a student's active pool drops below MIN, never grow it beyond MAX
+MIN_ACTIVE_CARDS = 3
+MAX_ACTIVE_CARDS = 5
+# Cards still generating after this are dropped (the next refill picks the concept up again)
+CARD_GENERATION_DEADLINE_SECONDS = float(os.getenv("CARD_GENERATION_DEADLINE_SECONDS", "60"))
+# After a run finds no more weak concepts, polls don't queue another run for this long
+CARD_IDLE_COOLDOWN_SECONDS = int(os.getenv("CARD_IDLE_COOLDOWN_SECONDS", "600"))
+
+
+async def _is_idle(course_id: str, student_id: str) -> bool:
+    db = get_database()
+    state = await db.learning_card_state.find_one(
+        {"course_id": course_id, "student_id": student_id},
+        {"_id": 0, "idle_until": 1}
+    )
+    return bool(state and state.get("idle_until", "") > datetime.utcnow().isoformat())
+
+
+async def _set_idle(course_id: str, student_id: str, idle: bool):
+    """Record whether the last run ran out of concepts to make cards for"""
+    db = get_database()
+    idle_until = datetime.utcnow() + timedelta(seconds=CARD_IDLE_COOLDOWN_SECONDS) if idle else datetime.utcnow()
+    await db.learning_card_state.update_one(
+        {"course_id": course_id, "student_id": student_id},
+        {"$set": {"idle_until": idle_until.isoformat()}},
+        upsert=True
+    )
+
+
+async def request_learning_cards(course_id: str, student_id: str) -> Optional[str]:
+    """
+    Queue card generation for a student (collapsed with any pending request)
+    Skipped (returns None) while the last run found nothing to generate
+    """
+    if await _is_idle(course_id, student_id):
+        return None
+    return await enqueue_job(
+        LEARNING_CARDS_JOB,
+        {"course_id": course_id, "student_id": student_id},
+        dedupe_key=f"{LEARNING_CARDS_JOB}:{course_id}:{student_id}"
+    )
+
+
+async def _build_card(
+    course_id: str,
+    student_id: str,
+    record: Dict[str, Any]
+) -> Dict[str, Any]:
+    concept = record["concept"]
+    mastery = record["mastery_score"]
+
+    # The parts of the course materials about this concept, wherever they appear
+    context_chunks = await retrieve_chunks(course_id, concept, k=3)
+
+    # Decide card type (70% review, 30% quiz)
+    card_type = "review" if random.random() < 0.7 else "quiz"
+
+    # Summary and quiz question are independent - request them together
+    calls = [generate_content_summary(concept, context_chunks)]
+    if card_type == "quiz":
+        calls.append(generate_quick_quiz(concept, context_chunks))
+    summary, *quiz_result = await asyncio.gather(*calls, return_exceptions=True)
+
+    if isinstance(summary, Exception):
+        print(f"Error generating summary: {summary}")
+        summary = f"Review the concept of {concept}. Focus on understanding the fundamentals and key relationships."
+
+    quiz_question = None
+    if quiz_result:
+        if isinstance(quiz_result[0], Exception):
+            print(f"Error generating quiz: {quiz_result[0]}")
+            card_type = "review"  # Fallback to review
+        else:
+            quiz_question = quiz_result[0]
+
+    # Priority based on mastery (lower mastery = higher priority)
+    priority = 1 if mastery < 40 else (2 if mastery < 50 else 3)
+
+    return {
+        "id": f"card-{student_id}-{concept}-{datetime.utcnow().timestamp()}",
+        "course_id": course_id,
+        "student_id": student_id,
+        "concept": concept,
+        "card_type": card_type,
+        "content_summary": summary,
+        "quiz_question": quiz_question,
+        "priority": priority,
+        "dismissed": False,
+        "completed_at": None,
+        "created_at": datetime.utcnow().isoformat()
+    }
+
+
+async def generate_learning_cards(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Job handler: top up a student's active cards with the weakest uncovered concepts
+    """
+    db = get_database()
+    course_id = payload["course_id"]
+    student_id = payload["student_id"]
+
+    active_cards = await db.learning_cards.find(
+        {"course_id": course_id, "student_id": student_id, "dismissed": False},
+        {"_id": 0, "concept": 1}
+    ).to_list(None)
+    open_slots = MAX_ACTIVE_CARDS - len(active_cards)
+    if open_slots <= 0:
+        return {"created": 0}
+
+    covered = {card["concept"] for card in active_cards}
+    # Concepts needing mastery
+    concept_mastery_records = await find_weakest_concepts(
+        course_id,
+        student_id,
+        below=CARD_MASTERY_THRESHOLD,
+        limit=len(covered) + open_slots,
+        projection={"_id": 0, "concept": 1, "mastery_score": 1}
+    )
+    records = [record for record in concept_mastery_records if record["concept"] not in covered][:open_slots]
+    # Fewer weak concepts than open slots - nothing more to generate until mastery changes
+    await _set_idle(course_id, student_id, idle=len(records) < open_slots)
+    if not records:
+        return {"created": 0}
+
+    results = await gather_bounded(
+        [lambda record=record: _build_card(course_id, student_id, record) for record in records],
+        deadline=CARD_GENERATION_DEADLINE_SECONDS
+    )
+    cards = [card for card in results if card]
+    if cards:
+        await db.learning_cards.insert_many(cards)
+    return {"created": len(cards)}
@@ -0,0 +1,116 @@
+"""
+LLM Response Cache
+Reuses responses to prompts that are identical across students (concept
+summaries, review questions, intent checks). Keys are (model, normalized system
+prompt, normalized user prompt); entries live in a bounded in-process TTL cache
+backed by the llm_response_cache collection so they survive restarts
+"""
+from typing import Dict, Any, Optional
+from cachetools import TTLCache
+from database import get_database
+from datetime import datetime, timedelta
+import hashlib
+import os
+import re
+
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+LLM_CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "2000"))
+
+# Rough characters-per-token ratio used to estimate tokens saved
+CHARS_PER_TOKEN = 4
+
+_memory = TTLCache(maxsize=LLM_CACHE_MAX_ENTRIES, ttl=LLM_CACHE_TTL_SECONDS)
+_stats = {"memory_hits": 0, "db_hits": 0, "misses": 0, "stores": 0, "tokens_saved": 0}
+
+
+def normalize_prompt(text: str) -> str:
+    """Case- and whitespace-insensitive form of a prompt"""
+    return re.sub(r'\s+', ' ', text.strip().lower())
+
+
+def cache_key(model: str, system_message: str, user_message: str) -> str:
+    normalized = "\x1f".join([model, normalize_prompt(system_message), normalize_prompt(user_message)])
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+
+def _estimate_tokens(*texts: str) -> int:
+    return sum(len(text) for text in texts) // CHARS_PER_TOKEN
+
+
+async def get_cached_response(model: str, system_message: str, user_message: str) -> Optional[str]:
+    """
+    Cached response for a prompt, checking memory then MongoDB
+    """
+    if not LLM_CACHE_ENABLED:
+        return None
+
+    key = cache_key(model, system_message, user_message)
+    response = _memory.get(key)
+    if response is not None:
+        _stats["memory_hits"] += 1
+    else:
+        db = get_database()
+        entry = None
+        if db is not None:
+            entry = await db.llm_response_cache.find_one(
+                {"key": key, "expires_at": {"$gt": datetime.utcnow()}},
+                {"response": 1}
+            )
+        if not entry:
+            _stats["misses"] += 1
+            return None
+        response = entry["response"]
+        _memory[key] = response
+        _stats["db_hits"] += 1
+
+    _stats["tokens_saved"] += _estimate_tokens(system_message, user_message, response)
+    return response
+
+
+async def store_response(model: str, system_message: str, user_message: str, response: str):
+    """
+    Remember a response in memory and MongoDB
+    """
+    if not LLM_CACHE_ENABLED or not response:
+        return
+
+    key = cache_key(model, system_message, user_message)
+    _memory[key] = response
+    _stats["stores"] += 1
+
+    db = get_database()
+    if db is None:
+        return
+    now = datetime.utcnow()
+    await db.llm_response_cache.update_one(
+        {"key": key},
+        {"$set": {
+            "key": key,
+            "model": model,
+            "response": response,
+            "created_at": now,
+            "expires_at": now + timedelta(seconds=LLM_CACHE_TTL_SECONDS)
+        }},
+        upsert=True
+    )
+
+
+async def clear_llm_cache():
+    _memory.clear()
+    db = get_database()
+    if db is not None:
+        await db.llm_response_cache.delete_many({})
+
+
+def get_llm_cache_stats() -> Dict[str, Any]:
+    hits = _stats["memory_hits"] + _stats["db_hits"]
+    lookups = hits + _stats["misses"]
+    return {
+        **_stats,
+        "hits": hits,
+        "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+        "memory_entries": len(_memory),
+        "ttl_seconds": LLM_CACHE_TTL_SECONDS,
+        "max_entries": LLM_CACHE_MAX_ENTRIES
+    }
@@ -0,0 +1,318 @@
+"""
+LLM Gateway
+Single entry point for every LLM call: pooled HTTP connections, a global
+in-flight budget, per-model concurrency limits, timeouts and retries with
+jittered backoff on rate limits and transient provider errors
+"""
+from typing import Dict, Any, Optional, AsyncIterator, Awaitable, Callable, List, TypeVar
+from emergentintegrations.llm.chat import LlmChat, UserMessage
+from llm_cache import get_cached_response, store_response
+from dotenv import load_dotenv
+import litellm
+import httpx
+import asyncio
+import json
+import os
+import random
+import re
+import uuid
+
+load_dotenv()
+
+EMERGENT_LLM_KEY = os.getenv("EMERGENT_LLM_KEY")
+
+DEFAULT_PROVIDER = "anthropic"
+DEFAULT_MODEL = "claude-3-7-sonnet-20250219"
+# Optional OpenAI-compatible proxy for direct litellm calls (None = provider default)
+LLM_API_BASE = os.getenv("LLM_API_BASE")
+# "emergent" sends completions through emergentintegrations, "litellm" calls litellm directly
+LLM_TRANSPORT = os.getenv("LLM_TRANSPORT", "emergent")
+
+LLM_MAX_IN_FLIGHT = int(os.getenv("LLM_MAX_IN_FLIGHT", "32"))
+LLM_MODEL_CONCURRENCY = int(os.getenv("LLM_MODEL_CONCURRENCY", "8"))
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "90"))
+# Longest a stream may go quiet between two chunks before it is abandoned
+LLM_STREAM_CHUNK_TIMEOUT_SECONDS = float(os.getenv("LLM_STREAM_CHUNK_TIMEOUT_SECONDS", "30"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_BACKOFF_BASE_SECONDS = float(os.getenv("LLM_BACKOFF_BASE_SECONDS", "0.5"))
+LLM_BACKOFF_MAX_SECONDS = float(os.getenv("LLM_BACKOFF_MAX_SECONDS", "8"))
+
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504, 529}
+
+# Transports that can stream token deltas; emergentintegrations only returns whole responses
+STREAMING_TRANSPORTS = {"litellm"}
+
+# Default number of independent LLM tasks a single request fans out at once
+LLM_FANOUT_CONCURRENCY = int(os.getenv("LLM_FANOUT_CONCURRENCY", "4"))
+
+T = TypeVar("T")
+
+_http_client: Optional[httpx.AsyncClient] = None
+_global_slots: Optional[asyncio.Semaphore] = None
+_model_slots: Dict[str, asyncio.Semaphore] = {}
+_stats = {"requests": 0, "retries": 0, "timeouts": 0, "errors": 0, "in_flight": 0}
+
+
+async def init_llm_gateway():
+    """
+    Create the pooled HTTP client shared by all litellm calls
+    """
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=LLM_MAX_IN_FLIGHT,
+                max_keepalive_connections=LLM_MAX_IN_FLIGHT
+            ),
+            timeout=LLM_TIMEOUT_SECONDS
+        )
+        litellm.aclient_session = _http_client
+
+
+async def close_llm_gateway():
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+        litellm.aclient_session = None
+
+
+def _slots_for(model: str):
+    global _global_slots
+    if _global_slots is None:
+        _global_slots = asyncio.Semaphore(LLM_MAX_IN_FLIGHT)
+    if model not in _model_slots:
+        _model_slots[model] = asyncio.Semaphore(LLM_MODEL_CONCURRENCY)
+    return _global_slots, _model_slots[model]
+
+
+def _is_retryable(error: Exception) -> bool:
+    if isinstance(error, (asyncio.TimeoutError, httpx.TimeoutException, httpx.TransportError)):
+        return True
+    status_code = getattr(error, "status_code", None)
+    if status_code in RETRYABLE_STATUS_CODES:
+        return True
+    message = str(error).lower()
+    return "rate limit" in message or "overloaded" in message
+
+
+def parse_json_response(response: str) -> Any:
+    """JSON payload of a response, with any ``` / ```json fence stripped"""
+    response_text = response.strip()
+    if response_text.startswith('```'):
+        response_text = re.sub(r'^```json\s*', '', response_text)
+        response_text = re.sub(r'```\s*$', '', response_text)
+    return json.loads(response_text)
+
+
+def _is_valid(response: str, validate: Optional[Callable[[str], Any]]) -> bool:
+    if validate is None:
+        return True
+    try:
+        return bool(validate(response))
+    except Exception:
+        return False
+
+
+def _backoff_delay(attempt: int) -> float:
+    """Full-jitter exponential backoff"""
+    return random.uniform(0, min(LLM_BACKOFF_MAX_SECONDS, LLM_BACKOFF_BASE_SECONDS * (2 ** attempt)))
+
+
+async def _send(provider: str, model: str, system_message: str, user_message: str, session_id: str) -> str:
+    if LLM_TRANSPORT == "litellm":
+        response = await litellm.acompletion(
+            model=f"{provider}/{model}",
+            messages=[
+                {"role": "system", "content": system_message},
+                {"role": "user", "content": user_message}
+            ],
+            api_key=EMERGENT_LLM_KEY,
+            api_base=LLM_API_BASE
+        )
+        return response.choices[0].message.content or ""
+
+    chat = LlmChat(
+        api_key=EMERGENT_LLM_KEY,
+        session_id=session_id,
+        system_message=system_message
+    ).with_model(provider, model)
+    return await chat.send_message(UserMessage(text=user_message))
+
+
+async def complete(
+    system_message: str,
+    user_message: str,
+    model: str = DEFAULT_MODEL,
+    provider: str = DEFAULT_PROVIDER,
+    session_id: Optional[str] = None,
+    timeout: Optional[float] = None,
+    use_cache: bool = False,
+    validate: Optional[Callable[[str], Any]] = None
+) -> str:
+    """
+    Send one system + user message pair and return the response text
+    Each attempt waits for a free slot; rate-limited or transient failures are
+    retried after a backoff spent outside the slots
+    use_cache serves identical prompts from llm_cache - only for prompts that are
+    not personalized and where a repeated answer is acceptable. With validate,
+    only responses it accepts (returns truthy without raising) are cached or
+    served from the cache, so a malformed answer is never repeated
+    """
+    if use_cache:
+        cached = await get_cached_response(model, system_message, user_message)
+        if cached is not None and _is_valid(cached, validate):
+            return cached
+        response = await complete(system_message, user_message, model, provider, session_id, timeout)
+        if _is_valid(response, validate):
+            await store_response(model, system_message, user_message, response)
+        return response
+
+    global_slots, model_slots = _slots_for(model)
+    session_id = session_id or str(uuid.uuid4())
+
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        async with global_slots, model_slots:
+            _stats["requests"] += 1
+            _stats["in_flight"] += 1
+            try:
+                return await asyncio.wait_for(
+                    _send(provider, model, system_message, user_message, session_id),
+                    timeout=timeout or LLM_TIMEOUT_SECONDS
+                )
+            except Exception as e:
+                if isinstance(e, asyncio.TimeoutError):
+                    _stats["timeouts"] += 1
+                if attempt >= LLM_MAX_RETRIES or not _is_retryable(e):
+                    _stats["errors"] += 1
+                    raise
+                _stats["retries"] += 1
+                delay = _backoff_delay(attempt)
+                print(f"LLM call to {model} failed ({e}), retrying in {delay:.1f}s")
+            finally:
+                _stats["in_flight"] -= 1
+        # Back off without holding a slot, so a throttled call doesn't starve the others
+        await asyncio.sleep(delay)
+
+
+def streaming_supported() -> bool:
+    """Whether the configured transport can stream token deltas"""
+    return LLM_TRANSPORT in STREAMING_TRANSPORTS
+
+
+async def stream(
+    system_message: str,
+    user_message: str,
+    model: str = DEFAULT_MODEL,
+    provider: str = DEFAULT_PROVIDER,
+    session_id: Optional[str] = None
+) -> AsyncIterator[str]:
+    """
+    Stream response text deltas
+    On a transport that can't stream (see streaming_supported) the whole response
+    arrives as a single complete() chunk; the same happens if streaming fails
+    before any output. Every chunk read is bounded by LLM_STREAM_CHUNK_TIMEOUT_SECONDS
+    """
+    if not streaming_supported():
+        yield await complete(system_message, user_message, model=model, provider=provider, session_id=session_id)
+        return
+
+    global_slots, model_slots = _slots_for(model)
+
+    received_output = False
+    try:
+        async with global_slots, model_slots:
+            _stats["requests"] += 1
+            _stats["in_flight"] += 1
+            try:
+                response = await asyncio.wait_for(
+                    litellm.acompletion(
+                        model=f"{provider}/{model}",
+                        messages=[
+                            {"role": "system", "content": system_message},
+                            {"role": "user", "content": user_message}
+                        ],
+                        api_key=EMERGENT_LLM_KEY,
+                        api_base=LLM_API_BASE,
+                        stream=True
+                    ),
+                    timeout=LLM_TIMEOUT_SECONDS
+                )
+                chunks = response.__aiter__()
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(chunks.__anext__(), timeout=LLM_STREAM_CHUNK_TIMEOUT_SECONDS)
+                    except StopAsyncIteration:
+                        break
+                    delta = chunk.choices[0].delta.content if chunk.choices else None
+                    if delta:
+                        received_output = True
+                        yield delta
+            except asyncio.TimeoutError:
+                _stats["timeouts"] += 1
+                raise
+            finally:
+                _stats["in_flight"] -= 1
+        return
+    except Exception as e:
+        if received_output:
+            _stats["errors"] += 1
+            raise
+        print(f"Streaming failed before any output, falling back to single response: {e}")
+
+    yield await complete(system_message, user_message, model=model, provider=provider, session_id=session_id)
+
+
+async def gather_bounded(
+    task_factories: List[Callable[[], Awaitable[T]]],
+    limit: int = LLM_FANOUT_CONCURRENCY,
+    deadline: Optional[float] = None
+) -> List[Optional[T]]:
+    """
+    Run independent LLM tasks concurrently, at most `limit` at a time
+    Returns results in input order. Tasks that fail, or are still running when
+    `deadline` seconds have passed, are cancelled and yield None
+    """
+    if not task_factories:
+        return []
+
+    semaphore = asyncio.Semaphore(limit)
+
+    async def run(factory):
+        async with semaphore:
+            return await factory()
+
+    tasks = [asyncio.create_task(run(factory)) for factory in task_factories]
+    try:
+        done, pending = await asyncio.wait(tasks, timeout=deadline)
+    except asyncio.CancelledError:
+        for task in tasks:
+            task.cancel()
+        raise
+
+    for task in pending:
+        task.cancel()
+    if pending:
+        await asyncio.gather(*pending, return_exceptions=True)
+        print(f"Deadline of {deadline}s reached, cancelled {len(pending)} of {len(tasks)} LLM tasks")
+
+    results = []
+    for task in tasks:
+        if task in done and not task.cancelled() and task.exception() is None:
+            results.append(task.result())
+        else:
+            if task in done and not task.cancelled():
+                print(f"LLM task failed: {task.exception()}")
+            results.append(None)
+    return results
+
+
+def get_llm_gateway_stats() -> Dict[str, Any]:
+    return {
+        **_stats,
+        "transport": LLM_TRANSPORT,
+        "streaming": streaming_supported(),
+        "max_in_flight": LLM_MAX_IN_FLIGHT,
+        "model_concurrency": LLM_MODEL_CONCURRENCY,
+        "timeout_seconds": LLM_TIMEOUT_SECONDS
+    }
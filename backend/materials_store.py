@@ -0,0 +1,126 @@
+"""
+Material Storage
+Materials are a lightweight metadata document in course_materials (title, type,
+preview, hash, counts) plus their text in material_chunks. Full content is only
+assembled on demand; read paths project the metadata and preview they need
+"""
+from typing import List, Dict, Any, Optional, Tuple
+from database import get_database
+from repositories import find_page
+from retrieval import append_material_chunks, delete_material_chunks
+import hashlib
+
+# Leading characters kept on the metadata document for prompts and list views
+PREVIEW_CHARS = 2000
+
+# Metadata plus a preview - for materials stored before chunking, the preview is
+# cut from the legacy content field server-side so the full text never crosses the wire
+MATERIAL_META_PROJECTION = {
+    "_id": 0,
+    "id": 1,
+    "course_id": 1,
+    "title": 1,
+    "material_type": 1,
+    "uploaded_at": 1,
+    "ingest_status": 1,
+    "content_hash": 1,
+    "char_count": 1,
+    "chunk_count": 1,
+    "preview": {"$ifNull": ["$preview", {"$substrCP": [{"$ifNull": ["$content", ""]}, 0, PREVIEW_CHARS]}]}
+}
+
+
+def material_text(material: Dict[str, Any]) -> str:
+    """Full content when it was loaded, otherwise the stored preview"""
+    return material.get("content") or material.get("preview", "")
+
+
+def content_fields(content: str, chunk_count: int) -> Dict[str, Any]:
+    """Metadata describing a material's content"""
+    return {
+        "preview": content[:PREVIEW_CHARS],
+        "char_count": len(content),
+        "chunk_count": chunk_count,
+        "content_hash": hashlib.sha256(content.encode('utf-8')).hexdigest()
+    }
+
+
+async def find_course_materials(course_id: str, limit: Optional[int] = 100) -> List[Dict[str, Any]]:
+    db = get_database()
+    return await db.course_materials.find(
+        {"course_id": course_id},
+        MATERIAL_META_PROJECTION
+    ).to_list(limit)
+
+
+async def find_course_materials_page(
+    course_id: str,
+    limit: Optional[int] = None,
+    page_token: Optional[str] = None
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """A course's materials in upload order, one page at a time"""
+    db = get_database()
+    return await find_page(
+        db.course_materials,
+        {"course_id": course_id},
+        MATERIAL_META_PROJECTION,
+        "uploaded_at",
+        limit=limit,
+        page_token=page_token
+    )
+
+
+async def store_material_content(material: Dict[str, Any], content: str) -> int:
+    """
+    Chunk a material's text into material_chunks and record its content metadata
+    The content itself is not kept on the material document
+    """
+    db = get_database()
+
+    await delete_material_chunks(material["id"])
+    chunk_count = await append_material_chunks(material, content)
+    await db.course_materials.update_one(
+        {"id": material["id"]},
+        {
+            "$set": {**content_fields(content, chunk_count), "ingest_status": "ready"},
+            "$unset": {"content": ""}
+        }
+    )
+    return chunk_count
+
+
+async def load_material_content(material: Dict[str, Any]) -> str:
+    """
+    Assemble a material's full text from its chunks (or the legacy content field)
+    """
+    db = get_database()
+
+    legacy = await db.course_materials.find_one(
+        {"id": material["id"], "content": {"$exists": True}},
+        {"content": 1}
+    )
+    if legacy:
+        return legacy["content"]
+
+    chunks = await db.material_chunks.find(
+        {"material_id": material["id"]},
+        {"_id": 0, "text": 1, "separator": 1, "trailing": 1}
+    ).sort("ordinal", 1).to_list(None)
+    # Chunks stored before separators were recorded are joined with a paragraph break
+    return "".join(
+        chunk.get("separator", "\n\n" if position else "") + chunk["text"] + chunk.get("trailing", "")
+        for position, chunk in enumerate(chunks)
+    )
+
+
+async def migrate_material(material_id: str) -> int:
+    """
+    Move a legacy material's content into chunks (no-op if already migrated)
+    """
+    db = get_database()
+
+    material = await db.course_materials.find_one({"id": material_id, "content": {"$exists": True}})
+    if not material:
+        return 0
+    return await store_material_content(material, material["content"])
+
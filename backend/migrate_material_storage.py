@@ -0,0 +1,31 @@
+"""
+Move legacy materials to the chunked storage model: their content is split into
+material_chunks and replaced on the material document by a preview and metadata
+
+Usage:
+    python migrate_material_storage.py              # every course
+    python migrate_material_storage.py <course_id>  # one course
+"""
+import asyncio
+import sys
+from database import connect_db, close_db, get_database
+from materials_store import migrate_material
+
+async def migrate_materials(course_ids=None):
+    await connect_db()
+    db = get_database()
+    
+    query = {"content": {"$exists": True}}
+    if course_ids:
+        query["course_id"] = {"$in": course_ids}
+    material_ids = [material["id"] async for material in db.course_materials.find(query, {"id": 1})]
+    print(f"Migrating {len(material_ids)} materials to chunked storage")
+    
+    for material_id in material_ids:
+        chunk_count = await migrate_material(material_id)
+        print(f"✓ {material_id}: {chunk_count} chunks")
+    
+    await close_db()
+
+if __name__ == "__main__":
+    asyncio.run(migrate_materials(sys.argv[1:]))
@@ -58,9 +58,10 @@ class CourseMaterial(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     course_id: str
     title: str
-    content: str
+    content: str = ""
     material_type: str  # syllabus, lecture, assignment, notes
     uploaded_at: datetime = Field(default_factory=datetime.utcnow)
+    ingest_status: str = "ready"  # processing, ready, failed
 
 class ChatMessage(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -76,7 +77,6 @@ class ChatRequest(BaseModel):
     course_id: str
     message: str
     session_id: Optional[str] = None
-    student_id: Optional[str] = None
 
 class ChatResponse(BaseModel):
     session_id: str
@@ -105,6 +105,7 @@ class AnalyticsData(BaseModel):
     engagement_trend: List[Dict[str, Any]]
 
 class QuizQuestion(BaseModel):
+    id: Optional[str] = None  # Question bank id
     question: str
     options: List[str]
     correct_answer: int  # Index of correct option (0-3)
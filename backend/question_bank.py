@@ -0,0 +1,237 @@
+"""
+Quiz Question Bank
+Pre-generated quiz questions per (course, concept) so quiz requests are served
+from the database and the LLM is only used to top the bank up
+"""
+from typing import List, Dict, Any, Optional, Set
+from database import get_database
+from pymongo.errors import BulkWriteError
+from ai_engine import generate_quiz
+from job_queue import enqueue_job
+from materials_store import find_course_materials
+from retrieval import retrieve_chunks, tokenize
+from datetime import datetime
+import hashlib
+import os
+import re
+import uuid
+
+# Questions to keep banked per (course, concept) and to generate per LLM call
+BANK_TARGET_SIZE = int(os.getenv("QUESTION_BANK_TARGET_SIZE", "30"))
+BANK_BATCH_SIZE = int(os.getenv("QUESTION_BANK_BATCH_SIZE", "10"))
+QUESTION_BANK_REFILL_JOB = "question_bank_refill"
+
+# Token-set Jaccard similarity above which two questions count as duplicates
+DUPLICATE_SIMILARITY = 0.8
+
+GENERAL_CONCEPT = "general"
+
+DUPLICATE_KEY_ERROR = 11000
+
+
+def bank_concept_key(topic: Optional[str]) -> str:
+    """Normalised concept key used to bucket banked questions"""
+    if not topic or not topic.strip():
+        return GENERAL_CONCEPT
+    return re.sub(r'\s+', ' ', topic.strip().lower())
+
+
+def _question_fingerprint(question_text: str) -> str:
+    normalized = re.sub(r'[^a-z0-9 ]', '', re.sub(r'\s+', ' ', question_text.lower())).strip()
+    return hashlib.sha1(normalized.encode('utf-8')).hexdigest()
+
+
+def _is_near_duplicate(terms: Set[str], existing_terms: List[Set[str]]) -> bool:
+    for other in existing_terms:
+        union = terms | other
+        if union and len(terms & other) / len(union) >= DUPLICATE_SIMILARITY:
+            return True
+    return False
+
+
+async def add_questions(course_id: str, concept: str, questions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Add generated questions to the bank, skipping exact and near duplicates
+    Returns the questions that were stored
+    """
+    db = get_database()
+
+    existing = await db.quiz_question_bank.find(
+        {"course_id": course_id, "concept": concept},
+        {"question": 1, "fingerprint": 1}
+    ).to_list(None)
+    fingerprints = {q["fingerprint"] for q in existing}
+    existing_terms = [set(tokenize(q["question"])) for q in existing]
+
+    stored = []
+    for question in questions:
+        if not question.get("question") or len(question.get("options", [])) < 2:
+            continue
+        fingerprint = _question_fingerprint(question["question"])
+        terms = set(tokenize(question["question"]))
+        if fingerprint in fingerprints or _is_near_duplicate(terms, existing_terms):
+            continue
+
+        fingerprints.add(fingerprint)
+        existing_terms.append(terms)
+        stored.append({
+            "id": str(uuid.uuid4()),
+            "course_id": course_id,
+            "concept": concept,
+            "question": question["question"],
+            "options": question["options"],
+            "correct_answer": question.get("correct_answer", 0),
+            "explanation": question.get("explanation", ""),
+            "topic": question.get("topic") or concept.title(),
+            "fingerprint": fingerprint,
+            "created_at": datetime.utcnow().isoformat()
+        })
+
+    if stored:
+        # A concurrent refill may bank the same question first - the unique
+        # (course_id, concept, fingerprint) index rejects it and the rest still go in
+        try:
+            await db.quiz_question_bank.insert_many(stored, ordered=False)
+        except BulkWriteError as e:
+            write_errors = e.details.get("writeErrors", [])
+            if any(error.get("code") != DUPLICATE_KEY_ERROR for error in write_errors):
+                raise
+            rejected = {error["index"] for error in write_errors}
+            stored = [question for position, question in enumerate(stored) if position not in rejected]
+        for question in stored:
+            question.pop('_id', None)
+    return stored
+
+
+async def sample_questions(course_id: str, concept: str, count: int, exclude_ids: Set[str]) -> List[Dict[str, Any]]:
+    """
+    Random sample of banked questions the student hasn't seen yet
+    """
+    db = get_database()
+
+    return await db.quiz_question_bank.aggregate([
+        {"$match": {"course_id": course_id, "concept": concept, "id": {"$nin": list(exclude_ids)}}},
+        {"$sample": {"size": count}},
+        {"$project": {"_id": 0, "fingerprint": 0}}
+    ]).to_list(count)
+
+
+async def get_seen_question_ids(student_id: str, course_id: str) -> Set[str]:
+    """
+    Banked question ids already answered by the student in this course
+    """
+    db = get_database()
+
+    seen = await db.quiz_attempts.distinct(
+        "question_ids",
+        {"student_id": student_id, "course_id": course_id}
+    )
+    return set(seen)
+
+
+async def count_banked(course_id: str, concept: str) -> int:
+    db = get_database()
+    return await db.quiz_question_bank.count_documents({"course_id": course_id, "concept": concept})
+
+
+async def generate_questions(
+    course: Dict[str, Any],
+    materials: List[Dict[str, Any]],
+    topic: Optional[str],
+    num_questions: int
+) -> List[Dict[str, Any]]:
+    """
+    Generate fresh questions with the LLM from topic-relevant material chunks
+    """
+    from intent_detector import filter_materials_by_topic
+
+    # Filter materials by topic if specified
+    if topic:
+        print(f"Filtering materials for topic: {topic}")
+        materials = await filter_materials_by_topic(materials, topic)
+        print(f"Filtered to {len(materials)} relevant materials")
+
+    # Pull only the chunks relevant to the topic (or the course as a whole)
+    retrieval_query = topic or " ".join(
+        [course.get('title', ''), course.get('description', '')] + (course.get('objectives') or [])
+    )
+    context_chunks = await retrieve_chunks(
+        course["id"],
+        retrieval_query,
+        k=8,
+        material_ids=[m["id"] for m in materials]
+    )
+
+    print(f"Generating quiz for course: {course.get('title')}, topic: {topic}")
+    questions = await generate_quiz(
+        course=course,
+        materials=materials,
+        topic=topic,
+        num_questions=num_questions,
+        context_chunks=context_chunks or None
+    )
+    print(f"Generated {len(questions) if questions else 0} questions")
+    return questions or []
+
+
+async def refill_question_bank(course_id: str, topic: Optional[str] = None) -> int:
+    """
+    Top up the bank for a (course, concept) pair until it reaches BANK_TARGET_SIZE
+    """
+    db = get_database()
+    concept = bank_concept_key(topic)
+
+    banked = await count_banked(course_id, concept)
+    if banked >= BANK_TARGET_SIZE:
+        return 0
+
+    course = await db.courses.find_one({"id": course_id})
+    materials = await find_course_materials(course_id)
+    if not course or not materials:
+        return 0
+
+    questions = await generate_questions(
+        course,
+        materials,
+        topic if concept != GENERAL_CONCEPT else None,
+        min(BANK_BATCH_SIZE, BANK_TARGET_SIZE - banked)
+    )
+    stored = await add_questions(course_id, concept, questions)
+    print(f"Question bank {course_id}/{concept}: added {len(stored)} of {len(questions)} generated")
+    return len(stored)
+
+
+async def run_question_bank_refill(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Job handler: top up one (course, concept) bank
+    """
+    added = await refill_question_bank(payload["course_id"], payload.get("topic"))
+    return {"added": added}
+
+
+async def schedule_refill(course_id: str, topics: List[Optional[str]]):
+    """
+    Queue a background refill per topic - collapsed with any refill of the same
+    (course, concept) bank already pending in any worker
+    """
+    for topic in topics:
+        await enqueue_job(
+            QUESTION_BANK_REFILL_JOB,
+            {"course_id": course_id, "topic": topic},
+            dedupe_key=f"{QUESTION_BANK_REFILL_JOB}:{course_id}:{bank_concept_key(topic)}"
+        )
+
+
+async def refill_course_question_bank(course_id: str):
+    """
+    Background fill for a course: the general bank plus one bank per indexed concept
+    """
+    from concept_index import rebuild_course_concept_index
+
+    index_doc = await rebuild_course_concept_index(course_id)
+    await schedule_refill(course_id, [None] + index_doc.get("concepts", []))
+
+
+async def delete_course_question_bank(course_id: str):
+    db = get_database()
+    await db.quiz_question_bank.delete_many({"course_id": course_id})
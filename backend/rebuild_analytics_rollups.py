@@ -0,0 +1,31 @@
+"""
+Rebuild course analytics rollups from chat_messages and quiz_attempts
+
+Usage:
+    python rebuild_analytics_rollups.py              # every course
+    python rebuild_analytics_rollups.py <course_id>  # one course
+"""
+import asyncio
+import sys
+from database import connect_db, close_db, get_database
+from analytics_rollups import rebuild_course_rollup
+
+async def rebuild_rollups(course_ids=None):
+    await connect_db()
+    db = get_database()
+    
+    if not course_ids:
+        course_ids = [course["id"] async for course in db.courses.find({}, {"id": 1})]
+    print(f"Rebuilding analytics rollups for {len(course_ids)} courses")
+    
+    for course_id in course_ids:
+        rollup = await rebuild_course_rollup(course_id)
+        if rollup is None:
+            print(f"- {course_id}: skipped, another rebuild is in progress")
+            continue
+        print(f"✓ {course_id}: {rollup.get('total_questions', 0)} questions, {rollup.get('total_quizzes', 0)} quizzes")
+    
+    await close_db()
+
+if __name__ == "__main__":
+    asyncio.run(rebuild_rollups(sys.argv[1:]))
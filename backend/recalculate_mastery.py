@@ -3,6 +3,7 @@ Recalculate all concept mastery scores with the new logic
 """
 import asyncio
 from database import get_database
+from concept_tracker import compute_mastery_score
 from motor.motor_asyncio import AsyncIOMotorClient
 from dotenv import load_dotenv
 import os
@@ -24,36 +25,12 @@ async def recalculate_all_mastery():
     
     updated_count = 0
     for record in records:
-        total_questions = record.get("total_questions", 0)
-        correct_answers = record.get("correct_answers", 0)
-        interactions = record.get("interactions", 0)
-        
-        # Recalculate mastery score using new logic
-        if total_questions > 0:
-            # Quiz accuracy percentage
-            quiz_accuracy = (correct_answers / total_questions) * 100
-            
-            # Confidence factor based on number of questions
-            if total_questions <= 2:
-                confidence_factor = 0.4
-            elif total_questions <= 4:
-                confidence_factor = 0.6
-            elif total_questions <= 6:
-                confidence_factor = 0.8
-            else:
-                confidence_factor = 1.0
-            
-            # Apply confidence factor
-            adjusted_quiz_score = quiz_accuracy * confidence_factor
-            
-            # Interaction bonus (max 15%)
-            interaction_bonus = min(15, interactions * 1.5)
-            
-            # Final score
-            new_mastery_score = min(100, adjusted_quiz_score + interaction_bonus)
-        else:
-            # No quiz data, score based on interactions only (max 30%)
-            new_mastery_score = min(30, interactions * 3)
+        # Recalculate mastery score using the shared formula
+        new_mastery_score = compute_mastery_score(
+            record.get("correct_answers", 0),
+            record.get("total_questions", 0),
+            record.get("interactions", 0)
+        )
         
         # Update the record
         await db.concept_mastery.update_one(
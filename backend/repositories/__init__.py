@@ -0,0 +1,110 @@
+"""
+Repository Layer
+Thin per-collection query modules with explicit projections. Lists are read
+page by page with keyset pagination - an opaque page token records the sort
+key and id of the last document returned - instead of to_list(N) caps
+"""
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from datetime import datetime
+import base64
+import json
+import os
+
+DEFAULT_PAGE_SIZE = int(os.getenv("REPOSITORY_PAGE_SIZE", "100"))
+MAX_PAGE_SIZE = int(os.getenv("REPOSITORY_MAX_PAGE_SIZE", "500"))
+
+
+class InvalidPageToken(ValueError):
+    pass
+
+
+def page_size(limit: Optional[int]) -> int:
+    """Clamp a requested page size to [1, MAX_PAGE_SIZE]"""
+    if not limit:
+        return DEFAULT_PAGE_SIZE
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def encode_page_token(sort_value: Any, doc_id: Any) -> str:
+    if isinstance(sort_value, datetime):
+        key = {"dt": sort_value.isoformat()}
+    else:
+        key = {"v": sort_value}
+    raw = json.dumps({**key, "id": doc_id}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_page_token(token: str) -> Tuple[Any, Any]:
+    """Returns (sort_value, id) recorded by encode_page_token"""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        key = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        sort_value = datetime.fromisoformat(key["dt"]) if "dt" in key else key["v"]
+        return sort_value, key["id"]
+    except (ValueError, KeyError, TypeError) as e:
+        raise InvalidPageToken(f"Invalid page token: {e}")
+
+
+def keyset_filter(query: Dict[str, Any], sort_field: str, direction: int, page_token: Optional[str],
+                  id_field: str = "id") -> Dict[str, Any]:
+    """Narrow a query to the documents after the page token in (sort_field, id) order"""
+    if not page_token:
+        return query
+
+    sort_value, doc_id = decode_page_token(page_token)
+    op = "$gt" if direction > 0 else "$lt"
+    after = {"$or": [
+        {sort_field: {op: sort_value}},
+        {sort_field: sort_value, id_field: {op: doc_id}}
+    ]}
+    return {"$and": [query, after]} if query else after
+
+
+def _with_keys(projection: Dict[str, Any], sort_field: str) -> Dict[str, Any]:
+    """Make sure an inclusion projection returns the fields the next page token needs"""
+    if any(value for field, value in projection.items() if field != "_id"):
+        return {**projection, sort_field: 1, "id": 1}
+    return projection
+
+
+async def find_page(
+    collection,
+    query: Dict[str, Any],
+    projection: Dict[str, Any],
+    sort_field: str,
+    direction: int = 1,
+    limit: Optional[int] = None,
+    page_token: Optional[str] = None
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    One page of a keyset-paginated find
+    Returns (documents, next_page_token) - the token is None on the last page
+    """
+    size = page_size(limit)
+    cursor = collection.find(
+        keyset_filter(query, sort_field, direction, page_token),
+        _with_keys(projection, sort_field)
+    ).sort([(sort_field, direction), ("id", direction)]).limit(size + 1)
+
+    documents = [doc async for doc in cursor]
+    if len(documents) <= size:
+        return documents, None
+
+    documents = documents[:size]
+    last = documents[-1]
+    return documents, encode_page_token(last.get(sort_field), last["id"])
+
+
+async def iterate(
+    collection,
+    query: Dict[str, Any],
+    projection: Dict[str, Any],
+    sort: Optional[List[Tuple[str, int]]] = None,
+    batch_size: Optional[int] = None
+) -> AsyncIterator[Dict[str, Any]]:
+    """Stream every matching document without materializing the result set"""
+    cursor = collection.find(query, projection).batch_size(page_size(batch_size))
+    if sort:
+        cursor = cursor.sort(sort)
+    async for doc in cursor:
+        yield doc
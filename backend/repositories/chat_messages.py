@@ -0,0 +1,148 @@
+"""
+Chat Messages Repository
+"""
+from typing import Any, Dict, List, Optional, Tuple
+from database import get_database
+from datetime import datetime
+from repositories import (
+    decode_page_token, encode_page_token, find_page, keyset_filter, page_size
+)
+
+CHAT_MESSAGE_PROJECTION = {
+    "_id": 0,
+    "id": 1,
+    "session_id": 1,
+    "student_id": 1,
+    "course_id": 1,
+    "role": 1,
+    "content": 1,
+    "timestamp": 1,
+    "understanding_level": 1
+}
+
+# Only what the prompt needs from earlier turns
+CHAT_CONTEXT_PROJECTION = {"_id": 0, "id": 1, "role": 1, "content": 1, "timestamp": 1}
+
+
+async def find_course_history(
+    student_id: str,
+    course_id: str,
+    limit: Optional[int] = None,
+    page_token: Optional[str] = None
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """A student's messages in a course, oldest first, one page at a time"""
+    db = get_database()
+    return await find_page(
+        db.chat_messages,
+        {"student_id": student_id, "course_id": course_id},
+        CHAT_MESSAGE_PROJECTION,
+        "timestamp",
+        limit=limit,
+        page_token=page_token
+    )
+
+
+async def find_history_range(
+    student_id: str,
+    course_id: str,
+    before: Optional[datetime] = None,
+    after: Optional[datetime] = None,
+    limit: Optional[int] = None,
+    before_token: Optional[str] = None,
+    after_token: Optional[str] = None
+) -> Tuple[List[Dict[str, Any]], bool]:
+    """
+    A student's course messages between two bounds (both exclusive), oldest first
+    Bounds are timestamps or history tokens - the (timestamp, id) of a message,
+    see history_token - which also order messages that share a timestamp
+    With a `before` bound the page is the newest messages before it, otherwise the oldest after `after`
+    Returns (messages, has_more)
+    """
+    db = get_database()
+    size = page_size(limit)
+
+    query = {"student_id": student_id, "course_id": course_id}
+    window = {}
+    if before:
+        window["$lt"] = before
+    if after:
+        window["$gt"] = after
+    if window:
+        query["timestamp"] = window
+    query = keyset_filter(query, "timestamp", 1, after_token)
+    query = keyset_filter(query, "timestamp", -1, before_token)
+
+    direction = -1 if before or before_token else 1
+    cursor = db.chat_messages.find(query, CHAT_MESSAGE_PROJECTION).sort(
+        [("timestamp", direction), ("id", direction)]
+    ).limit(size + 1)
+    messages = [message async for message in cursor]
+
+    has_more = len(messages) > size
+    messages = messages[:size]
+    if direction < 0:
+        messages.reverse()
+    return messages, has_more
+
+
+def history_token(message: Dict[str, Any]) -> str:
+    """Bound for find_history_range that sits exactly at a message"""
+    return encode_page_token(message["timestamp"], message["id"])
+
+
+async def find_recent_session_messages(session_id: str, student_id: str, limit: int) -> List[Dict[str, Any]]:
+    """The last `limit` messages of a session, in chronological order"""
+    db = get_database()
+    cursor = db.chat_messages.find(
+        {"session_id": session_id, "student_id": student_id},
+        CHAT_CONTEXT_PROJECTION
+    ).sort([("timestamp", -1), ("id", -1)]).limit(limit)
+    messages = [message async for message in cursor]
+    messages.reverse()
+    return messages
+
+
+async def list_sessions(
+    student_id: str,
+    course_id: str,
+    limit: Optional[int] = None,
+    page_token: Optional[str] = None
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    A student's chat sessions in a course, most recently active first
+    Returns ([{session_id, last_message, message_count}], next_page_token)
+    """
+    db = get_database()
+    size = page_size(limit)
+
+    pipeline = [
+        {"$match": {"student_id": student_id, "course_id": course_id}},
+        {"$project": {"_id": 0, "session_id": 1, "timestamp": 1}},
+        {"$group": {
+            "_id": "$session_id",
+            "last_message": {"$max": "$timestamp"},
+            "message_count": {"$sum": 1}
+        }}
+    ]
+    if page_token:
+        last_message, session_id = decode_page_token(page_token)
+        pipeline.append({"$match": {"$or": [
+            {"last_message": {"$lt": last_message}},
+            {"last_message": last_message, "_id": {"$lt": session_id}}
+        ]}})
+    pipeline += [
+        {"$sort": {"last_message": -1, "_id": -1}},
+        {"$limit": size + 1}
+    ]
+
+    rows = [row async for row in db.chat_messages.aggregate(pipeline)]
+    next_token = None
+    if len(rows) > size:
+        rows = rows[:size]
+        next_token = encode_page_token(rows[-1]["last_message"], rows[-1]["_id"])
+
+    sessions = [
+        {"session_id": row["_id"], "last_message": row["last_message"], "message_count": row["message_count"]}
+        for row in rows
+    ]
+    return sessions, next_token
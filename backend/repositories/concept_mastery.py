@@ -0,0 +1,43 @@
+"""
+Concept Mastery Repository
+"""
+from typing import Any, AsyncIterator, Dict, List, Optional
+from database import get_database
+from repositories import iterate
+
+MASTERY_PROJECTION = {
+    "_id": 0,
+    "student_id": 1,
+    "course_id": 1,
+    "concept": 1,
+    "mastery_score": 1,
+    "correct_answers": 1,
+    "total_questions": 1,
+    "interactions": 1,
+    "last_interaction": 1
+}
+
+
+def iter_course_mastery(
+    course_id: str,
+    projection: Optional[Dict[str, Any]] = None
+) -> AsyncIterator[Dict[str, Any]]:
+    """Every mastery record in a course, streamed"""
+    db = get_database()
+    return iterate(db.concept_mastery, {"course_id": course_id}, projection or MASTERY_PROJECTION)
+
+
+async def find_weakest_concepts(
+    course_id: str,
+    student_id: str,
+    below: float,
+    limit: int,
+    projection: Optional[Dict[str, Any]] = None
+) -> List[Dict[str, Any]]:
+    """A student's lowest-mastery concepts under a threshold, weakest first"""
+    db = get_database()
+    cursor = db.concept_mastery.find(
+        {"course_id": course_id, "student_id": student_id, "mastery_score": {"$lt": below}},
+        projection or MASTERY_PROJECTION
+    ).sort("mastery_score", 1).limit(limit)
+    return [record async for record in cursor]
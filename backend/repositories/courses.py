@@ -0,0 +1,96 @@
+"""
+Courses and Enrollments Repository
+"""
+from typing import Any, Dict, List, Optional, Tuple
+from cachetools import TTLCache
+from database import get_database
+from invalidations import InvalidationFeed, publish_invalidation
+from repositories import find_page, iterate
+import copy
+import os
+
+# Course documents read on every chat turn and quiz are cached per worker;
+# changes reach the other workers through the invalidation log
+COURSE_CACHE_TTL_SECONDS = int(os.getenv("COURSE_CACHE_TTL_SECONDS", "60"))
+COURSE_CACHE_MAX_ENTRIES = int(os.getenv("COURSE_CACHE_MAX_ENTRIES", "1000"))
+
+COURSE_PROJECTION = {
+    "_id": 0,
+    "id": 1,
+    "title": 1,
+    "description": 1,
+    "objectives": 1,
+    "professor_id": 1,
+    "professor_name": 1,
+    "created_at": 1,
+    "student_count": 1
+}
+
+
+_course_cache = TTLCache(maxsize=COURSE_CACHE_MAX_ENTRIES, ttl=COURSE_CACHE_TTL_SECONDS)
+_course_invalidations = InvalidationFeed("course_id")
+
+
+def cache_course(course: Dict[str, Any]):
+    _course_cache[course["id"]] = course
+
+
+async def invalidate_course(course_id: str):
+    """Drop a changed course from every worker's cache"""
+    _course_cache.pop(course_id, None)
+    await publish_invalidation({"course_id": course_id})
+
+
+async def get_course(course_id: str) -> Optional[Dict[str, Any]]:
+    """A course document, served from the per-worker cache when fresh"""
+    for invalidation in await _course_invalidations.poll():
+        _course_cache.pop(invalidation["course_id"], None)
+    course = _course_cache.get(course_id)
+    if course is None:
+        db = get_database()
+        course = await db.courses.find_one({"id": course_id}, COURSE_PROJECTION)
+        if course is None:
+            return None
+        cache_course(course)
+    return copy.deepcopy(course)
+
+
+async def find_courses(
+    query: Optional[Dict[str, Any]] = None,
+    limit: Optional[int] = None,
+    page_token: Optional[str] = None
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Courses matching a query, oldest first, one page at a time"""
+    db = get_database()
+    return await find_page(
+        db.courses,
+        query or {},
+        COURSE_PROJECTION,
+        "created_at",
+        limit=limit,
+        page_token=page_token
+    )
+
+
+async def find_professor_courses(
+    professor_id: str,
+    limit: Optional[int] = None,
+    page_token: Optional[str] = None
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    return await find_courses({"professor_id": professor_id}, limit, page_token)
+
+
+async def find_student_courses(
+    student_id: str,
+    limit: Optional[int] = None,
+    page_token: Optional[str] = None
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Courses a student is enrolled in"""
+    db = get_database()
+    course_ids = [
+        enrollment["course_id"]
+        async for enrollment in iterate(db.enrollments, {"student_id": student_id}, {"_id": 0, "course_id": 1})
+    ]
+    if not course_ids:
+        return [], None
+    return await find_courses({"id": {"$in": course_ids}}, limit, page_token)
@@ -0,0 +1,38 @@
+"""
+Waitlist Repository
+"""
+from typing import Any, Dict, List, Optional, Tuple
+from database import get_database
+from repositories import find_page
+
+WAITLIST_PROJECTION = {
+    "_id": 0,
+    "id": 1,
+    "email": 1,
+    "name": 1,
+    "picture": 1,
+    "institution": 1,
+    "invitation_code": 1,
+    "status": 1,
+    "created_at": 1,
+    "updated_at": 1,
+    "approved_by": 1,
+    "approved_at": 1
+}
+
+
+async def find_waitlist(
+    limit: Optional[int] = None,
+    page_token: Optional[str] = None
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Waitlist entries, newest first, one page at a time"""
+    db = get_database()
+    return await find_page(
+        db.waitlist,
+        {},
+        WAITLIST_PROJECTION,
+        "created_at",
+        direction=-1,
+        limit=limit,
+        page_token=page_token
+    )
@@ -0,0 +1,409 @@
+"""
+Course Material Retrieval Index
+Splits materials into paragraph chunks and ranks them with BM25 so prompts
+only carry the chunks relevant to the current question or quiz topic
+"""
+from typing import List, Dict, Any, Optional
+from database import get_database
+from pymongo.errors import DuplicateKeyError
+from collections import Counter
+from datetime import datetime, timedelta
+import math
+import os
+import re
+import uuid
+import zlib
+
+try:
+    import numpy as np
+except ImportError:  # Dense mode is optional
+    np = None
+
+# "bm25" (default) or "dense" (hashed term vectors + cosine similarity, needs NumPy)
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "bm25")
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "6"))
+
+CHUNK_TARGET_CHARS = 1200
+CHUNK_MAX_CHARS = 2000
+DENSE_DIMENSIONS = 256
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# A lazy index build claimed longer ago than this is assumed to have died and is taken over
+INDEX_BUILD_STALE_SECONDS = int(os.getenv("RETRIEVAL_INDEX_BUILD_STALE_SECONDS", "600"))
+
+STOPWORDS = {
+    'the', 'and', 'for', 'with', 'that', 'this', 'are', 'was', 'were', 'from', 'into',
+    'what', 'how', 'why', 'when', 'where', 'which', 'who', 'does', 'can', 'could',
+    'would', 'should', 'will', 'about', 'there', 'their', 'they', 'them', 'then',
+    'than', 'these', 'those', 'have', 'has', 'had', 'not', 'but', 'you', 'your',
+    'its', 'our', 'also', 'such', 'each', 'other', 'some', 'any', 'all', 'more',
+    'most', 'may', 'might', 'must', 'been', 'being', 'over', 'under', 'between',
+    'explain', 'please', 'tell', 'give', 'me', 'is', 'of', 'to', 'in', 'on', 'an',
+    'be', 'as', 'by', 'it', 'or', 'at', 'if', 'so', 'do', 'we', 'my', 'i'
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens without stopwords"""
+    return [
+        token for token in re.findall(r'\b\w{2,}\b', text.lower())
+        if token not in STOPWORDS and not token.isdigit()
+    ]
+
+
+def chunk_text(text: str) -> List[Dict[str, Any]]:
+    """
+    Split text into paragraph-based chunks with character offsets
+    Small paragraphs are merged up to CHUNK_TARGET_CHARS, long ones are split
+    Chunk text is stripped; the whitespace it lost is kept as each chunk's
+    "separator" (before it) and the last chunk's "trailing", so joining
+    separator + text (+ trailing) over the chunks gives back the exact input
+    """
+    chunks = []
+    current_start = None
+    current_end = None
+    last_text_end = 0
+
+    def flush():
+        nonlocal last_text_end
+        segment = text[current_start:current_end] if current_start is not None else ""
+        if segment.strip():
+            text_start = current_start + len(segment) - len(segment.lstrip())
+            text_end = current_end - (len(segment) - len(segment.rstrip()))
+            chunks.append({
+                "ordinal": len(chunks),
+                "start_offset": current_start,
+                "end_offset": current_end,
+                "text": text[text_start:text_end],
+                "separator": text[last_text_end:text_start]
+            })
+            last_text_end = text_end
+
+    for match in re.finditer(r'\S(?:.*?)(?=\n\s*\n|\Z)', text, re.DOTALL):
+        start, end = match.start(), match.end()
+
+        # Split oversized paragraphs on sentence boundaries (or hard cut)
+        pieces = []
+        while end - start > CHUNK_MAX_CHARS:
+            window = text[start:start + CHUNK_MAX_CHARS]
+            cut = max(window.rfind('. '), window.rfind('\n'))
+            cut = cut + 1 if cut > CHUNK_TARGET_CHARS // 2 else CHUNK_MAX_CHARS
+            pieces.append((start, start + cut))
+            start += cut
+        pieces.append((start, end))
+
+        for piece_start, piece_end in pieces:
+            if current_start is None:
+                current_start, current_end = piece_start, piece_end
+            elif piece_end - current_start <= CHUNK_TARGET_CHARS:
+                current_end = piece_end
+            else:
+                flush()
+                current_start, current_end = piece_start, piece_end
+
+    flush()
+    if chunks:
+        chunks[-1]["trailing"] = text[last_text_end:]
+    return chunks
+
+
+def _dense_vector(terms: Dict[str, int]) -> List[float]:
+    """Signed feature-hashing vector of log term frequencies, L2 normalised"""
+    vector = np.zeros(DENSE_DIMENSIONS, dtype=np.float32)
+    for term, count in terms.items():
+        bucket = zlib.crc32(term.encode('utf-8'))
+        sign = 1.0 if bucket & 0x80000000 else -1.0
+        vector[bucket % DENSE_DIMENSIONS] += sign * (1.0 + math.log(count))
+    norm = np.linalg.norm(vector)
+    if norm > 0:
+        vector /= norm
+    return vector.tolist()
+
+
+def _dense_enabled() -> bool:
+    return RETRIEVAL_MODE == "dense" and np is not None
+
+
+async def index_material(material: Dict[str, Any]) -> int:
+    """
+    (Re)build the chunk index for one material and update course term statistics
+    """
+    await delete_material_chunks(material["id"])
+    return await append_material_chunks(material, material.get("content", ""))
+
+
+async def append_material_chunks(
+    material: Dict[str, Any],
+    text: str,
+    ordinal_base: int = 0,
+    offset_base: int = 0
+) -> int:
+    """
+    Chunk and index a piece of a material's text (e.g. a batch of PDF pages)
+    ordinal_base / offset_base position the piece within the whole material
+    """
+    db = get_database()
+
+    chunk_docs = []
+    for chunk in chunk_text(text):
+        terms = Counter(tokenize(chunk["text"]))
+        chunk_doc = {
+            "id": str(uuid.uuid4()),
+            "course_id": material["course_id"],
+            "material_id": material["id"],
+            "material_title": material.get("title", "Untitled"),
+            "material_type": material.get("material_type", "material"),
+            **chunk,
+            "ordinal": ordinal_base + chunk["ordinal"],
+            "start_offset": offset_base + chunk["start_offset"],
+            "end_offset": offset_base + chunk["end_offset"],
+            "terms": dict(terms),
+            "length": sum(terms.values()),
+            "token_count": len(re.findall(r'\w+', chunk["text"]))
+        }
+        if _dense_enabled():
+            chunk_doc["vector"] = _dense_vector(terms)
+        chunk_docs.append(chunk_doc)
+
+    if chunk_docs:
+        await db.material_chunks.insert_many(chunk_docs)
+    await _update_course_stats(material["course_id"], chunk_docs, direction=1)
+
+    return len(chunk_docs)
+
+
+async def delete_material_chunks(material_id: str):
+    """
+    Remove a material's chunks and their contribution to the course term statistics
+    """
+    db = get_database()
+
+    chunk_docs = await db.material_chunks.find(
+        {"material_id": material_id},
+        {"course_id": 1, "terms": 1, "length": 1}
+    ).to_list(None)
+    if not chunk_docs:
+        return
+
+    await db.material_chunks.delete_many({"material_id": material_id})
+    await _update_course_stats(chunk_docs[0]["course_id"], chunk_docs, direction=-1)
+
+
+async def delete_course_index(course_id: str):
+    db = get_database()
+    await db.material_chunks.delete_many({"course_id": course_id})
+    await db.course_retrieval_index.delete_one({"course_id": course_id})
+
+
+async def _update_course_stats(course_id: str, chunk_docs: List[Dict[str, Any]], direction: int):
+    """Incrementally maintain chunk count, total length and document frequencies"""
+    db = get_database()
+
+    document_frequency = Counter()
+    for chunk in chunk_docs:
+        document_frequency.update(chunk["terms"].keys())
+
+    increments = {f"df.{term}": direction * count for term, count in document_frequency.items()}
+    increments["chunk_count"] = direction * len(chunk_docs)
+    increments["total_length"] = direction * sum(chunk["length"] for chunk in chunk_docs)
+
+    await db.course_retrieval_index.update_one(
+        {"course_id": course_id},
+        {
+            "$inc": increments,
+            "$set": {"updated_at": datetime.utcnow().isoformat()}
+        },
+        upsert=True
+    )
+
+
+async def _claim_index_build(course_id: str) -> bool:
+    """
+    Claim the lazy build of a course's index - only one request across all
+    workers builds it, the others skip retrieval until it is ready
+    The stats doc may already exist without a build, created by an upload's
+    incremental update; that doc is claimed in place
+    """
+    db = get_database()
+    now = datetime.utcnow()
+
+    try:
+        await db.course_retrieval_index.insert_one({
+            "course_id": course_id,
+            "status": "building",
+            "build_started_at": now.isoformat()
+        })
+        return True
+    except DuplicateKeyError:
+        pass
+
+    # Claim an unbuilt doc nobody is building, or take over a build whose owner
+    # died part-way through
+    stale_before = (now - timedelta(seconds=INDEX_BUILD_STALE_SECONDS)).isoformat()
+    taken = await db.course_retrieval_index.update_one(
+        {
+            "course_id": course_id,
+            "built": {"$ne": True},
+            "$or": [
+                {"status": {"$ne": "building"}},
+                {"build_started_at": {"$lt": stale_before}}
+            ]
+        },
+        {"$set": {"status": "building", "build_started_at": now.isoformat()}}
+    )
+    return taken.modified_count == 1
+
+
+async def ensure_course_index(course_id: str) -> bool:
+    """
+    Build the index for courses whose materials predate it
+    Only the build sets "built" - uploads update the same stats doc incrementally,
+    so its mere existence doesn't mean the legacy materials were indexed
+    Returns False while a build is in progress elsewhere
+    """
+    db = get_database()
+
+    index = await db.course_retrieval_index.find_one({"course_id": course_id}, {"_id": 0, "built": 1})
+    if index and index.get("built"):
+        return True
+
+    if not await _claim_index_build(course_id):
+        return False
+
+    # Only legacy materials still carry their content; newer ones are chunked on upload
+    materials = await db.course_materials.find(
+        {"course_id": course_id, "content": {"$exists": True}},
+        {"_id": 0}
+    ).to_list(None)
+    # A failed build keeps its claim and is redone once stale; index_material
+    # replaces each material's chunks, so a rerun never double-counts
+    for material in materials:
+        await index_material(material)
+    await db.course_retrieval_index.update_one(
+        {"course_id": course_id},
+        {
+            "$set": {"built": True},
+            "$unset": {"status": "", "build_started_at": ""}
+        }
+    )
+    return True
+
+
+async def retrieve_chunks(
+    course_id: str,
+    query: str,
+    k: int = RETRIEVAL_TOP_K,
+    material_ids: Optional[List[str]] = None
+) -> List[Dict[str, Any]]:
+    """
+    Return the top-k chunks of a course's materials for a query
+    """
+    db = get_database()
+
+    if not await ensure_course_index(course_id):
+        return []
+
+    query_terms = list(dict.fromkeys(tokenize(query)))
+    if not query_terms:
+        return []
+
+    chunk_filter = {"course_id": course_id}
+    if material_ids is not None:
+        chunk_filter["material_id"] = {"$in": material_ids}
+
+    if _dense_enabled():
+        scored = await _score_dense(chunk_filter, query_terms)
+    else:
+        scored = await _score_bm25(course_id, chunk_filter, query_terms)
+
+    top = sorted(scored, key=lambda item: item[1], reverse=True)[:k]
+    if not top:
+        return []
+
+    scores = dict(top)
+    chunks = await db.material_chunks.find(
+        {"id": {"$in": list(scores)}},
+        {"_id": 0, "terms": 0, "vector": 0, "separator": 0, "trailing": 0}
+    ).to_list(k)
+    for chunk in chunks:
+        chunk["score"] = round(scores[chunk["id"]], 4)
+    chunks.sort(key=lambda chunk: chunk["score"], reverse=True)
+    return chunks
+
+
+async def _score_bm25(course_id: str, chunk_filter: Dict[str, Any], query_terms: List[str]):
+    db = get_database()
+
+    stats_projection = {"chunk_count": 1, "total_length": 1}
+    stats_projection.update({f"df.{term}": 1 for term in query_terms})
+    stats = await db.course_retrieval_index.find_one({"course_id": course_id}, stats_projection)
+    if not stats or stats.get("chunk_count", 0) <= 0:
+        return []
+
+    chunk_count = stats["chunk_count"]
+    avg_length = max(1.0, stats.get("total_length", 0) / chunk_count)
+    document_frequency = stats.get("df", {})
+    idf = {
+        term: math.log(1 + (chunk_count - document_frequency.get(term, 0) + 0.5) / (document_frequency.get(term, 0) + 0.5))
+        for term in query_terms
+    }
+
+    projection = {"id": 1, "length": 1}
+    projection.update({f"terms.{term}": 1 for term in query_terms})
+    candidate_filter = dict(chunk_filter)
+    candidate_filter["$or"] = [{f"terms.{term}": {"$exists": True}} for term in query_terms]
+
+    scored = []
+    async for chunk in db.material_chunks.find(candidate_filter, projection):
+        length_norm = BM25_K1 * (1 - BM25_B + BM25_B * chunk.get("length", 0) / avg_length)
+        score = 0.0
+        for term, tf in chunk.get("terms", {}).items():
+            score += idf.get(term, 0.0) * tf * (BM25_K1 + 1) / (tf + length_norm)
+        scored.append((chunk["id"], score))
+    return scored
+
+
+async def _score_dense(chunk_filter: Dict[str, Any], query_terms: List[str]):
+    db = get_database()
+
+    ids = []
+    vectors = []
+    async for chunk in db.material_chunks.find(chunk_filter, {"id": 1, "vector": 1}):
+        if chunk.get("vector"):
+            ids.append(chunk["id"])
+            vectors.append(chunk["vector"])
+    if not vectors:
+        return []
+
+    query_vector = np.asarray(_dense_vector(Counter(query_terms)), dtype=np.float32)
+    similarities = np.asarray(vectors, dtype=np.float32) @ query_vector
+    return [(chunk_id, float(score)) for chunk_id, score in zip(ids, similarities) if score > 0]
+
+
+async def material_term_stats(course_id: str, material_ids: List[str], terms: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Per-material term frequencies and lengths for the given terms, summed over chunks
+    """
+    db = get_database()
+
+    group_stage = {"_id": "$material_id", "length": {"$sum": "$length"}}
+    project_stage = {"material_id": 1, "length": 1}
+    for position, term in enumerate(terms):
+        project_stage[f"t{position}"] = {"$ifNull": [f"$terms.{term}", 0]}
+        group_stage[f"t{position}"] = {"$sum": f"$t{position}"}
+
+    rows = await db.material_chunks.aggregate([
+        {"$match": {"course_id": course_id, "material_id": {"$in": material_ids}}},
+        {"$project": project_stage},
+        {"$group": group_stage}
+    ]).to_list(None)
+
+    return {
+        row["_id"]: {
+            "length": row["length"],
+            "terms": {term: row[f"t{position}"] for position, term in enumerate(terms) if row[f"t{position}"]}
+        }
+        for row in rows
+    }
@@ -1,6 +1,6 @@
 from fastapi import APIRouter, HTTPException, status
 from models import UserCreate, User, Token, UserInDB
-from auth_utils import get_password_hash, verify_password, create_access_token
+from auth_utils import hash_password, verify_and_update_password, create_access_token
 from database import get_database
 from datetime import timedelta
 from dotenv import load_dotenv
@@ -27,7 +27,7 @@ async def register(user: UserCreate):
     # Create new user
     user_in_db = UserInDB(
         **user.model_dump(exclude={"password"}),
-        hashed_password=get_password_hash(user.password)
+        hashed_password=await hash_password(user.password)
     )
     
     user_dict = user_in_db.model_dump()
@@ -58,12 +58,17 @@ async def login(email: str, password: str):
     user_in_db = UserInDB(**user_dict)
     
     # Verify password
-    if not verify_password(password, user_in_db.hashed_password):
+    valid, new_hash = await verify_and_update_password(password, user_in_db.hashed_password)
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password"
         )
     
+    # Transparently move the stored hash to the current cost factor
+    if new_hash:
+        await db.users.update_one({"id": user_in_db.id}, {"$set": {"hashed_password": new_hash}})
+    
     # Create access token
     access_token = create_access_token(
         data={"sub": user_in_db.id, "email": user_in_db.email, "role": user_in_db.role},
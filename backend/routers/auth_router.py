@@ -2,6 +2,10 @@ from fastapi import APIRouter, HTTPException, Request, Response, status, Header
 from database import get_database
 from models import User, UserSession
 from datetime import datetime, timedelta, timezone
+from repositories import InvalidPageToken
+from repositories.waitlist import find_waitlist
+from session_cache import invalidate_session, invalidate_user_sessions
+from identity import get_identity_user
 from typing import Optional
 import httpx
 import uuid
@@ -14,37 +18,12 @@ EMERGENT_AUTH_API = "https://demobackend.emergentagent.com/auth/v1/env/oauth/ses
 
 async def get_current_user(request: Request) -> Optional[User]:
     """
-    Get current user from session token (cookie or Authorization header)
+    Get the signed-in user (session token or JWT), resolved once per request
     """
-    db = get_database()
-    
-    # Try to get session_token from cookie first
-    session_token = request.cookies.get("session_token")
-    
-    # Fallback to Authorization header
-    if not session_token:
-        auth_header = request.headers.get("Authorization")
-        if auth_header and auth_header.startswith("Bearer "):
-            session_token = auth_header.replace("Bearer ", "")
-    
-    if not session_token:
-        return None
-    
-    # Check if session exists and is valid
-    session = await db.user_sessions.find_one({
-        "session_token": session_token,
-        "expires_at": {"$gt": datetime.now(timezone.utc).isoformat()}
-    })
-    
-    if not session:
-        return None
-    
-    # Get user
-    user = await db.users.find_one({"id": session["user_id"]})
+    user = await get_identity_user(request)
     if not user:
         return None
     
-    user.pop('_id', None)
     return User(**user)
 
 
@@ -99,6 +78,7 @@ async def process_admin_session(
             {"email": email},
             {"$set": {"role": "admin"}}
         )
+        await invalidate_user_sessions(user_id)
     else:
         # Create new user with admin role
         user = User(
@@ -122,6 +102,7 @@ async def process_admin_session(
     )
     
     session_dict = session.dict()
+    session_dict["expires_at_ts"] = session_dict["expires_at"]  # Date copy for the TTL index
     session_dict["expires_at"] = session_dict["expires_at"].isoformat()
     session_dict["created_at"] = session_dict["created_at"].isoformat()
     
@@ -217,6 +198,7 @@ async def process_session(
     )
     
     session_dict = session.dict()
+    session_dict["expires_at_ts"] = session_dict["expires_at"]  # Date copy for the TTL index
     session_dict["expires_at"] = session_dict["expires_at"].isoformat()
     session_dict["created_at"] = session_dict["created_at"].isoformat()
     
@@ -272,6 +254,7 @@ async def logout(request: Request, response: Response):
     if session_token:
         # Delete session from database
         await db.user_sessions.delete_one({"session_token": session_token})
+        await invalidate_session(session_token)
     
     # Clear cookie
     response.delete_cookie(
@@ -334,6 +317,7 @@ async def process_student_session(
             "user_id": existing_user["id"],
             "session_token": session_token,
             "expires_at": expires_at.isoformat(),
+            "expires_at_ts": expires_at,  # Date copy for the TTL index
             "created_at": datetime.now(timezone.utc).isoformat()
         }
         
@@ -387,9 +371,6 @@ async def process_student_session(
         "approved_at": None
     }
     
-    # Ensure unique index on email
-    await db.waitlist.create_index("email", unique=True)
-    
     await db.waitlist.insert_one(new_entry)
     new_entry.pop('_id', None)
     
@@ -400,12 +381,11 @@ async def process_student_session(
 
 
 @router.get("/waitlist")
-async def get_waitlist(request: Request):
+async def get_waitlist(request: Request, limit: Optional[int] = None, page_token: Optional[str] = None):
     """
-    Get all waitlist entries (admin only)
+    Get waitlist entries, newest first (admin only)
+    Pass next_page_token back as page_token for the next page
     """
-    db = get_database()
-    
     # Check if user is admin
     user = await get_current_user(request)
     if not user or user.role != "admin":
@@ -414,14 +394,12 @@ async def get_waitlist(request: Request):
             detail="Admin access required"
         )
     
-    # Get all waitlist entries
-    entries = await db.waitlist.find({}).sort("created_at", -1).to_list(1000)
-    
-    # Remove MongoDB _id
-    for entry in entries:
-        entry.pop('_id', None)
+    try:
+        entries, next_token = await find_waitlist(limit, page_token)
+    except InvalidPageToken as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     
-    return {"waitlist": entries}
+    return {"waitlist": entries, "next_page_token": next_token}
 
 
 @router.post("/waitlist/{entry_id}/approve")
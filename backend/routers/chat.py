@@ -1,80 +1,108 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from fastapi.responses import StreamingResponse
+from typing import List, Optional
 from models import ChatRequest, ChatResponse, ChatMessage
-from auth_utils import get_current_user
+from identity import require_identity, get_student_id
 from database import get_database
-from ai_engine import generate_teaching_response
-from concept_tracker import extract_concepts_from_materials, detect_concepts_in_text, update_concept_mastery
-from intent_detector import detect_quiz_intent
+from ai_engine import (
+    generate_teaching_response,
+    stream_teaching_response,
+    parse_structured_response,
+    StructuredResponseStreamParser
+)
+from concept_tracker import detect_concepts_in_text, update_concept_mastery_many
+from concept_index import get_course_concepts
+from retrieval import retrieve_chunks
+from materials_store import find_course_materials
+from repositories import InvalidPageToken
+from repositories.chat_messages import find_course_history, find_history_range, history_token, list_sessions
+from repositories.courses import get_course
+from chat_context import get_session_context, record_turn
+from analytics_rollups import record_chat_question
+from intent_detector import classify_quiz_intent_local, detect_quiz_intent_llm
+from llm_gateway import streaming_supported
+import asyncio
+import json
 import uuid
 from datetime import datetime
 
 router = APIRouter()
 
-@router.post("/send")
-async def send_message(chat_request: ChatRequest):
+async def _get_student_major(db, student_id: str):
+    if not student_id:
+        return None
+    student = await db.users.find_one({"id": student_id})
+    return student.get('major') if student else None
+
+def _quiz_intent_response(intent: dict, message: str) -> dict:
+    return {
+        "type": "quiz_intent",
+        "topic": intent["topic"],
+        "message": message,
+        "confidence": intent["confidence"]
+    }
+
+async def _prepare_chat_turn(chat_request: ChatRequest, student_id: str, session_id: str) -> dict:
     """
-    Send a chat message - now with intelligent quiz intent detection and personalization
+    Shared first half of a chat turn: intent check, context loading,
+    concept mastery updates and saving the user message.
+    
+    Returns {"quiz_intent": {...}} when the message is a quiz request.
     """
     db = get_database()
     
-    # First, check if this is a quiz request using AI
-    intent = await detect_quiz_intent(chat_request.message)
-    
-    if intent["is_quiz_request"] and intent["confidence"] > 0.6:
+    # Fast local intent check first - explicit quiz requests are settled here,
+    # anything the n-gram model merely leans towards is confirmed by the LLM
+    local_intent = classify_quiz_intent_local(chat_request.message)
+    if not local_intent["ambiguous"] and local_intent["is_quiz_request"] and local_intent["confidence"] > 0.6:
         # Return quiz intent signal to frontend
-        return {
-            "type": "quiz_intent",
-            "topic": intent["topic"],
-            "message": chat_request.message,
-            "confidence": intent["confidence"]
-        }
+        return {"quiz_intent": _quiz_intent_response(local_intent, chat_request.message)}
     
-    # Continue with normal chat flow
-    db = get_database()
+    # Run the LLM intent check concurrently with loading the chat context
+    intent_task = asyncio.create_task(detect_quiz_intent_llm(chat_request.message)) if local_intent["ambiguous"] else None
     
-    # Mock student ID for demo
-    student_id = "student-demo-001"
+    try:
+        student_major, course, materials, history, context_chunks = await asyncio.gather(
+            # Get student profile to personalize based on major
+            _get_student_major(db, student_id),
+            # Get course and materials
+            get_course(chat_request.course_id),
+            find_course_materials(chat_request.course_id),
+            # Rolling context of this session: latest messages plus a summary of the rest
+            get_session_context(session_id, student_id, chat_request.course_id),
+            # Only the material chunks relevant to this question go into the prompt
+            retrieve_chunks(chat_request.course_id, chat_request.message)
+        )
+    except Exception:
+        if intent_task:
+            intent_task.cancel()
+        raise
     
-    # Get student profile to personalize based on major
-    student_major = None
-    if hasattr(chat_request, 'student_id') and chat_request.student_id:
-        student = await db.users.find_one({"id": chat_request.student_id})
-        if student:
-            student_major = student.get('major')
+    if intent_task:
+        intent = await intent_task
+        if intent["is_quiz_request"] and intent["confidence"] > 0.6:
+            return {"quiz_intent": _quiz_intent_response(intent, chat_request.message)}
     
-    # Get course and materials
-    course = await db.courses.find_one({"id": chat_request.course_id})
     if not course:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Course not found"
         )
     
-    materials = await db.course_materials.find({"course_id": chat_request.course_id}).to_list(100)
-    
     # Extract course concepts and detect which ones are in the question
-    course_concepts = await extract_concepts_from_materials(materials)
+    course_concepts = await get_course_concepts(chat_request.course_id, materials)
     detected_concepts = await detect_concepts_in_text(chat_request.message, course_concepts)
     
     # Update concept mastery for detected concepts
-    for concept in detected_concepts:
-        await update_concept_mastery(
-            student_id=student_id,
-            course_id=chat_request.course_id,
-            concept=concept,
-            interaction_type='question',
-            weight=1.0
-        )
-    
-    # Generate or use existing session ID
-    session_id = chat_request.session_id or str(uuid.uuid4())
-    
-    # Get chat history for this session
-    history = await db.chat_messages.find({
-        "session_id": session_id,
-        "student_id": student_id
-    }).sort("timestamp", 1).to_list(100)
+    await update_concept_mastery_many([
+        {
+            "student_id": student_id,
+            "course_id": chat_request.course_id,
+            "concept": concept,
+            "interaction_type": 'question'
+        }
+        for concept in detected_concepts
+    ])
     
     # Save user message
     user_message = ChatMessage(
@@ -84,17 +112,58 @@ async def send_message(chat_request: ChatRequest):
         role="user",
         content=chat_request.message
     )
-    await db.chat_messages.insert_one(user_message.model_dump())
+    user_message_doc = user_message.model_dump()
+    await db.chat_messages.insert_one(user_message_doc)
+    await record_chat_question(chat_request.course_id, student_id, chat_request.message, user_message.timestamp)
+    
+    return {
+        "student_id": student_id,
+        "session_id": session_id,
+        "student_major": student_major,
+        "course": course,
+        "materials": materials,
+        "history": history,
+        "user_message": user_message_doc,
+        "context_chunks": context_chunks
+    }
+
+async def _save_assistant_message(turn: dict, course_id: str, message_content: str):
+    db = get_database()
+    assistant_message = ChatMessage(
+        session_id=turn["session_id"],
+        student_id=turn["student_id"],
+        course_id=course_id,
+        role="assistant",
+        content=message_content
+    )
+    assistant_message_doc = assistant_message.model_dump()
+    await db.chat_messages.insert_one(assistant_message_doc)
+    await record_turn(turn["session_id"], turn["student_id"], course_id, [turn["user_message"], assistant_message_doc])
+
+@router.post("/send")
+async def send_message(chat_request: ChatRequest, student_id: str = Depends(get_student_id)):
+    """
+    Send a chat message - now with intelligent quiz intent detection and personalization
+    """
+    # Generate or use existing session ID
+    session_id = chat_request.session_id or str(uuid.uuid4())
+    turn = await _prepare_chat_turn(chat_request, student_id, session_id)
+    if "quiz_intent" in turn:
+        return turn["quiz_intent"]
+    
+    student_major = turn["student_major"]
     
     # Generate AI response
     try:
         ai_response = await generate_teaching_response(
-            course=course,
-            materials=materials,
+            course=turn["course"],
+            materials=turn["materials"],
             user_message=chat_request.message,
-            chat_history=history,
+            chat_history=turn["history"]["recent"],
+            conversation_summary=turn["history"]["summary"],
             session_id=session_id,
-            student_major=student_major
+            student_major=student_major,
+            context_chunks=turn["context_chunks"] or None
         )
     except Exception as e:
         raise HTTPException(
@@ -106,14 +175,7 @@ async def send_message(chat_request: ChatRequest):
     message_content = ai_response.get("message", "")
     
     # Save AI message
-    assistant_message = ChatMessage(
-        session_id=session_id,
-        student_id=student_id,
-        course_id=chat_request.course_id,
-        role="assistant",
-        content=message_content
-    )
-    await db.chat_messages.insert_one(assistant_message.model_dump())
+    await _save_assistant_message(turn, chat_request.course_id, message_content)
     
     return ChatResponse(
         session_id=session_id,
@@ -126,50 +188,167 @@ async def send_message(chat_request: ChatRequest):
         timestamp=datetime.utcnow()
     )
 
+def _sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+@router.post("/stream")
+async def stream_message(chat_request: ChatRequest, student_id: str = Depends(get_student_id)):
+    """
+    Send a chat message and stream the response as Server-Sent Events
+    
+    Events: session, token, key_topics, concept_connections, explanation,
+    sources, done (full ChatResponse), quiz_intent and error.
+    
+    The headers and the session event go out before any other work, so the
+    first byte doesn't wait on intent detection, retrieval or mastery updates.
+    The session event's "streaming" flag is false when the LLM transport can't
+    stream; the answer then arrives as a single token event.
+    """
+    session_id = chat_request.session_id or str(uuid.uuid4())
+    
+    async def event_stream():
+        yield _sse_event("session", {"session_id": session_id, "streaming": streaming_supported()})
+        
+        try:
+            turn = await _prepare_chat_turn(chat_request, student_id, session_id)
+        except HTTPException as e:
+            yield _sse_event("error", {"detail": e.detail})
+            return
+        except Exception as e:
+            yield _sse_event("error", {"detail": f"Error preparing response: {str(e)}"})
+            return
+        
+        if "quiz_intent" in turn:
+            yield _sse_event("quiz_intent", turn["quiz_intent"])
+            return
+        
+        parser = StructuredResponseStreamParser()
+        chunks = []
+        try:
+            async for token in stream_teaching_response(
+                course=turn["course"],
+                materials=turn["materials"],
+                user_message=chat_request.message,
+                chat_history=turn["history"]["recent"],
+                conversation_summary=turn["history"]["summary"],
+                session_id=session_id,
+                student_major=turn["student_major"],
+                context_chunks=turn["context_chunks"] or None
+            ):
+                chunks.append(token)
+                yield _sse_event("token", {"text": token})
+                for section in parser.feed(token):
+                    yield _sse_event(section["event"], section["data"])
+            for section in parser.close():
+                yield _sse_event(section["event"], section["data"])
+        except Exception as e:
+            yield _sse_event("error", {"detail": f"Error generating response: {str(e)}"})
+            return
+        
+        message_content = "".join(chunks)
+        await _save_assistant_message(turn, chat_request.course_id, message_content)
+        
+        ai_response = parse_structured_response(message_content)
+        response = ChatResponse(
+            session_id=session_id,
+            message=message_content,
+            key_topics=ai_response.get("key_topics", []),
+            concept_graph=ai_response.get("concept_graph", []),
+            markdown_content=ai_response.get("markdown_content", message_content),
+            sources=ai_response.get("sources", []),
+            student_major=turn["student_major"],
+            timestamp=datetime.utcnow()
+        )
+        yield _sse_event("done", response.model_dump(mode="json"))
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.get("/history/{course_id}", response_model=List[ChatMessage])
-async def get_chat_history(course_id: str, current_user: dict = Depends(get_current_user)):
-    if current_user.get("role") != "student":
+async def get_chat_history(
+    course_id: str,
+    response: Response,
+    limit: Optional[int] = None,
+    page_token: Optional[str] = None,
+    before: Optional[datetime] = None,
+    after: Optional[datetime] = None,
+    since: Optional[datetime] = None,
+    before_token: Optional[str] = None,
+    sync_token: Optional[str] = None,
+    identity: dict = Depends(require_identity)
+):
+    """
+    A student's messages in this course, oldest first
+    
+    - page through everything with page_token (from the X-Next-Page-Token header)
+    - before/after: the messages closest to either side of a timestamp; X-Has-More
+      says whether more lie beyond. Scroll back with before_token=<X-Before-Token>
+    - since / sync_token: incremental sync - messages newer than a timestamp or the
+      last sync; pass X-Sync-Token back as sync_token next time
+    
+    The tokens carry the message id as well as its timestamp, so messages sharing
+    a timestamp across a page boundary are neither skipped nor repeated
+    """
+    if identity["role"] != "student":
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Only students can view chat history"
         )
     
-    db = get_database()
+    student_id = identity["id"]
     
-    # Get all messages for this student in this course
-    messages = await db.chat_messages.find({
-        "student_id": current_user["sub"],
-        "course_id": course_id
-    }).sort("timestamp", 1).to_list(200)
+    if before or after or since or before_token or sync_token:
+        try:
+            messages, has_more = await find_history_range(
+                student_id, course_id, before, after or since, limit,
+                before_token=before_token, after_token=sync_token
+            )
+        except InvalidPageToken as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        
+        response.headers["X-Has-More"] = "true" if has_more else "false"
+        if messages:
+            response.headers["X-Before-Token"] = history_token(messages[0])
+            response.headers["X-Sync-Token"] = history_token(messages[-1])
+        elif sync_token:
+            response.headers["X-Sync-Token"] = sync_token
+        return [ChatMessage(**msg) for msg in messages]
     
+    try:
+        messages, next_token = await find_course_history(student_id, course_id, limit, page_token)
+    except InvalidPageToken as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    
+    if next_token:
+        response.headers["X-Next-Page-Token"] = next_token
     return [ChatMessage(**msg) for msg in messages]
 
 @router.get("/sessions/{course_id}")
-async def get_chat_sessions(course_id: str, current_user: dict = Depends(get_current_user)):
-    if current_user.get("role") != "student":
+async def get_chat_sessions(
+    course_id: str,
+    response: Response,
+    limit: Optional[int] = None,
+    page_token: Optional[str] = None,
+    identity: dict = Depends(require_identity)
+):
+    """
+    A student's chat sessions in this course, most recently active first
+    Pass the X-Next-Page-Token response header back as page_token for the next page
+    """
+    if identity["role"] != "student":
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Only students can view sessions"
         )
     
-    db = get_database()
+    try:
+        sessions, next_token = await list_sessions(identity["id"], course_id, limit, page_token)
+    except InvalidPageToken as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     
-    # Get unique session IDs for this student in this course
-    sessions = await db.chat_messages.aggregate([
-        {
-            "$match": {
-                "student_id": current_user["sub"],
-                "course_id": course_id
-            }
-        },
-        {
-            "$group": {
-                "_id": "$session_id",
-                "last_message": {"$last": "$timestamp"},
-                "message_count": {"$sum": 1}
-            }
-        },
-        {"$sort": {"last_message": -1}}
-    ]).to_list(50)
-    
-    return [{"session_id": s["_id"], "last_message": s["last_message"], "message_count": s["message_count"]} for s in sessions]
+    if next_token:
+        response.headers["X-Next-Page-Token"] = next_token
+    return sessions
@@ -1,8 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from typing import List, Optional
 from models import CourseCreate, Course, EnrollmentRequest, Enrollment
-from auth_utils import get_current_user
+from identity import require_identity
 from database import get_database
+from concept_index import delete_course_concept_index
+from retrieval import delete_course_index
+from question_bank import delete_course_question_bank
+from repositories import InvalidPageToken
+from repositories.courses import find_courses, find_professor_courses, find_student_courses, invalidate_course
 
 router = APIRouter()
 
@@ -15,32 +20,45 @@ async def create_course(course: Course):
     
     return course
 
-@router.get("/", response_model=List[Course])
-async def get_courses():
-    db = get_database()
-    
-    # Get all courses
-    courses = await db.courses.find({}).to_list(100)
-    
+def _page_response(response: Response, courses: List[dict], next_token: Optional[str]) -> List[Course]:
+    if next_token:
+        response.headers["X-Next-Page-Token"] = next_token
     return [Course(**course) for course in courses]
 
+@router.get("/", response_model=List[Course])
+async def get_courses(response: Response, limit: Optional[int] = None, page_token: Optional[str] = None):
+    """
+    All courses, oldest first
+    Pass the X-Next-Page-Token response header back as page_token for the next page
+    """
+    try:
+        courses, next_token = await find_courses(limit=limit, page_token=page_token)
+    except InvalidPageToken as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    
+    return _page_response(response, courses, next_token)
+
 @router.get("/my-courses", response_model=List[Course])
-async def get_my_courses(current_user: dict = Depends(get_current_user)):
-    db = get_database()
-    
-    if current_user.get("role") == "student":
-        # Get enrolled courses
-        enrollments = await db.enrollments.find({"student_id": current_user["sub"]}).to_list(100)
-        course_ids = [e["course_id"] for e in enrollments]
-        courses = await db.courses.find({"id": {"$in": course_ids}}).to_list(100)
-    else:
-        # Get courses created by this professor
-        courses = await db.courses.find({"professor_id": current_user["sub"]}).to_list(100)
-    
-    return [Course(**course) for course in courses]
+async def get_my_courses(
+    response: Response,
+    limit: Optional[int] = None,
+    page_token: Optional[str] = None,
+    identity: dict = Depends(require_identity)
+):
+    try:
+        if identity["role"] == "student":
+            # Get enrolled courses
+            courses, next_token = await find_student_courses(identity["id"], limit, page_token)
+        else:
+            # Get courses created by this professor
+            courses, next_token = await find_professor_courses(identity["id"], limit, page_token)
+    except InvalidPageToken as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    
+    return _page_response(response, courses, next_token)
 
 @router.get("/{course_id}", response_model=Course)
-async def get_course(course_id: str, current_user: dict = Depends(get_current_user)):
+async def get_course(course_id: str, identity: dict = Depends(require_identity)):
     db = get_database()
     
     course = await db.courses.find_one({"id": course_id})
@@ -53,8 +71,8 @@ async def get_course(course_id: str, current_user: dict = Depends(get_current_us
     return Course(**course)
 
 @router.post("/enroll", response_model=Enrollment)
-async def enroll_in_course(enrollment: EnrollmentRequest, current_user: dict = Depends(get_current_user)):
-    if current_user.get("role") != "student":
+async def enroll_in_course(enrollment: EnrollmentRequest, identity: dict = Depends(require_identity)):
+    if identity["role"] != "student":
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Only students can enroll in courses"
@@ -72,7 +90,7 @@ async def enroll_in_course(enrollment: EnrollmentRequest, current_user: dict = D
     
     # Check if already enrolled
     existing = await db.enrollments.find_one({
-        "student_id": current_user["sub"],
+        "student_id": identity["id"],
         "course_id": enrollment.course_id
     })
     if existing:
@@ -83,7 +101,7 @@ async def enroll_in_course(enrollment: EnrollmentRequest, current_user: dict = D
     
     # Create enrollment
     enrollment_obj = Enrollment(
-        student_id=current_user["sub"],
+        student_id=identity["id"],
         course_id=enrollment.course_id
     )
     
@@ -110,7 +128,11 @@ async def delete_course(course_id: str):
         )
     
     await db.courses.delete_one({"id": course_id})
+    await invalidate_course(course_id)
     await db.course_materials.delete_many({"course_id": course_id})
     await db.enrollments.delete_many({"course_id": course_id})
+    await delete_course_concept_index(course_id)
+    await delete_course_index(course_id)
+    await delete_course_question_bank(course_id)
     
     return {"message": "Course deleted successfully"}
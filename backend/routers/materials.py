@@ -1,45 +1,43 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Response, status, UploadFile, File, Form, BackgroundTasks
+from typing import List, Optional
 from models import CourseMaterial
-from auth_utils import get_current_user
+from identity import require_identity
 from database import get_database
-import PyPDF2
-import docx
-import io
+from concept_index import rebuild_course_concept_index
+from retrieval import delete_material_chunks
+from question_bank import refill_course_question_bank
+from ingestion import spool_upload, validate_upload, ingest_material, get_ingest_status
+from repositories import InvalidPageToken
+from materials_store import (
+    MATERIAL_META_PROJECTION,
+    find_course_materials_page,
+    store_material_content,
+    load_material_content
+)
 
 router = APIRouter()
 
-async def extract_text_from_file(file: UploadFile) -> str:
-    """Extract text from uploaded files"""
-    content = await file.read()
-    
-    if file.filename.endswith('.pdf'):
-        pdf_reader = PyPDF2.PdfReader(io.BytesIO(content))
-        text = ""
-        for page in pdf_reader.pages:
-            text += page.extract_text()
-        return text
-    
-    elif file.filename.endswith('.docx'):
-        doc = docx.Document(io.BytesIO(content))
-        text = "\n".join([paragraph.text for paragraph in doc.paragraphs])
-        return text
-    
-    elif file.filename.endswith('.txt'):
-        return content.decode('utf-8')
-    
-    else:
-        return content.decode('utf-8', errors='ignore')
+async def _ingest_upload(material_dict: dict, path: str, filename: str):
+    """Parse and index a spooled upload, then refresh the course-level indexes"""
+    try:
+        await ingest_material(material_dict, path, filename)
+    except Exception as e:
+        # The material is marked failed with the error - skip the course-level refresh
+        print(f"Upload of material {material_dict['id']} ({filename}) failed to ingest: {e}")
+        return
+    await rebuild_course_concept_index(material_dict["course_id"])
+    await refill_course_question_bank(material_dict["course_id"])
 
 @router.post("/upload")
 async def upload_material(
+    background_tasks: BackgroundTasks,
     course_id: str = Form(...),
     title: str = Form(...),
     material_type: str = Form(...),
     file: UploadFile = File(...),
-    current_user: dict = Depends(get_current_user)
+    identity: dict = Depends(require_identity)
 ):
-    if current_user.get("role") != "professor":
+    if identity["role"] != "professor":
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Only professors can upload materials"
@@ -48,16 +46,17 @@ async def upload_material(
     db = get_database()
     
     # Verify course ownership
-    course = await db.courses.find_one({"id": course_id, "professor_id": current_user["sub"]})
+    course = await db.courses.find_one({"id": course_id, "professor_id": identity["id"]})
     if not course:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Course not found or you don't have permission"
         )
     
-    # Extract text from file
+    # Spool the upload to disk and check it can be parsed; the parsing itself happens in the background
     try:
-        content = await extract_text_from_file(file)
+        path = await spool_upload(file)
+        await validate_upload(path, file.filename or "")
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -68,17 +67,26 @@ async def upload_material(
     material = CourseMaterial(
         course_id=course_id,
         title=title,
-        content=content,
-        material_type=material_type
+        material_type=material_type,
+        ingest_status="processing"
     )
     
-    material_dict = material.model_dump()
+    material_dict = material.model_dump(exclude={"content"})
     await db.course_materials.insert_one(material_dict)
+    material_dict.pop('_id', None)
     
-    return {"message": "Material uploaded successfully", "material_id": material.id}
+    # Parse, chunk and index after responding - progress is on /{material_id}/status
+    background_tasks.add_task(_ingest_upload, material_dict, path, file.filename or "")
+    
+    return {
+        "message": "Material uploaded, processing",
+        "material_id": material.id,
+        "ingest_status": material.ingest_status
+    }
 
 @router.post("/upload-text")
 async def upload_text_material(
+    background_tasks: BackgroundTasks,
     course_id: str = Form(...),
     title: str = Form(...),
     material_type: str = Form(...),
@@ -86,31 +94,74 @@ async def upload_text_material(
 ):
     db = get_database()
     
-    # Create material
+    # Create material - the text itself is stored as chunks
     material = CourseMaterial(
         course_id=course_id,
         title=title,
-        content=content,
-        material_type=material_type
+        material_type=material_type,
+        ingest_status="processing"
     )
     
-    material_dict = material.model_dump()
+    material_dict = material.model_dump(exclude={"content"})
     await db.course_materials.insert_one(material_dict)
+    material_dict.pop('_id', None)
+    await store_material_content(material_dict, content)
+    
+    # Course materials changed - refresh the concept index and question bank after responding
+    background_tasks.add_task(rebuild_course_concept_index, course_id)
+    background_tasks.add_task(refill_course_question_bank, course_id)
     
     return {"message": "Material uploaded successfully", "material_id": material.id}
 
 @router.get("/course/{course_id}", response_model=List[CourseMaterial])
-async def get_course_materials(course_id: str):
+async def get_course_materials(
+    course_id: str,
+    response: Response,
+    limit: Optional[int] = None,
+    page_token: Optional[str] = None
+):
+    """
+    Course materials with a content preview - fetch /{material_id} for the full text
+    Pass the X-Next-Page-Token response header back as page_token for the next page
+    """
+    try:
+        materials, next_token = await find_course_materials_page(course_id, limit, page_token)
+    except InvalidPageToken as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    
+    if next_token:
+        response.headers["X-Next-Page-Token"] = next_token
+    return [CourseMaterial(**{**material, "content": material.get("preview", "")}) for material in materials]
+
+@router.get("/{material_id}", response_model=CourseMaterial)
+async def get_material(material_id: str):
     db = get_database()
     
-    materials = await db.course_materials.find({"course_id": course_id}).to_list(100)
-    return [CourseMaterial(**material) for material in materials]
+    material = await db.course_materials.find_one({"id": material_id}, MATERIAL_META_PROJECTION)
+    if not material:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Material not found"
+        )
+    
+    material["content"] = await load_material_content(material)
+    return CourseMaterial(**material)
+
+@router.get("/{material_id}/status")
+async def get_material_status(material_id: str):
+    material_status = await get_ingest_status(material_id)
+    if not material_status:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Material not found"
+        )
+    return material_status
 
 @router.delete("/{material_id}")
-async def delete_material(material_id: str):
+async def delete_material(material_id: str, background_tasks: BackgroundTasks):
     db = get_database()
     
-    material = await db.course_materials.find_one({"id": material_id})
+    material = await db.course_materials.find_one({"id": material_id}, {"course_id": 1})
     if not material:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -119,4 +170,7 @@ async def delete_material(material_id: str):
     
     await db.course_materials.delete_one({"id": material_id})
     
+    background_tasks.add_task(delete_material_chunks, material_id)
+    background_tasks.add_task(rebuild_course_concept_index, material["course_id"])
+    
     return {"message": "Material deleted successfully"}
@@ -0,0 +1,47 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from identity import require_identity
+from database import get_pool_config
+from db_metrics import get_db_metrics, reset_db_metrics
+from session_cache import get_session_cache_stats
+from auth_utils import get_jwt_cache_stats
+from llm_gateway import get_llm_gateway_stats
+from llm_cache import get_llm_cache_stats
+from job_queue import get_job_counts
+import os
+
+router = APIRouter()
+
+def _require_admin(identity: dict):
+    if identity["role"] != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin access required"
+        )
+
+@router.get("")
+async def get_metrics(identity: dict = Depends(require_identity)):
+    """
+    Runtime metrics for this worker process (each worker keeps its own counters, admin only)
+    """
+    _require_admin(identity)
+    return {
+        "pid": os.getpid(),
+        "database": {
+            "pool": get_pool_config(),
+            **get_db_metrics()
+        },
+        "session_cache": get_session_cache_stats(),
+        "jwt_cache": get_jwt_cache_stats(),
+        "llm_gateway": get_llm_gateway_stats(),
+        "llm_cache": get_llm_cache_stats(),
+        "jobs": await get_job_counts()
+    }
+
+@router.post("/reset")
+async def reset_metrics(identity: dict = Depends(require_identity)):
+    """
+    Clear this worker's database latency histograms and slow query log (admin only)
+    """
+    _require_admin(identity)
+    reset_db_metrics()
+    return {"status": "reset", "pid": os.getpid()}
@@ -1,10 +1,11 @@
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status
 from database import get_database
 from models import LearningCard, CardDismissRequest, StudentProgress, StudyPlan, Badge
 from datetime import datetime, date
 from typing import List, Dict, Any
-import random
-from ai_engine import generate_content_summary, generate_quick_quiz
+from identity import get_student_id
+from learning_cards import request_learning_cards, MIN_ACTIVE_CARDS
+from repositories.concept_mastery import find_weakest_concepts
 
 router = APIRouter()
 
@@ -163,96 +164,39 @@ async def update_student_progress(student_id: str, course_id: str, xp_gain: int,
 
 
 @router.get("/cards/{course_id}")
-async def get_learning_cards(course_id: str, student_id: str = "student-demo-001"):
+async def get_learning_cards(course_id: str, student_id: str = Depends(get_student_id)):
     """
     Get personalized learning cards for topics that need mastery
+    Cards are generated in the background - this only reads the ready ones
     """
     db = get_database()
     
     # Get existing cards
-    existing_cards = await db.learning_cards.find({
-        "course_id": course_id,
-        "student_id": student_id,
-        "dismissed": False
-    }).to_list(100)
-    
-    # Remove MongoDB _id from results
-    for card in existing_cards:
-        card.pop('_id', None)
-    
-    # If we have cards, return them
-    if len(existing_cards) >= 3:
-        return {"cards": existing_cards}
-    
-    # Otherwise, generate new cards from concepts needing mastery
-    concept_mastery_records = await db.concept_mastery.find({
-        "course_id": course_id,
-        "student_id": student_id,
-        "mastery_score": {"$lt": 60}  # Concepts needing mastery
-    }).sort("mastery_score", 1).to_list(10)
-    
-    cards = []
-    
-    for record in concept_mastery_records[:5]:  # Top 5 topics needing focus
-        concept = record["concept"]
-        mastery = record["mastery_score"]
-        
-        # Get course materials related to this concept
-        materials = await db.materials.find({
-            "course_id": course_id
-        }).to_list(100)
-        
-        # Generate content summary using AI
-        try:
-            summary = await generate_content_summary(concept, materials)
-        except Exception as e:
-            print(f"Error generating summary: {e}")
-            summary = f"Review the concept of {concept}. Focus on understanding the fundamentals and key relationships."
-        
-        # Decide card type (70% review, 30% quiz)
-        card_type = "review" if random.random() < 0.7 else "quiz"
-        
-        quiz_question = None
-        if card_type == "quiz":
-            try:
-                quiz_question = await generate_quick_quiz(concept, materials)
-            except Exception as e:
-                print(f"Error generating quiz: {e}")
-                card_type = "review"  # Fallback to review
-        
-        # Priority based on mastery (lower mastery = higher priority)
-        priority = 1 if mastery < 40 else (2 if mastery < 50 else 3)
-        
-        card = {
-            "id": f"card-{student_id}-{concept}-{datetime.utcnow().timestamp()}",
+    existing_cards = await db.learning_cards.find(
+        {
             "course_id": course_id,
             "student_id": student_id,
-            "concept": concept,
-            "card_type": card_type,
-            "content_summary": summary,
-            "quiz_question": quiz_question,
-            "priority": priority,
-            "dismissed": False,
-            "completed_at": None,
-            "created_at": datetime.utcnow().isoformat()
-        }
-        
-        result = await db.learning_cards.insert_one(card)
-        # Remove MongoDB _id before returning
-        card.pop('_id', None)
-        cards.append(card)
+            "dismissed": False
+        },
+        {"_id": 0}
+    ).to_list(None)
+    
+    # Top the pool up in the background when it runs low (and there is something to make cards for)
+    generating = False
+    if len(existing_cards) < MIN_ACTIVE_CARDS:
+        generating = await request_learning_cards(course_id, student_id) is not None
     
-    return {"cards": cards}
+    return {"cards": existing_cards, "generating": generating}
 
 
 @router.post("/cards/dismiss")
-async def dismiss_card(request: CardDismissRequest, student_id: str = "student-demo-001"):
+async def dismiss_card(request: CardDismissRequest, student_id: str = Depends(get_student_id)):
     """
     Dismiss a learning card (mark as completed)
     """
     db = get_database()
     
-    card = await db.learning_cards.find_one({"id": request.card_id})
+    card = await db.learning_cards.find_one({"id": request.card_id, "student_id": student_id})
     if not card:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -301,7 +245,7 @@ async def dismiss_card(request: CardDismissRequest, student_id: str = "student-d
 
 
 @router.get("/progress/{course_id}")
-async def get_student_progress(course_id: str, student_id: str = "student-demo-001"):
+async def get_student_progress(course_id: str, student_id: str = Depends(get_student_id)):
     """
     Get student's gamification progress (XP, level, badges, streak)
     """
@@ -355,18 +299,12 @@ async def get_student_progress(course_id: str, student_id: str = "student-demo-0
 
 
 @router.get("/study-plan/{course_id}")
-async def get_study_plan(course_id: str, student_id: str = "student-demo-001"):
+async def get_study_plan(course_id: str, student_id: str = Depends(get_student_id)):
     """
     Generate personalized study plan based on topics needing mastery
     """
-    db = get_database()
-    
     # Get concepts needing mastery
-    concepts_to_master = await db.concept_mastery.find({
-        "course_id": course_id,
-        "student_id": student_id,
-        "mastery_score": {"$lt": 60}
-    }).sort("mastery_score", 1).to_list(10)
+    concepts_to_master = await find_weakest_concepts(course_id, student_id, below=60, limit=10)
     
     if not concepts_to_master:
         return {
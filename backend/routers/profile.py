@@ -1,6 +1,7 @@
 from fastapi import APIRouter, HTTPException, Request
 from database import get_database
-from routers.auth_router import get_current_user
+from identity import get_identity_user, resolve_identity
+from session_cache import invalidate_user_sessions
 
 router = APIRouter()
 
@@ -11,21 +12,13 @@ async def get_profile(request: Request):
     Get current user's profile
     """
     try:
-        user = await get_current_user(request)
-        if not user:
-            raise HTTPException(status_code=401, detail="Not authenticated")
-        
-        db = get_database()
-        user_data = await db.users.find_one({"id": user.id})
-        
+        # Session sign-ins already carry the full user document
+        user_data = await get_identity_user(request)
         if not user_data:
-            raise HTTPException(status_code=404, detail="User not found")
+            raise HTTPException(status_code=401, detail="Not authenticated")
         
         # Remove sensitive data
-        user_data.pop('_id', None)
-        user_data.pop('hashed_password', None)
-        
-        return user_data
+        return {field: value for field, value in user_data.items() if field != 'hashed_password'}
         
     except HTTPException:
         raise
@@ -39,9 +32,10 @@ async def update_profile(request: Request):
     Update current user's profile
     """
     try:
-        user = await get_current_user(request)
-        if not user:
+        identity = await resolve_identity(request)
+        if not identity:
             raise HTTPException(status_code=401, detail="Not authenticated")
+        user_id = identity["id"]
         
         data = await request.json()
         db = get_database()
@@ -59,18 +53,19 @@ async def update_profile(request: Request):
         
         # Update user in database
         result = await db.users.update_one(
-            {"id": user.id},
+            {"id": user_id},
             {"$set": update_data}
         )
+        await invalidate_user_sessions(user_id)
         
         if result.modified_count == 0:
             # Check if user exists
-            existing_user = await db.users.find_one({"id": user.id})
+            existing_user = await db.users.find_one({"id": user_id})
             if not existing_user:
                 raise HTTPException(status_code=404, detail="User not found")
         
         # Get updated user data
-        updated_user = await db.users.find_one({"id": user.id})
+        updated_user = await db.users.find_one({"id": user_id})
         updated_user.pop('_id', None)
         updated_user.pop('hashed_password', None)
         
@@ -1,8 +1,22 @@
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status
 from typing import List
 from models import QuizRequest, QuizResponse, QuizQuestion
 from database import get_database
-from ai_engine import generate_quiz
+from identity import get_student_id
+from analytics_rollups import record_quiz_attempt
+from materials_store import find_course_materials
+from repositories.concept_mastery import iter_course_mastery
+from repositories.courses import get_course
+from question_bank import (
+    BANK_TARGET_SIZE,
+    bank_concept_key,
+    sample_questions,
+    get_seen_question_ids,
+    generate_questions,
+    add_questions,
+    count_banked,
+    schedule_refill
+)
 import uuid
 from datetime import datetime
 
@@ -41,10 +55,8 @@ async def cleanup_bad_concepts(course_id: str):
     
     try:
         # Get all concepts for this course
-        all_concepts = await db.concept_mastery.find({"course_id": course_id}).to_list(1000)
-        
-        deleted_count = 0
-        for record in all_concepts:
+        bad_ids = []
+        async for record in iter_course_mastery(course_id, {"_id": 1, "concept": 1}):
             concept = record["concept"]
             concept_lower = concept.lower()
             concept_words = concept_lower.split()
@@ -59,8 +71,12 @@ async def cleanup_bad_concepts(course_id: str):
             )
             
             if should_delete:
-                await db.concept_mastery.delete_one({"_id": record["_id"]})
-                deleted_count += 1
+                bad_ids.append(record["_id"])
+        
+        deleted_count = 0
+        if bad_ids:
+            result = await db.concept_mastery.delete_many({"_id": {"$in": bad_ids}})
+            deleted_count = result.deleted_count
         
         return {
             "status": "success",
@@ -74,15 +90,15 @@ async def cleanup_bad_concepts(course_id: str):
         )
 
 @router.post("/submit")
-async def submit_quiz_results(submission: dict):
+async def submit_quiz_results(submission: dict, student_id: str = Depends(get_student_id)):
     """
     Store quiz attempt results for analytics and update concept mastery
     """
     db = get_database()
-    from concept_tracker import update_concept_mastery
+    from concept_tracker import update_concept_mastery_many
     
-    # Mock student ID for demo
-    student_id = "student-demo-001"
+    # Banked questions served for this quiz (excluded from this student's future quizzes)
+    served_quiz = await db.served_quizzes.find_one({"quiz_id": submission.get("quiz_id")})
     
     # Create quiz attempt record
     attempt = {
@@ -94,69 +110,66 @@ async def submit_quiz_results(submission: dict):
         "total_questions": submission.get("total_questions"),
         "topic": submission.get("topic"),
         "answers": submission.get("answers", []),
+        "question_ids": served_quiz.get("question_ids", []) if served_quiz else [],
         "completed_at": datetime.utcnow().isoformat()
     }
     
     await db.quiz_attempts.insert_one(attempt)
+    await record_quiz_attempt(attempt)
     
     # Update concept mastery based on quiz answers
-    for answer in submission.get("answers", []):
-        topic = answer.get("topic", submission.get("topic", "General"))
-        is_correct = answer.get("is_correct", False)
-        
-        await update_concept_mastery(
-            student_id=student_id,
-            course_id=submission.get("course_id"),
-            concept=topic,
-            interaction_type='quiz_correct' if is_correct else 'quiz_incorrect',
-            weight=1.5  # Quiz answers have higher weight than questions
-        )
+    await update_concept_mastery_many([
+        {
+            "student_id": student_id,
+            "course_id": submission.get("course_id"),
+            "concept": answer.get("topic", submission.get("topic", "General")),
+            "interaction_type": 'quiz_correct' if answer.get("is_correct", False) else 'quiz_incorrect'
+        }
+        for answer in submission.get("answers", [])
+    ])
     
     return {"status": "success", "message": "Quiz attempt recorded"}
 
 @router.post("/generate", response_model=QuizResponse)
-async def generate_quiz_endpoint(quiz_request: QuizRequest):
+async def generate_quiz_endpoint(quiz_request: QuizRequest, student_id: str = Depends(get_student_id)):
     """
-    Generate a quiz based on course materials - with topic filtering
+    Generate a quiz for a course/topic - served from the question bank when possible
     """
     db = get_database()
-    from intent_detector import filter_materials_by_topic
     
-    # Get course and materials
-    course = await db.courses.find_one({"id": quiz_request.course_id})
+    # Get course
+    course = await get_course(quiz_request.course_id)
     if not course:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Course not found"
         )
     
-    all_materials = await db.course_materials.find({"course_id": quiz_request.course_id}).to_list(100)
-    
-    if not all_materials:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="No course materials found for this course"
-        )
-    
-    # Filter materials by topic if specified
-    if quiz_request.topic:
-        print(f"Filtering materials for topic: {quiz_request.topic}")
-        materials = await filter_materials_by_topic(all_materials, quiz_request.topic)
-        print(f"Filtered to {len(materials)} relevant materials")
-    else:
-        materials = all_materials
+    concept = bank_concept_key(quiz_request.topic)
     
-    # Generate quiz questions
     try:
-        print(f"Generating quiz for course: {course.get('title')}, topic: {quiz_request.topic}")
-        questions_data = await generate_quiz(
-            course=course,
-            materials=materials,
-            topic=quiz_request.topic,
-            num_questions=quiz_request.num_questions
-        )
+        # Sample banked questions this student hasn't answered yet
+        seen_ids = await get_seen_question_ids(student_id, quiz_request.course_id)
+        questions_data = await sample_questions(quiz_request.course_id, concept, quiz_request.num_questions, seen_ids)
         
-        print(f"Generated {len(questions_data) if questions_data else 0} questions")
+        # Bank can't cover this quiz - generate the shortfall synchronously and bank it
+        if len(questions_data) < quiz_request.num_questions:
+            all_materials = await find_course_materials(quiz_request.course_id)
+            if not all_materials and not questions_data:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="No course materials found for this course"
+                )
+            
+            if all_materials:
+                generated = await generate_questions(
+                    course,
+                    all_materials,
+                    quiz_request.topic,
+                    quiz_request.num_questions
+                )
+                stored = await add_questions(quiz_request.course_id, concept, generated)
+                questions_data += stored[:quiz_request.num_questions - len(questions_data)]
         
         if not questions_data:
             raise HTTPException(
@@ -164,14 +177,30 @@ async def generate_quiz_endpoint(quiz_request: QuizRequest):
                 detail="Failed to generate quiz questions"
             )
         
+        # Keep the bank topped up for the next students
+        if await count_banked(quiz_request.course_id, concept) < BANK_TARGET_SIZE:
+            await schedule_refill(quiz_request.course_id, [quiz_request.topic])
+        
         # Convert to QuizQuestion models
         questions = [QuizQuestion(**q) for q in questions_data]
+        quiz_id = str(uuid.uuid4())
+        
+        # Remember which banked questions were served so submissions can record them
+        await db.served_quizzes.insert_one({
+            "quiz_id": quiz_id,
+            "student_id": student_id,
+            "course_id": quiz_request.course_id,
+            "question_ids": [q["id"] for q in questions_data],
+            "created_at": datetime.utcnow().isoformat()
+        })
         
         return QuizResponse(
-            quiz_id=str(uuid.uuid4()),
+            quiz_id=quiz_id,
             questions=questions,
             course_title=course.get('title', 'Unknown Course')
         )
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"ERROR in quiz generation: {str(e)}")
         import traceback
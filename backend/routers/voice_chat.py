@@ -2,6 +2,7 @@ from fastapi import APIRouter, HTTPException, Request
 from emergentintegrations.llm.openai import OpenAIChatRealtime
 import os
 from database import get_database
+from materials_store import find_course_materials, material_text
 
 router = APIRouter()
 
@@ -36,14 +37,14 @@ async def set_voice_context(request: Request):
         db = get_database()
         
         # Get course materials for context
-        materials = await db.materials.find({"course_id": course_id}).to_list(None)
+        materials = await find_course_materials(course_id, limit=None)
         
         # Build context string
         context_parts = []
         for material in materials:
             context_parts.append(f"Title: {material.get('title', 'Untitled')}")
             context_parts.append(f"Type: {material.get('material_type', 'unknown')}")
-            context_parts.append(f"Content: {material.get('content', '')[:500]}...")  # First 500 chars
+            context_parts.append(f"Content: {material_text(material)[:500]}...")  # First 500 chars
             context_parts.append("---")
         
         context = "\n".join(context_parts) if context_parts else "No course materials available yet."
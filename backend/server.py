@@ -1,14 +1,68 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
+import argparse
 import os
+import time
 
 load_dotenv()
 
-from routers import auth, courses, chat, analytics, materials, quiz, student_analytics, personalized_learning, auth_router, voice_chat, profile
-from database import connect_db, close_db
+from routers import auth, courses, chat, analytics, materials, quiz, student_analytics, personalized_learning, auth_router, voice_chat, profile, metrics
+from database import connect_db, close_db, get_database
+from db_indexes import ensure_indexes, report_unindexed_queries
+from llm_gateway import init_llm_gateway, close_llm_gateway
+from job_queue import register_job_handler, start_job_workers, stop_job_workers
+from learning_cards import LEARNING_CARDS_JOB, generate_learning_cards
+from chat_context import CHAT_CONTEXT_JOB, fold_session_context
+from question_bank import QUESTION_BANK_REFILL_JOB, run_question_bank_refill
+from ingestion import shutdown_ingestion
+from warmup import warm_caches
 
-app = FastAPI(title="Brillia.ai API")
+async def _timed(timings: dict, step: str, work):
+    """Await a startup step and record how long it took"""
+    started = time.perf_counter()
+    result = await work
+    timings[step] = round((time.perf_counter() - started) * 1000, 1)
+    return result
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Runs once per worker process: each worker gets its own Motor client, LLM
+    client pool and job workers, and only reports ready once its caches are warm
+    """
+    app.state.ready = False
+    timings = {}
+    started = time.perf_counter()
+    
+    await _timed(timings, "connect_db", connect_db())
+    await _timed(timings, "llm_gateway", init_llm_gateway())
+    db = get_database()
+    app.state.indexes = await _timed(timings, "ensure_indexes", ensure_indexes(db))
+    if os.getenv("INDEX_REPORT_ON_STARTUP", "false").lower() == "true":
+        await report_unindexed_queries(db)
+    app.state.warmup = await _timed(timings, "warm_caches", warm_caches())
+    register_job_handler(LEARNING_CARDS_JOB, generate_learning_cards)
+    register_job_handler(CHAT_CONTEXT_JOB, fold_session_context)
+    register_job_handler(QUESTION_BANK_REFILL_JOB, run_question_bank_refill)
+    await _timed(timings, "job_workers", start_job_workers())
+    
+    timings["total"] = round((time.perf_counter() - started) * 1000, 1)
+    app.state.startup_timings = timings
+    app.state.ready = True
+    print(f"Worker {os.getpid()} ready in {timings['total']}ms: {timings}")
+    
+    yield
+    
+    app.state.ready = False
+    await stop_job_workers()
+    shutdown_ingestion()
+    await close_llm_gateway()
+    await close_db()
+
+app = FastAPI(title="Brillia.ai API", lifespan=lifespan)
 
 # CORS middleware
 app.add_middleware(
@@ -19,15 +73,6 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Database events
-@app.on_event("startup")
-async def startup_event():
-    await connect_db()
-
-@app.on_event("shutdown")
-async def shutdown_event():
-    await close_db()
-
 # Include routers
 app.include_router(auth.router, prefix="/api/auth", tags=["auth"])
 app.include_router(courses.router, prefix="/api/courses", tags=["courses"])
@@ -40,11 +85,53 @@ app.include_router(personalized_learning.router, prefix="/api/personalized", tag
 app.include_router(auth_router.router, prefix="/api/auth", tags=["authentication"])
 app.include_router(voice_chat.router, prefix="/api/voice", tags=["voice-chat"])
 app.include_router(profile.router, prefix="/api/profile", tags=["profile"])
+app.include_router(metrics.router, prefix="/api/metrics", tags=["metrics"])
 
 @app.get("/api/health")
 async def health_check():
     return {"status": "healthy", "message": "Brillia.ai API is running"}
 
+@app.get("/api/ready")
+async def readiness_check():
+    """
+    Readiness for load balancers: this worker finished startup and can reach MongoDB
+    (/api/health only says the process is up)
+    Unique indexes that failed to build (legacy duplicate data) don't stop the
+    worker serving, but turn the status to "degraded" and are listed
+    """
+    if not getattr(app.state, "ready", False):
+        return JSONResponse(status_code=503, content={"status": "starting", "pid": os.getpid()})
+    
+    try:
+        await get_database().command("ping")
+    except Exception as e:
+        return JSONResponse(status_code=503, content={"status": "database unavailable", "error": str(e), "pid": os.getpid()})
+    
+    missing_unique_indexes = app.state.indexes["failed_unique"]
+    return {
+        "status": "degraded" if missing_unique_indexes else "ready",
+        "pid": os.getpid(),
+        "startup_ms": app.state.startup_timings,
+        "warmed": app.state.warmup,
+        "missing_unique_indexes": missing_unique_indexes
+    }
+
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8001)
+    
+    parser = argparse.ArgumentParser(description="Run the Brillia.ai API")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8001")))
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=int(os.getenv("WEB_CONCURRENCY", "1")),
+        help="worker processes (default WEB_CONCURRENCY or 1; use the core count in production)"
+    )
+    args = parser.parse_args()
+    
+    if args.workers > 1:
+        # Each worker imports the app and runs its own lifespan (db client, caches, job workers)
+        uvicorn.run("server:app", host=args.host, port=args.port, workers=args.workers)
+    else:
+        uvicorn.run(app, host=args.host, port=args.port)
@@ -0,0 +1,184 @@
+"""
+Session Lookup Cache
+Caches session token -> user lookups for request identity so authenticated
+requests skip the user_sessions and users round-trips while the entry is fresh
+"""
+from typing import Dict, Any, Optional, Set
+from abc import ABC, abstractmethod
+from cachetools import TTLCache
+from invalidations import InvalidationFeed, publish_invalidation
+from datetime import datetime, timezone
+import copy
+import os
+
+SESSION_CACHE_TTL_SECONDS = int(os.getenv("SESSION_CACHE_TTL_SECONDS", "60"))
+SESSION_CACHE_MAX_ENTRIES = int(os.getenv("SESSION_CACHE_MAX_ENTRIES", "10000"))
+
+# "shared" (invalidations are broadcast to every worker through MongoDB) or "local"
+# (only safe with a single worker, however it is started)
+SESSION_CACHE_BACKEND = os.getenv("SESSION_CACHE_BACKEND", "shared")
+
+
+class SessionCacheBackend(ABC):
+    """
+    Storage interface for cached sessions
+    """
+
+    @abstractmethod
+    async def get(self, session_token: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    async def set(self, session_token: str, entry: Dict[str, Any]):
+        ...
+
+    @abstractmethod
+    async def delete(self, session_token: str):
+        ...
+
+    @abstractmethod
+    async def delete_user(self, user_id: str):
+        ...
+
+    def size(self) -> int:
+        return 0
+
+
+class _CountingTTLCache(TTLCache):
+    """TTLCache that counts capacity evictions"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.evictions = 0
+
+    def popitem(self):
+        item = super().popitem()
+        self.evictions += 1
+        return item
+
+
+class LocalSessionCacheBackend(SessionCacheBackend):
+    """
+    Bounded in-process TTL cache with a user id -> tokens index for invalidation
+    """
+
+    def __init__(self, maxsize: int = SESSION_CACHE_MAX_ENTRIES, ttl: int = SESSION_CACHE_TTL_SECONDS):
+        self._entries = _CountingTTLCache(maxsize=maxsize, ttl=ttl)
+        self._user_tokens: Dict[str, Set[str]] = {}
+
+    @property
+    def evictions(self) -> int:
+        return self._entries.evictions
+
+    async def get(self, session_token: str) -> Optional[Dict[str, Any]]:
+        return self._entries.get(session_token)
+
+    async def set(self, session_token: str, entry: Dict[str, Any]):
+        self._entries[session_token] = entry
+        tokens = self._user_tokens.setdefault(entry["user"]["id"], set())
+        tokens.add(session_token)
+        # Forget tokens the TTL cache has already dropped
+        tokens.intersection_update(self._entries.keys())
+
+    async def delete(self, session_token: str):
+        entry = self._entries.pop(session_token, None)
+        if entry:
+            self._user_tokens.get(entry["user"]["id"], set()).discard(session_token)
+
+    async def delete_user(self, user_id: str):
+        for session_token in self._user_tokens.pop(user_id, set()):
+            self._entries.pop(session_token, None)
+
+    def size(self) -> int:
+        return len(self._entries)
+
+
+class SharedSessionCacheBackend(LocalSessionCacheBackend):
+    """
+    In-process cache whose invalidations reach every worker: logouts and user
+    changes are published to the invalidation log (see invalidations.py), and
+    each worker applies the ones written by others before serving a cached session
+    """
+
+    def __init__(self, maxsize: int = SESSION_CACHE_MAX_ENTRIES, ttl: int = SESSION_CACHE_TTL_SECONDS):
+        super().__init__(maxsize=maxsize, ttl=ttl)
+        self._feed = InvalidationFeed("session_token", "user_id")
+
+    async def get(self, session_token: str) -> Optional[Dict[str, Any]]:
+        for invalidation in await self._feed.poll():
+            if invalidation.get("session_token"):
+                await super().delete(invalidation["session_token"])
+            if invalidation.get("user_id"):
+                await super().delete_user(invalidation["user_id"])
+        return await super().get(session_token)
+
+    async def delete(self, session_token: str):
+        await super().delete(session_token)
+        await publish_invalidation({"session_token": session_token})
+
+    async def delete_user(self, user_id: str):
+        await super().delete_user(user_id)
+        await publish_invalidation({"user_id": user_id})
+
+
+SESSION_CACHE_BACKENDS = {
+    "local": LocalSessionCacheBackend,
+    "shared": SharedSessionCacheBackend
+}
+
+_backend: SessionCacheBackend = SESSION_CACHE_BACKENDS[SESSION_CACHE_BACKEND]()
+_stats = {"hits": 0, "misses": 0}
+
+
+def set_session_cache_backend(backend: SessionCacheBackend):
+    """Swap the cache storage"""
+    global _backend
+    _backend = backend
+
+
+async def get_cached_session(session_token: str) -> Optional[Dict[str, Any]]:
+    """
+    Cached user document for a session token, or None on a miss or expired session
+    """
+    entry = await _backend.get(session_token)
+    if entry and entry["expires_at"] > datetime.now(timezone.utc).isoformat():
+        _stats["hits"] += 1
+        return copy.deepcopy(entry["user"])
+
+    if entry:
+        await _backend.delete(session_token)
+    _stats["misses"] += 1
+    return None
+
+
+async def cache_session(session_token: str, user: Dict[str, Any], expires_at: str):
+    """
+    Remember the user for a session token (expires_at is the session's ISO expiry)
+    """
+    user = {key: value for key, value in user.items() if key != '_id'}
+    await _backend.set(session_token, {"user": user, "expires_at": expires_at})
+
+
+async def invalidate_session(session_token: str):
+    await _backend.delete(session_token)
+
+
+async def invalidate_user_sessions(user_id: str):
+    """
+    Drop every cached session of a user (role or profile changed)
+    """
+    await _backend.delete_user(user_id)
+
+
+def get_session_cache_stats() -> Dict[str, Any]:
+    lookups = _stats["hits"] + _stats["misses"]
+    return {
+        "hits": _stats["hits"],
+        "misses": _stats["misses"],
+        "hit_rate": round(_stats["hits"] / lookups, 4) if lookups else 0.0,
+        "evictions": getattr(_backend, "evictions", 0),
+        "size": _backend.size(),
+        "backend": type(_backend).__name__,
+        "ttl_seconds": SESSION_CACHE_TTL_SECONDS,
+        "max_entries": SESSION_CACHE_MAX_ENTRIES
+    }
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# Backend modules import each other as top-level modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# ai_engine refuses to import without a key; tests never reach the LLM
+os.environ.setdefault("EMERGENT_LLM_KEY", "test-key")
@@ -0,0 +1,58 @@
+import random
+import pytest
+from retrieval import chunk_text, CHUNK_MAX_CHARS
+
+
+def _reconstruct(chunks):
+    # Same join as materials_store.load_material_content
+    return "".join(chunk["separator"] + chunk["text"] + chunk.get("trailing", "") for chunk in chunks)
+
+
+def _random_text(rng):
+    words = ["alpha", "beta", "gamma.", "delta", "epsilon,", "zeta", "eta?"]
+    paragraphs = []
+    for _ in range(rng.randint(1, 12)):
+        length = rng.choice([3, 40, 300, 900, 2600])
+        paragraphs.append(" ".join(rng.choice(words) for _ in range(length)))
+    separators = ["\n\n", "\n\n\n", "\n \n", "\r\n\r\n", "\n\t\n  "]
+    body = "".join(paragraph + rng.choice(separators) for paragraph in paragraphs)
+    return rng.choice(["", "  ", "\n"]) + body + rng.choice(["", " ", "\n\n  "])
+
+
+FIXED_TEXTS = [
+    "One paragraph.",
+    "  leading and trailing whitespace  \n\n",
+    "First.\n\nSecond.\n\n\n\nThird after a wide gap.",
+    "word " * (CHUNK_MAX_CHARS // 2),
+    "x" * (CHUNK_MAX_CHARS * 3 + 17),
+]
+
+
+@pytest.mark.parametrize("text", FIXED_TEXTS)
+def test_chunks_rebuild_the_exact_text(text):
+    assert _reconstruct(chunk_text(text)) == text
+
+
+def test_random_texts_round_trip():
+    rng = random.Random(18)
+    for _ in range(200):
+        text = _random_text(rng)
+        assert _reconstruct(chunk_text(text)) == text
+
+
+def test_chunks_are_stripped_and_bounded():
+    rng = random.Random(7)
+    for _ in range(50):
+        for chunk in chunk_text(_random_text(rng)):
+            assert chunk["text"] == chunk["text"].strip()
+            assert chunk["end_offset"] - chunk["start_offset"] <= CHUNK_MAX_CHARS
+
+
+def test_offsets_point_at_the_chunk_text():
+    text = "First paragraph.\n\n" + "Second paragraph. " * 200
+    for chunk in chunk_text(text):
+        assert chunk["text"] in text[chunk["start_offset"]:chunk["end_offset"]]
+
+
+def test_whitespace_only_text_has_no_chunks():
+    assert chunk_text(" \n\n\t ") == []
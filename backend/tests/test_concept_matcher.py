@@ -0,0 +1,57 @@
+import pytest
+from concept_matcher import ConceptMatcher, get_concept_matcher, normalize_tokens
+
+CONCEPTS = (
+    "C++",
+    "C#",
+    "F#",
+    "Binary Search Tree",
+    "Neural Networks",
+    "Gradient Descent",
+    "Hash Table",
+    "Recursion",
+)
+
+
+@pytest.fixture(scope="module")
+def matcher():
+    return ConceptMatcher(CONCEPTS)
+
+
+def test_language_names_keep_their_symbols():
+    assert normalize_tokens("C++ and C# and F#") == ["c++", "and", "c#", "and", "f#"]
+
+
+@pytest.mark.parametrize("message", [
+    "What does the c in plan c stand for?",
+    "Is option f correct?",
+    "Explain recursion in c",
+])
+def test_single_letters_do_not_match_languages(matcher, message):
+    assert not {"C++", "C#", "F#"} & set(matcher.match(message))
+
+
+def test_languages_match(matcher):
+    assert matcher.match("Templates in C++ vs generics in C# and F#") == ["C++", "C#", "F#"]
+
+
+def test_plural_and_verb_forms_match(matcher):
+    assert matcher.match("How do hash tables and neural networks differ?") == ["Neural Networks", "Hash Table"]
+
+
+def test_most_significant_words_are_enough(matcher):
+    # 2 of 3 significant words of "Binary Search Tree" (67% >= 60%)
+    assert "Binary Search Tree" in matcher.match("how do I search a binary heap")
+
+
+def test_one_of_two_words_is_not_enough(matcher):
+    assert "Gradient Descent" not in matcher.match("what is a gradient")
+
+
+def test_results_follow_concept_list_order(matcher):
+    assert matcher.match("recursion on a binary search tree") == ["Binary Search Tree", "Recursion"]
+
+
+def test_matchers_are_cached_per_concept_list():
+    assert get_concept_matcher(CONCEPTS) is get_concept_matcher(CONCEPTS)
+    assert get_concept_matcher(CONCEPTS) is not get_concept_matcher(CONCEPTS[:2])
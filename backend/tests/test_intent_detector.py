@@ -0,0 +1,40 @@
+import pytest
+from intent_detector import classify_quiz_intent_local
+
+TEACHING_REQUESTS = [
+    "Tell me about linked lists",
+    "Teach me about hash tables",
+    "I want to learn about graphs",
+    "Show me how binary search works",
+    "Can you explain recursion?",
+]
+
+EXPLICIT_QUIZ_REQUESTS = [
+    "quiz me",
+    "Quiz me on supervised learning",
+    "give me a quiz",
+    "I want to take a quiz",
+]
+
+
+@pytest.mark.parametrize("message", TEACHING_REQUESTS)
+def test_teaching_requests_are_never_settled_as_quizzes(message):
+    intent = classify_quiz_intent_local(message)
+    assert intent["ambiguous"] or not intent["is_quiz_request"]
+
+
+@pytest.mark.parametrize("message", EXPLICIT_QUIZ_REQUESTS)
+def test_explicit_quiz_requests_are_settled_locally(message):
+    intent = classify_quiz_intent_local(message)
+    assert intent["is_quiz_request"]
+    assert not intent["ambiguous"]
+
+
+def test_quiz_topic_is_extracted():
+    intent = classify_quiz_intent_local("quiz me on supervised learning")
+    assert intent["topic"] == "supervised learning"
+
+
+def test_model_only_positives_go_to_the_llm():
+    intent = classify_quiz_intent_local("drill me on binary trees")
+    assert intent["ambiguous"]
@@ -0,0 +1,52 @@
+import pytest
+from concept_tracker import compute_mastery_score, is_trackable_concept
+
+
+def original_mastery_score(correct_answers, total_questions, interactions):
+    """The per-record formula update_concept_mastery applied before scores moved to bulk writes"""
+    if total_questions > 0:
+        quiz_accuracy = (correct_answers / total_questions) * 100
+        if total_questions <= 2:
+            confidence_factor = 0.4
+        elif total_questions <= 4:
+            confidence_factor = 0.6
+        elif total_questions <= 6:
+            confidence_factor = 0.8
+        else:
+            confidence_factor = 1.0
+        interaction_bonus = min(15, interactions * 1.5)
+        return min(100, quiz_accuracy * confidence_factor + interaction_bonus)
+    return min(30, interactions * 3)
+
+
+def test_matches_the_original_formula():
+    for total_questions in range(0, 12):
+        for correct_answers in range(0, total_questions + 1):
+            # Every quiz answer is also an interaction
+            for extra_interactions in range(0, 15):
+                interactions = total_questions + extra_interactions
+                assert compute_mastery_score(correct_answers, total_questions, interactions) == pytest.approx(
+                    original_mastery_score(correct_answers, total_questions, interactions)
+                )
+
+
+def test_questions_alone_cap_at_30():
+    assert compute_mastery_score(0, 0, 1) == 3
+    assert compute_mastery_score(0, 0, 50) == 30
+
+
+def test_score_never_exceeds_100():
+    assert compute_mastery_score(20, 20, 40) == 100
+
+
+@pytest.mark.parametrize("concept, trackable", [
+    ("Binary Search Tree", True),
+    ("Recursion", True),
+    ("data", False),
+    ("What", False),
+    ("API", False),
+    ("the data", False),
+    ("", False),
+])
+def test_trackable_concepts(concept, trackable):
+    assert is_trackable_concept(concept) == trackable
@@ -0,0 +1,54 @@
+import base64
+import pytest
+from datetime import datetime
+from repositories import InvalidPageToken, decode_page_token, encode_page_token, keyset_filter
+
+
+@pytest.mark.parametrize("sort_value", [
+    datetime(2026, 10, 17, 9, 30, 0, 123456),
+    "2026-10-17T09:30:00",
+    42,
+    None,
+])
+def test_tokens_round_trip(sort_value):
+    assert decode_page_token(encode_page_token(sort_value, "doc-1")) == (sort_value, "doc-1")
+
+
+def test_tokens_are_url_safe():
+    token = encode_page_token("a/b+c?" * 10, "id/with+chars")
+    assert "=" not in token
+    assert all(character.isalnum() or character in "-_" for character in token)
+
+
+@pytest.mark.parametrize("token", [
+    "not a token!",
+    "e30",  # {} - no id
+    base64.urlsafe_b64encode(b"[1, 2]").decode(),
+    base64.urlsafe_b64encode(b'{"dt": "yesterday", "id": "x"}').decode(),
+    base64.urlsafe_b64encode(b"\xff\xfe").decode(),
+])
+def test_malformed_tokens_are_rejected(token):
+    with pytest.raises(InvalidPageToken):
+        decode_page_token(token)
+
+
+def test_invalid_page_token_is_a_value_error():
+    assert issubclass(InvalidPageToken, ValueError)
+
+
+def test_keyset_filter_without_token_keeps_the_query():
+    query = {"course_id": "c"}
+    assert keyset_filter(query, "timestamp", 1, None) is query
+
+
+@pytest.mark.parametrize("direction, op", [(1, "$gt"), (-1, "$lt")])
+def test_keyset_filter_breaks_ties_on_id(direction, op):
+    timestamp = datetime(2026, 10, 17)
+    token = encode_page_token(timestamp, "m-5")
+    assert keyset_filter({"course_id": "c"}, "timestamp", direction, token) == {"$and": [
+        {"course_id": "c"},
+        {"$or": [
+            {"timestamp": {op: timestamp}},
+            {"timestamp": timestamp, "id": {op: "m-5"}}
+        ]}
+    ]}
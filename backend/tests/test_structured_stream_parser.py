@@ -0,0 +1,63 @@
+import pytest
+from ai_engine import StructuredResponseStreamParser, parse_structured_response
+
+STRUCTURED_RESPONSE = """KEY_TOPICS:
+- Supervised Learning
+- Overfitting
+
+CONCEPT_CONNECTIONS:
+Training Data -> Overfitting: too little of it causes
+Regularization -> Overfitting: reduces
+
+EXPLANATION:
+## Overfitting
+A model that **memorizes** its training data does badly on new data.
+
+SOURCES:
+- Lecture 3 notes
+- Syllabus
+"""
+
+
+def _split(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def _stream(tokens):
+    parser = StructuredResponseStreamParser()
+    events = []
+    for token in tokens:
+        events += parser.feed(token)
+    events += parser.close()
+    return {event["event"]: event["data"] for event in events}, [event["event"] for event in events]
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 11, 64, len(STRUCTURED_RESPONSE)])
+def test_sections_match_the_batch_parser_however_the_tokens_split(size):
+    sections, order = _stream(_split(STRUCTURED_RESPONSE, size))
+    parsed = parse_structured_response(STRUCTURED_RESPONSE)
+
+    assert order == ["key_topics", "concept_connections", "explanation", "sources"]
+    assert sections["key_topics"] == parsed["key_topics"]
+    assert sections["concept_connections"] == parsed["concept_graph"]
+    assert sections["explanation"] == parsed["markdown_content"]
+    assert sections["sources"] == parsed["sources"]
+
+
+def test_header_split_across_tokens():
+    sections, _ = _stream(["KEY_TOP", "ICS:\n- Recursion\nEXPLA", "NATION:\nBase cases end it."])
+    assert sections["key_topics"] == ["Recursion"]
+    assert sections["explanation"] == "Base cases end it."
+
+
+def test_section_is_emitted_once_the_next_header_arrives():
+    parser = StructuredResponseStreamParser()
+    assert parser.feed("KEY_TOPICS:\n- Graphs\n") == []
+    events = parser.feed("EXPLANATION:\nNodes and edges")
+    assert events == [{"event": "key_topics", "data": ["Graphs"]}]
+
+
+def test_unstructured_response_is_the_explanation():
+    sections, order = _stream(_split("Just a plain answer without headers.", 5))
+    assert order == ["explanation"]
+    assert sections["explanation"] == "Just a plain answer without headers."
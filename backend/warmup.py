@@ -0,0 +1,35 @@
+"""
+Startup Cache Warming
+Fills a worker's in-process caches (course documents, concept matchers) before it
+starts accepting traffic, so the first chat turns after a deploy or restart
+don't pay for cold lookups and matcher builds
+"""
+from typing import Dict
+from database import get_database
+from repositories.courses import COURSE_PROJECTION, cache_course
+from concept_matcher import get_concept_matcher
+import os
+
+# Most recently created courses warmed per worker
+WARMUP_COURSES = int(os.getenv("WARMUP_COURSES", "200"))
+
+
+async def warm_caches() -> Dict[str, int]:
+    db = get_database()
+
+    course_ids = []
+    async for course in db.courses.find({}, COURSE_PROJECTION).sort([("created_at", -1), ("id", -1)]).limit(WARMUP_COURSES):
+        cache_course(course)
+        course_ids.append(course["id"])
+
+    # Only courses that already have an index - building one means an LLM extraction
+    matchers = 0
+    async for index_doc in db.course_concept_index.find(
+        {"course_id": {"$in": course_ids}},
+        {"_id": 0, "concepts": 1}
+    ):
+        if index_doc.get("concepts"):
+            get_concept_matcher(tuple(index_doc["concepts"]))
+            matchers += 1
+
+    return {"courses": len(course_ids), "concept_matchers": matchers}
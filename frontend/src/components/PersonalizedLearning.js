@@ -25,9 +25,9 @@ const PersonalizedLearning = ({ courseId }) => {
     try {
       // Load cards, progress, and study plan in parallel
       const [cardsRes, progressRes, planRes] = await Promise.all([
-        axios.get(`${BACKEND_URL}/api/personalized/cards/${courseId}?student_id=student-demo-001`),
-        axios.get(`${BACKEND_URL}/api/personalized/progress/${courseId}?student_id=student-demo-001`),
-        axios.get(`${BACKEND_URL}/api/personalized/study-plan/${courseId}?student_id=student-demo-001`)
+        axios.get(`${BACKEND_URL}/api/personalized/cards/${courseId}`, { withCredentials: true }),
+        axios.get(`${BACKEND_URL}/api/personalized/progress/${courseId}`, { withCredentials: true }),
+        axios.get(`${BACKEND_URL}/api/personalized/study-plan/${courseId}`, { withCredentials: true })
       ]);
 
       setCards(cardsRes.data.cards || []);
@@ -43,11 +43,12 @@ const PersonalizedLearning = ({ courseId }) => {
   const handleCardDismiss = async (cardId, correct = null) => {
     try {
       const response = await axios.post(
-        `${BACKEND_URL}/api/personalized/cards/dismiss?student_id=student-demo-001`,
+        `${BACKEND_URL}/api/personalized/cards/dismiss`,
         {
           card_id: cardId,
           correct: correct
-        }
+        },
+        { withCredentials: true }
       );
 
       // Remove card from list
@@ -55,7 +56,8 @@ const PersonalizedLearning = ({ courseId }) => {
 
       // Update progress
       const updatedProgress = await axios.get(
-        `${BACKEND_URL}/api/personalized/progress/${courseId}?student_id=student-demo-001`
+        `${BACKEND_URL}/api/personalized/progress/${courseId}`,
+        { withCredentials: true }
       );
       setProgress(updatedProgress.data);
 
@@ -68,7 +70,8 @@ const PersonalizedLearning = ({ courseId }) => {
       // Reload cards if we're running low
       if (cards.length <= 2) {
         const cardsRes = await axios.get(
-          `${BACKEND_URL}/api/personalized/cards/${courseId}?student_id=student-demo-001`
+          `${BACKEND_URL}/api/personalized/cards/${courseId}`,
+          { withCredentials: true }
         );
         setCards(cardsRes.data.cards || []);
       }
@@ -52,7 +52,7 @@ const QuizMode = ({ quizData, onExit, courseName, courseId }) => {
         total_questions: totalQuestions,
         topic: quizData.questions[0].topic,
         answers: answersRecord
-      });
+      }, { withCredentials: true });
     } catch (err) {
       console.error('Error submitting quiz results:', err);
     }
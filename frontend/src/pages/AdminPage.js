@@ -18,10 +18,17 @@ const AdminPage = ({ user, onLogout }) => {
   const fetchWaitlist = async () => {
     try {
       setLoading(true);
-      const response = await axios.get(`${API_URL}/api/auth/waitlist`, {
-        withCredentials: true
-      });
-      setWaitlist(response.data.waitlist || []);
+      const entries = [];
+      let pageToken = null;
+      do {
+        const response = await axios.get(`${API_URL}/api/auth/waitlist`, {
+          params: pageToken ? { page_token: pageToken } : {},
+          withCredentials: true
+        });
+        entries.push(...(response.data.waitlist || []));
+        pageToken = response.data.next_page_token;
+      } while (pageToken);
+      setWaitlist(entries);
       setError(null);
     } catch (err) {
       console.error('Failed to fetch waitlist:', err);
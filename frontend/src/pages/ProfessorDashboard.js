@@ -281,6 +281,20 @@ const CourseDetail = () => {
     // eslint-disable-next-line react-hooks/exhaustive-deps
   }, [courseId]);
 
+  // File uploads are parsed in the background - refresh until none are still processing
+  useEffect(() => {
+    if (!materials.some((material) => material.ingest_status === 'processing')) return undefined;
+    const timer = setTimeout(async () => {
+      try {
+        const materialsRes = await materialsAPI.getByCourse(courseId);
+        setMaterials(materialsRes.data);
+      } catch (error) {
+        console.error('Error refreshing materials:', error);
+      }
+    }, 3000);
+    return () => clearTimeout(timer);
+  }, [materials, courseId]);
+
   const loadCourseData = async () => {
     try {
       const [courseRes, materialsRes, analyticsRes] = await Promise.all([
@@ -317,7 +331,7 @@ const CourseDetail = () => {
       loadCourseData();
     } catch (error) {
       console.error('Error uploading material:', error);
-      alert('Failed to upload material');
+      alert(error.response?.data?.detail || 'Failed to upload material');
     }
   };
 
@@ -424,6 +438,16 @@ const CourseDetail = () => {
                               {material.material_type}
                             </span>
                             <h3 className="font-semibold text-gray-900">{material.title}</h3>
+                            {material.ingest_status === 'processing' && (
+                              <span className="px-2 py-1 bg-yellow-100 text-yellow-800 text-xs font-medium rounded">
+                                Processing...
+                              </span>
+                            )}
+                            {material.ingest_status === 'failed' && (
+                              <span className="px-2 py-1 bg-red-100 text-red-700 text-xs font-medium rounded">
+                                Processing failed - please re-upload
+                              </span>
+                            )}
                           </div>
                           <p className="text-sm text-gray-600 line-clamp-2">{material.content.substring(0, 200)}...</p>
                           <p className="text-xs text-gray-400 mt-2">
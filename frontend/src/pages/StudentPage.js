@@ -45,13 +45,24 @@ const StudentPage = ({ user, onLogout }) => {
     }
   };
 
+  // The materials list only carries a preview - load the full text when one is opened
+  const selectMaterial = async (material) => {
+    setSelectedMaterial(material);
+    try {
+      const response = await axios.get(`${API_URL}/api/materials/${material.id}`);
+      setSelectedMaterial((current) => (current?.id === material.id ? response.data : current));
+    } catch (err) {
+      console.error('Error loading material:', err);
+    }
+  };
+
   const loadMaterials = async (courseId) => {
     try {
       const response = await axios.get(`${API_URL}/api/materials/course/${courseId}`);
       setMaterials(response.data);
       // Auto-select first material if available
       if (response.data.length > 0) {
-        setSelectedMaterial(response.data[0]);
+        selectMaterial(response.data[0]);
       } else {
         setSelectedMaterial(null);
       }
@@ -65,7 +76,9 @@ const StudentPage = ({ user, onLogout }) => {
   const loadInsights = async (courseId) => {
     try {
       setLoadingInsights(true);
-      const response = await axios.get(`${API_URL}/api/student/insights/${courseId}`);
+      const response = await axios.get(`${API_URL}/api/student/insights/${courseId}`, {
+        withCredentials: true
+      });
       setInsights(response.data);
     } catch (err) {
       console.error('Error loading insights:', err);
@@ -90,7 +103,7 @@ const StudentPage = ({ user, onLogout }) => {
         course_id: selectedCourse.id,
         topic: topic,
         num_questions: numQuestions
-      });
+      }, { withCredentials: true });
       
       setQuizData(response.data);
       setQuizMode(true);
@@ -126,9 +139,8 @@ const StudentPage = ({ user, onLogout }) => {
       const response = await axios.post(`${API_URL}/api/chat/send`, {
         course_id: selectedCourse.id,
         message: currentMessage,
-        session_id: sessionStorage.getItem(`session_${selectedCourse.id}`) || null,
-        student_id: user?.id
-      });
+        session_id: sessionStorage.getItem(`session_${selectedCourse.id}`) || null
+      }, { withCredentials: true });
       
       // Check if response indicates quiz intent
       if (response.data.type === 'quiz_intent') {
@@ -457,7 +469,7 @@ const StudentPage = ({ user, onLogout }) => {
                           {materials.map((material, index) => (
                             <div
                               key={material.id}
-                              onClick={() => setSelectedMaterial(material)}
+                              onClick={() => selectMaterial(material)}
                               className="hover-lift"
                               style={{
                                 padding: '1rem',
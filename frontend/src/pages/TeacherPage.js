@@ -360,6 +360,17 @@ const TeacherPage = ({ user, onLogout }) => {
     }
   };
 
+  // The materials list only carries a preview - load the full text for the viewer
+  const openMaterial = async (material) => {
+    setViewMaterial(material);
+    try {
+      const response = await axios.get(`${API_URL}/api/materials/${material.id}`);
+      setViewMaterial((current) => (current?.id === material.id ? response.data : current));
+    } catch (err) {
+      console.error('Error loading material:', err);
+    }
+  };
+
   const handleDeleteMaterial = async (materialId) => {
     if (!window.confirm('Are you sure you want to delete this material?')) {
       return;
@@ -650,7 +661,7 @@ const TeacherPage = ({ user, onLogout }) => {
                             </div>
                             <div style={{ display: 'flex', gap: '0.5rem', marginLeft: '1rem' }}>
                               <button
-                                onClick={() => setViewMaterial(material)}
+                                onClick={() => openMaterial(material)}
                                 className="btn-secondary"
                                 style={{ padding: '0.5rem 1rem', fontSize: '0.875rem' }}
                               >